@@ -0,0 +1,176 @@
+""" Concurrent Earth Engine asset housekeeping (listing, deleting and
+    renaming assets).
+
+    Asset calls are independent of each other, except that a folder can only
+    be deleted once it is empty. Calls run on a bounded pool of worker
+    threads; assets are handled one folder depth at a time, deepest first, so
+    that children are always deleted (or renamed) before their parents.
+    Calls that fail with a transient error (e.g. a rate limit, see
+    heet_retry) are retried after a backoff delay. """
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from delineator import heet_retry
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_retry
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+# Asset types that contain other assets
+container_types = ["FOLDER", "IMAGECOLLECTION"]
+
+
+def asset_depth(asset_name: str) -> int:
+    """Number of path components of an asset name"""
+    return len(asset_name.rstrip("/").split("/"))
+
+
+class AssetOps:
+    """Runs asset calls concurrently, with retries.
+
+    Args:
+        api: object providing listAssets, deleteAsset and renameAsset like
+            ee.data (ee.data if None).
+        max_workers: number of worker threads making asset calls.
+        retry_policy: when and after what delay a failed call is retried
+            (heet_retry.RetryPolicy; only transient errors are retried).
+        sleep: callable waiting a number of seconds.
+    """
+
+    def __init__(
+        self,
+        api=None,
+        max_workers: int = 8,
+        retry_policy: Optional[heet_retry.RetryPolicy] = None,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self._api = api
+        self.max_workers = max_workers
+        self.retry_policy = (
+            retry_policy
+            if retry_policy is not None
+            else heet_retry.RetryPolicy(max_attempts=5, base_delay_s=1, max_delay_s=30)
+        )
+        self.sleep = sleep
+
+    @property
+    def api(self):
+        if self._api is None:
+            import ee
+
+            self._api = ee.data
+        return self._api
+
+    def call(self, function: Callable, *args) -> Any:
+        """Make an asset call, retrying it after transient errors"""
+        attempt = 1
+        while True:
+            try:
+                return function(*args)
+            except Exception as error:
+                if not self.retry_policy.should_retry(attempt, str(error)):
+                    raise
+                delay_s = self.retry_policy.delay(attempt)
+                logger.info(
+                    f"[AssetOps] {function.__name__}{args} failed on attempt {attempt} "
+                    + f"({error}). Retrying in {delay_s:.1f}s"
+                )
+                self.sleep(delay_s)
+                attempt = attempt + 1
+
+    def run_all(
+        self, function: Callable, args_list: Iterable[Tuple]
+    ) -> List[Tuple[Tuple, Exception]]:
+        """Make an asset call for each tuple of args concurrently. Returns the
+        (args, error) of the calls that failed"""
+        args_list = list(args_list)
+        if len(args_list) == 0:
+            return []
+
+        def run(args):
+            try:
+                self.call(function, *args)
+            except Exception as error:
+                logger.warning(f"[AssetOps] {function.__name__}{args} failed: {error}")
+                return (args, error)
+            return None
+
+        n_workers = min(self.max_workers, len(args_list))
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(run, args_list))
+        return [result for result in results if result is not None]
+
+    def list_children(self, parent: str) -> List[dict]:
+        """Assets directly in a folder"""
+        return self.call(self.api.listAssets, {"parent": parent}).get("assets", [])
+
+    def list_tree(self, parent: str) -> List[dict]:
+        """All assets below a folder (parents before their children). The
+        folders of each depth are listed concurrently"""
+        assets = []
+        level = self.list_children(parent)
+        while len(level) > 0:
+            assets.extend(level)
+            folders = [a["name"] for a in level if a["type"] in container_types]
+            if len(folders) == 0:
+                break
+            n_workers = min(self.max_workers, len(folders))
+            with ThreadPoolExecutor(max_workers=n_workers) as executor:
+                listings = list(executor.map(self.list_children, folders))
+            level = [asset for listing in listings for asset in listing]
+        return assets
+
+    def _by_depth(self, function: Callable, args_by_name: Dict[str, Tuple]) -> List:
+        # Make the calls deepest asset first, one depth at a time
+        failures = []
+        depths: Dict[int, List[Tuple]] = {}
+        for asset_name, args in args_by_name.items():
+            depths.setdefault(asset_depth(asset_name), []).append(args)
+        for depth in sorted(depths, reverse=True):
+            failures.extend(self.run_all(function, depths[depth]))
+        return failures
+
+    def delete(self, asset_names: Iterable[str]) -> List[Tuple[Tuple, Exception]]:
+        """Delete assets, children before their parents. Returns the failed
+        deletions (see run_all)"""
+        return self._by_depth(self.api.deleteAsset, {name: (name,) for name in asset_names})
+
+    def rename(self, renames: Iterable[Tuple[str, str]]) -> List[Tuple[Tuple, Exception]]:
+        """Rename (source, destination) assets, children before their
+        parents. Returns the failed renames (see run_all)"""
+        return self._by_depth(
+            self.api.renameAsset, {source: (source, destination) for source, destination in renames}
+        )
+
+    def delete_tree(self, parent: str, remove_folder: bool = False) -> int:
+        """Delete all assets below a folder (and the folder itself if
+        remove_folder). Raises the first error if any deletion failed.
+        Returns the number of assets deleted"""
+        asset_names = [a["name"] for a in self.list_tree(parent)]
+        if remove_folder:
+            asset_names.append(parent)
+        raise_failures(self.delete(asset_names))
+        return len(asset_names)
+
+
+def raise_failures(failures: List[Tuple[Tuple, Exception]]) -> None:
+    """Raise the error of the first failed call, if any"""
+    if len(failures) > 0:
+        raise failures[0][1]
@@ -0,0 +1,100 @@
+""" Local index of the assets written by an analysis to its EE folder.
+
+    Task outputs are written to <ps_heet_folder>/<fileprefix><dam id> (see
+    heet_export.export_job_specs). Indexing a single folder listing by file
+    prefix and dam id lets the state of every dam be looked up locally instead
+    of with one server request per dam and asset type """
+import re
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+# <fileprefix><dam id> at the end of an asset name e.g. .../XHEET/tmp/C_12
+asset_name_pattern = re.compile(r"(?:^|/)([A-Za-z0-9]+_)(\d+)$")
+
+
+def parse_asset_name(asset_name: str) -> Optional[Tuple[str, int]]:
+    """Split an asset name into (fileprefix, dam id). Returns None for
+    assets that are not per-dam task outputs (e.g. user_inputs)"""
+    match = asset_name_pattern.search(asset_name)
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def index_assets(assets: Iterable[dict]) -> Dict[str, Dict[int, dict]]:
+    """Index an asset listing (as returned by ee.data.listAssets) by
+    fileprefix and dam id"""
+    index: Dict[str, Dict[int, dict]] = {}
+    for asset in assets:
+        asset_name = asset.get("name", asset.get("id", ""))
+        parsed = parse_asset_name(asset_name)
+        if parsed is None:
+            continue
+        fileprefix, dam_id = parsed
+        index.setdefault(fileprefix, {})[dam_id] = asset
+    return index
+
+
+# <fileprefix>batch_<dam id> e.g. .../XHEET/tmp/C_batch_12; one table with
+# the outputs of several dams (rows with their dam's id), named after the
+# first dam of the batch
+batch_asset_name_pattern = re.compile(r"(?:^|/)([A-Za-z0-9]+_)batch_(\d+)$")
+
+
+def parse_batch_asset_name(asset_name: str) -> Optional[Tuple[str, int]]:
+    """Split a batch table name into (fileprefix, first dam id). Returns
+    None for other assets"""
+    match = batch_asset_name_pattern.search(asset_name)
+    if match is None:
+        return None
+    return match.group(1), int(match.group(2))
+
+
+def add_batch_asset(
+    index: Dict[str, Dict[int, dict]], fileprefix: str, asset: dict, dam_ids: Iterable[int]
+) -> None:
+    """Index a batch table under each of its dams (entries are marked with
+    "batch": True). A dam's own asset takes precedence over a batch table"""
+    prefix_index = index.setdefault(fileprefix, {})
+    for dam_id in dam_ids:
+        prefix_index.setdefault(int(dam_id), dict(asset, batch=True))
+
+
+# File prefixes of the profiled outputs of each dam, in critical path order
+# (snapped point, catchment, reservoir, non-inundated catchment, river)
+profiled_output_prefixes = ["PS_", "C_", "R_", "N_", "MS_"]
+
+
+def dam_error_code(asset_index: Dict[str, Dict[int, dict]], dam_id: int) -> int:
+    """Error code of a dam in the output parameters: 0 if all its profiled
+    outputs exist, otherwise 1 + the position of the first missing output
+    (1: snapping failed, 2: no catchment, 3: no reservoir, 4: no
+    non-inundated catchment, 5: no river)"""
+    for position, fileprefix in enumerate(profiled_output_prefixes):
+        if dam_id not in asset_index.get(fileprefix, {}):
+            return position + 1
+    return 0
+
+
+def asset_id(asset: dict) -> str:
+    """Asset id of an entry of an asset listing"""
+    return asset.get("id", asset.get("name"))
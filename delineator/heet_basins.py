@@ -5,6 +5,7 @@ try:
     from delineator import heet_config as cfg
     from delineator import heet_data as dta
     from delineator import heet_export
+    from delineator import heet_hybas_index
     from delineator import heet_monitor as mtr
     from delineator import heet_snap
     from delineator import heet_log as lg
@@ -15,6 +16,7 @@ except ModuleNotFoundError:
     import heet_config as cfg
     import heet_data as dta
     import heet_export
+    import heet_hybas_index
     import heet_monitor as mtr
     import heet_snap
     import heet_log as lg
@@ -126,6 +128,87 @@ def find_hybas_bounding_level(damFeat):
     return bounding_level
 
 
+def subbasins_by_dam(points_ftc):
+    """(HYBAS_ID, PFAF_ID) of the hydrobasins level 12 subbasins the points
+    of a collection (dams, with their id) are located in, by dam id (points
+    outside hydrobasins are left out), with one request"""
+
+    def tag_subbasin(feat):
+        subbasins = dta.HYDROBASINS12.filterBounds(feat.geometry())
+        return feat.set(
+            {
+                "HYBAS_IDS": subbasins.aggregate_array("HYBAS_ID"),
+                "PFAF_IDS": subbasins.aggregate_array("PFAF_ID"),
+            }
+        )
+
+    rows = (
+        points_ftc.map(tag_subbasin)
+        .reduceColumns(ee.Reducer.toList(3), ["id", "HYBAS_IDS", "PFAF_IDS"])
+        .get("list")
+        .getInfo()
+    )
+    return {
+        int(dam_id): (int(hybas_ids[0]), int(pfaf_ids[0]))
+        for dam_id, hybas_ids, pfaf_ids in rows
+        if len(hybas_ids) > 0 and len(pfaf_ids) > 0
+    }
+
+
+def chunked_subbasins(chunk_points_ftc, c_dam_ids):
+    """Level 12 subbasins of dams (see subbasins_by_dam), fetched
+    cfg.subbasin_lookup_chunk_size dams per request so that each request
+    stays within the limits of interactive computations. chunk_points_ftc
+    returns the points of a list of dam ids. The dams of a request that
+    fails are mapped to None (and are handled one by one)"""
+    dam_subbasins = {}
+    chunk_size = cfg.subbasin_lookup_chunk_size
+    for start in range(0, len(c_dam_ids), chunk_size):
+        chunk = [int(c_dam_id) for c_dam_id in c_dam_ids[start : start + chunk_size]]
+        try:
+            dam_subbasins.update(subbasins_by_dam(chunk_points_ftc(chunk)))
+        except Exception as error:
+            logger.exception(f"[chunked_subbasins] Finding the sub-basins of dams {chunk}")
+            dam_subbasins.update({dam_id: None for dam_id in chunk})
+    return dam_subbasins
+
+
+def dams_subbasins(dams_ftc, c_dam_ids):
+    """Level 12 subbasins of the raw dam locations (see chunked_subbasins)"""
+    return chunked_subbasins(
+        lambda chunk: dams_ftc.filter(ee.Filter.inList("id", ee.List(chunk))), c_dam_ids
+    )
+
+
+def snapped_subbasins(dams_ftc, c_dam_ids):
+    """Level 12 subbasins of the dam locations snapped with
+    heet_snap.batch_snap_hydroriver (see chunked_subbasins; each request
+    snaps its own dams); dams that could not be snapped are left out"""
+    return chunked_subbasins(
+        lambda chunk: heet_snap.batch_snap_hydroriver(
+            dams_ftc.filter(ee.Filter.inList("id", ee.List(chunk)))
+        ).filter(ee.Filter.eq("snap_failed", 0)),
+        c_dam_ids,
+    )
+
+
+def local_bounding_levels(dam_subbasins):
+    """Hydrobasins bounding levels of dams (see find_hybas_bounding_level),
+    resolved for all the dams at once from their level 12 subbasins (see
+    dams_subbasins) and the local HydroBASINS index. Returns bounding levels
+    (str) by dam id"""
+    hybas_index = heet_hybas_index.load_index(cfg.hybas_index_path)
+    dam_subbasins = {
+        dam_id: subbasin for dam_id, subbasin in dam_subbasins.items() if subbasin is not None
+    }
+    resolved = hybas_index.bounding_levels(
+        pfaf_id for hybas_id, pfaf_id in dam_subbasins.values()
+    )
+    return {
+        dam_id: str(level) for dam_id, (level, code) in zip(dam_subbasins.keys(), resolved)
+    }
+
+
 #  Functions for subbasin finding method 1 (trace ancestors)
 
 
@@ -237,11 +320,75 @@ def get_trailA(A, B):
 
 def batch_find_upstream_basins(dams_ftc, c_dam_ids):
 
+    # Level 12 subbasins of the snapped dams, fetched a chunk of dams per
+    # request (needed to batch the snapped points and by the local
+    # HydroBASINS index). Dams whose sub-basin could not be fetched (None)
+    # are snapped and looked up on their own
+    dam_outlets = None
+    if cfg.batch_snapping == True or cfg.upstreamMethod == 4:
+        try:
+            logger.info("Finding the hydrobasins level 12 sub-basins of the snapped dams")
+            dam_outlets = snapped_subbasins(dams_ftc, c_dam_ids)
+        except Exception as error:
+            logger.exception(
+                "[ERROR] Finding the hydrobasins level 12 sub-basins of the snapped dams"
+            )
+
+    bounding_levels = {}
+    if cfg.local_bounding_level == True:
+        try:
+            logger.info("Resolving the hydrobasins bounding levels in the local index")
+            bounding_levels = local_bounding_levels(dams_subbasins(dams_ftc, c_dam_ids))
+        except Exception as error:
+            # Dams fall back on find_hybas_bounding_level
+            logger.exception(
+                "[ERROR] Resolving the hydrobasins bounding levels in the local index"
+            )
+
+    # Upstream sub-basins are looked up in the local HydroBASINS index; no
+    # dam can be analysed without it
+    hybas_index = None
+    if cfg.upstreamMethod == 4:
+        try:
+            hybas_index = heet_hybas_index.load_index(cfg.hybas_index_path)
+        except Exception as error:
+            msg = f"Loading the local HydroBASINS index {cfg.hybas_index_path} ({error})"
+            logger.exception(f"[ERROR] {msg}")
+            for c_dam_id in c_dam_ids:
+                mtr.pipeline.fail(int(c_dam_id), msg)
+            return
+
+    # Dams on the same river system reuse the upstream sub-basins of the
+    # dams above them (see heet_hybas_index.UpstreamCascade). Without the
+    # snapped dams' sub-basins, each dam is looked up on its own
+    cascade = None
+    if hybas_index is not None and dam_outlets is not None:
+        cascade = heet_hybas_index.UpstreamCascade(hybas_index)
+        c_dam_ids = cascade.order(
+            c_dam_ids,
+            {
+                dam_id: outlet[0]
+                for dam_id, outlet in dam_outlets.items()
+                if outlet is not None
+            },
+        )
+
+    # Outlet sub-basin and upstream sub-basins of the batched dams
+    outlet_ids = {}
+    ancestor_ids = {}
+
     for c_dam_id in c_dam_ids:
 
         c_dam_id_str = str(c_dam_id)
         dam_id = ee.Number(c_dam_id)
 
+        # Snapped point exported to the batch table (see
+        # heet_export.export_batch_ftc) if the dam's sub-basin is known
+        dam_outlet = None
+        if dam_outlets is not None:
+            dam_outlet = dam_outlets.get(int(c_dam_id))
+        batched = cfg.batch_snapping == True and dam_outlet is not None
+
         damFeat = dams_ftc.filter(ee.Filter.eq("id", dam_id)).first()
 
         if debug_mode == True:
@@ -265,50 +412,47 @@ def batch_find_upstream_basins(dams_ftc, c_dam_ids):
 
             except Exception as error:
                 logger.exception(f"{msg} {c_dam_id_str}")
+                mtr.pipeline.fail(int(c_dam_id_str), msg)
                 continue
 
         # ==================================================================
         # Snap Location
         # ==================================================================
 
+        if dam_outlets is not None and int(c_dam_id) not in dam_outlets:
+            # No river reach within the search radius, or outside hydrobasins
+            msg = "Dam could not be snapped to a river reach within hydrobasins"
+            logger.info(f"{msg} {c_dam_id_str}")
+            mtr.pipeline.fail(int(c_dam_id_str), msg)
+            continue
+
         try:
-            snappedDamFeat = heet_snap.jensen_snap_hydroriver(damFeat)
+            if not batched:
+                snappedDamFeat = heet_snap.jensen_snap_hydroriver(damFeat)
             logger.info(f"Snapping Dam Location {c_dam_id_str}")
 
         except Exception as error:
             print(error, c_dam_id_str)
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
         # ==================================================================
         # Find upstream sub-basins
         # ==================================================================
 
-        try:
-            # Find the highest hydrobasin level that completely encloses the
-            # catchment
-            logger.info(
-                "Finding the highest Hydrobasins level that encloses the catchment"
-            )
-
-            hybas_bounding_level = find_hybas_bounding_level(damFeat)
-            outlet_pt_sbasin_bl = get_subbasin(snappedDamFeat, hybas_bounding_level)
-            opt_bl_spfafid = outlet_pt_sbasin_bl.get("SPFAF_ID")
-
-        except Exception as error:
-            logger.exception(
-                "Finding highest hydrobasin level and bounding basin that encloses the catchment"
-            )
-            continue
-
         try:
             # Find the hydrobasins level 12 subbasin the dam is in
             logger.info("Finding the hydrobasins level 12 sub-basin of the dam")
 
-            outlet_pt_sbasin_12 = get_subbasin(snappedDamFeat, "12")
+            if dam_outlet is not None:
+                opt_12_hybasid, opt_12_pfafid = dam_outlet
+                opt_12_spfafid = str(opt_12_pfafid)
+            else:
+                outlet_pt_sbasin_12 = get_subbasin(snappedDamFeat, "12")
 
-            opt_12_hybasid = outlet_pt_sbasin_12.get("HYBAS_ID")
-            opt_12_pfafid = outlet_pt_sbasin_12.get("PFAF_ID")
+                opt_12_hybasid = outlet_pt_sbasin_12.get("HYBAS_ID")
+                opt_12_pfafid = outlet_pt_sbasin_12.get("PFAF_ID")
+                opt_12_spfafid = outlet_pt_sbasin_12.get("SPFAF_ID")
 
             dam_subbasin_feat = dta.HYDROBASINS12.filter(
                 ee.Filter.eq("HYBAS_ID", opt_12_hybasid)
@@ -317,6 +461,34 @@ def batch_find_upstream_basins(dams_ftc, c_dam_ids):
         except Exception as error:
             logger.info("Finding Highest Hydrobasins level that encloses the catchment")
 
+        try:
+            # Find the highest hydrobasin level that completely encloses the
+            # catchment
+            logger.info(
+                "Finding the highest Hydrobasins level that encloses the catchment"
+            )
+
+            if int(c_dam_id) in bounding_levels:
+                hybas_bounding_level = bounding_levels[int(c_dam_id)]
+            else:
+                hybas_bounding_level = find_hybas_bounding_level(damFeat)
+
+            if int(c_dam_id) in bounding_levels or dam_outlet is not None:
+                # The code of the bounding basin is the prefix of the level
+                # 12 code
+                opt_bl_spfafid = ee.String(opt_12_spfafid).slice(
+                    0, ee.Number.parse(hybas_bounding_level)
+                )
+            else:
+                outlet_pt_sbasin_bl = get_subbasin(snappedDamFeat, hybas_bounding_level)
+                opt_bl_spfafid = outlet_pt_sbasin_bl.get("SPFAF_ID")
+
+        except Exception as error:
+            msg = "Finding highest hydrobasin level and bounding basin that encloses the catchment"
+            logger.exception(msg)
+            mtr.pipeline.fail(int(c_dam_id_str), msg)
+            continue
+
         try:
             # Remove (filter out) subbasins that cannot be upstream of the dam
             # from hydrobasins 12 to limit search space
@@ -345,7 +517,9 @@ def batch_find_upstream_basins(dams_ftc, c_dam_ids):
                 logger.info("Finding upstream sub-basins by tracing ancestors")
                 upstream_subbasins_list = get_ancestors(opt_12_hybasid, SHYDROBASINS12)
             except Exception as error:
-                logger.exception(" Finding upstream sub-basins by tracing ancestors")
+                msg = "Finding upstream sub-basins by tracing ancestors"
+                logger.exception(f" {msg}")
+                mtr.pipeline.fail(int(c_dam_id_str), msg)
                 continue
 
         if cfg.upstreamMethod == 2:
@@ -355,13 +529,15 @@ def batch_find_upstream_basins(dams_ftc, c_dam_ids):
                     SHYDROBASINS12.aggregate_array("HYBAS_ID")
                 )
             except Exception as error:
-                logger.exception("Heuristics - remove downstream sub-basins")
+                msg = "Heuristics - remove downstream sub-basins"
+                logger.exception(msg)
+                mtr.pipeline.fail(int(c_dam_id_str), msg)
                 continue
 
         if cfg.upstreamMethod == 3:
 
             def tag_upstream(feat):
-                A = outlet_pt_sbasin_12.get("SPFAF_ID")
+                A = opt_12_spfafid
                 B = feat.get("SPFAF_ID")
 
                 trailA = get_trailA(A, B)
@@ -382,11 +558,33 @@ def batch_find_upstream_basins(dams_ftc, c_dam_ids):
                 upstream_subbasins_list = ee.List(UPSTREAM.aggregate_array("HYBAS_ID"))
 
             except Exception as error:
-                logger.exception(
-                    "[ERROR] Identifying upstream sub-basins from pfafstetter ids"
-                )
+                msg = "Identifying upstream sub-basins from pfafstetter ids"
+                logger.exception(f"[ERROR] {msg}")
+                mtr.pipeline.fail(int(c_dam_id_str), msg)
+                continue
+
+        if cfg.upstreamMethod == 4:
+            try:
+                logger.info("Finding upstream sub-basins in the local HydroBASINS index")
+                # The snapped dam's sub-basin is looked up locally
+                if cascade is not None and dam_outlet is not None:
+                    upstream_subbasins_list = ee.List(cascade.ancestors(opt_12_hybasid))
+                else:
+                    upstream_subbasins_list = ee.List(
+                        hybas_index.ancestors(int(ee.Number(opt_12_hybasid).getInfo()))
+                    )
+            except Exception as error:
+                # e.g. the sub-basin is not in the index
+                msg = "Finding upstream sub-basins in the local HydroBASINS index"
+                logger.exception(f"[ERROR] {msg} {c_dam_id_str}")
+                mtr.pipeline.fail(int(c_dam_id_str), msg)
                 continue
 
+        if batched:
+            outlet_ids[c_dam_id_str] = opt_12_hybasid
+            ancestor_ids[c_dam_id_str] = ee.String.encodeJSON(upstream_subbasins_list)
+            continue
+
         snappedDamFeat = snappedDamFeat.set("outlet_subcatch_id", opt_12_hybasid)
         snappedDamFeat = snappedDamFeat.set(
             "ancestor_ids", ee.String.encodeJSON(upstream_subbasins_list)
@@ -406,6 +604,7 @@ def batch_find_upstream_basins(dams_ftc, c_dam_ids):
                 )
             except Exception as error:
                 logger.exception(f"{msg} {c_dam_id_str}")
+                mtr.pipeline.fail(int(c_dam_id_str), msg)
                 continue
 
         if debug_mode == True:
@@ -413,6 +612,65 @@ def batch_find_upstream_basins(dams_ftc, c_dam_ids):
                 "[batch_find_upstream_basins] snappedDamFeat", snappedDamFeat.getInfo()
             )
 
+    if cfg.exportSnappedDamPts == True and len(ancestor_ids) > 0:
+        msg = """Exporting snapped dam locations"""
+
+        def dam_snapped_point(c_dam_id_str):
+            # The dam snapped on its own (if the batch task fails)
+            return batch_snapped_points(
+                dams_ftc,
+                {c_dam_id_str: outlet_ids[c_dam_id_str]},
+                {c_dam_id_str: ancestor_ids[c_dam_id_str]},
+            )
+
+        try:
+            logger.info(f"{msg} {list(ancestor_ids.keys())}")
+            heet_export.export_batch_ftc(
+                batch_snapped_points(dams_ftc, outlet_ids, ancestor_ids),
+                list(ancestor_ids.keys()),
+                "snapped_dam_location",
+                dam_snapped_point,
+            )
+        except Exception as error:
+            logger.exception(f"{msg} {list(ancestor_ids.keys())}")
+            # Exported one by one instead
+            for c_dam_id_str in ancestor_ids:
+                try:
+                    heet_export.export_ftc(
+                        dam_snapped_point(c_dam_id_str), c_dam_id_str, "snapped_dam_location"
+                    )
+                except Exception as error:
+                    logger.exception(f"Exporting snapped dam location {c_dam_id_str}")
+                    mtr.pipeline.fail(int(c_dam_id_str), msg)
+
+    if cascade is not None:
+        logger.info(
+            f"[batch_find_upstream_basins] Upstream sub-basins of {len(cascade.found)} "
+            + f"dam sub-basins found, {cascade.reused_searches} from upstream dams' "
+            + f"results ({cascade.reused_basins} sub-basins reused)"
+        )
+
+
+def batch_snapped_points(dams_ftc, outlet_ids, ancestor_ids):
+    """Snapped points of a batch of dams (see heet_snap.batch_snap_hydroriver)
+    with their outlet sub-basin and upstream sub-basins (by dam id str), as
+    one collection snapped and mapped from the batch's dams only"""
+    dam_id_strs = list(ancestor_ids.keys())
+    outlets = ee.Dictionary.fromLists(dam_id_strs, [outlet_ids[k] for k in dam_id_strs])
+    ancestors = ee.Dictionary.fromLists(dam_id_strs, [ancestor_ids[k] for k in dam_id_strs])
+
+    def set_subbasins(feat):
+        key = ee.Number(feat.get("id")).toInt().format("%d")
+        return (
+            ee.Feature(feat.geometry())
+            .copyProperties(feat, None, ["snap_failed"])
+            .set({"outlet_subcatch_id": outlets.get(key), "ancestor_ids": ancestors.get(key)})
+        )
+
+    return heet_snap.batch_snap_hydroriver(
+        dams_ftc.filter(ee.Filter.inList("id", ee.List([int(k) for k in dam_id_strs])))
+    ).map(set_subbasins)
+
 
 if __name__ == "__main__":
 
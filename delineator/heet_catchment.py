@@ -478,11 +478,12 @@ def batch_delineate_nicatchments(c_dam_ids):
         dam_id = ee.Number(c_dam_id)
         c_dam_id_str = str(c_dam_id)
 
-        catchment_vector = cfg.ps_heet_folder + "/" + "C_" + c_dam_id_str
-        reservoir_vector = cfg.ps_heet_folder + "/" + "R_" + c_dam_id_str
+        # The dam's own asset or its rows of a batch table
+        catchment_vector = heet_export.dam_output_ftc("C_", c_dam_id_str)
+        reservoir_vector = heet_export.dam_output_ftc("R_", c_dam_id_str)
 
-        catch_geom = ee.FeatureCollection(catchment_vector).geometry()
-        res_geom = ee.FeatureCollection(reservoir_vector).geometry()
+        catch_geom = catchment_vector.geometry()
+        res_geom = reservoir_vector.geometry()
 
         # Properties
         core_properties = ee.List(
@@ -522,7 +523,7 @@ def batch_delineate_nicatchments(c_dam_ids):
 
         except Exception as error:
             logger.error(f"{msg} {c_dam_id_str}")
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
 
@@ -546,10 +547,9 @@ def batch_delineate_catchments(c_dam_ids):
         dam_id = ee.Number(c_dam_id)
         c_dam_id_str = str(c_dam_id)
 
-        snapped_point_name = cfg.ps_heet_folder + "/" + "PS_" + c_dam_id_str
-
-        # First OK (always single feature)
-        damFeat = ee.FeatureCollection(snapped_point_name).first()
+        # First OK (always single feature); the dam's own asset or its row
+        # of a batch table
+        damFeat = heet_export.dam_output_ftc("PS_", c_dam_id_str).first()
 
         # ==========================================================================
         # Prepare inputs for local catchment search
@@ -568,7 +568,7 @@ def batch_delineate_catchments(c_dam_ids):
 
             if debug_mode == True:
                 print("[DEBUG] [batch_delineate_catchments] Exception", error)
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
         # [1-i] Export ftc of Watershed grid points
@@ -606,7 +606,7 @@ def batch_delineate_catchments(c_dam_ids):
 
             if debug_mode == True:
                 print("[DEBUG] [batch_delineate_catchments] Exception", error)
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
         # [3] Identify position of snapped dam on search grid
@@ -628,7 +628,7 @@ def batch_delineate_catchments(c_dam_ids):
 
             if debug_mode == True:
                 print("[DEBUG] [batch_delineate_catchments] Exception", error)
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
         # ==========================================================================
@@ -647,7 +647,7 @@ def batch_delineate_catchments(c_dam_ids):
             if valid_grid == True:
                 watershed_pt_indices = rapid_catchment_cs(watershedGridFeat, c_dam_id)
             else:
-                mtr.active_analyses.remove(int(c_dam_id_str))
+                mtr.pipeline.fail(int(c_dam_id_str))
                 continue
 
         except Exception as error:
@@ -655,7 +655,7 @@ def batch_delineate_catchments(c_dam_ids):
 
             if debug_mode == True:
                 print("[DEBUG] [batch_delineate_catchments] Exception", error)
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
         # [4] Detect points that make up the catchment
@@ -713,7 +713,7 @@ def batch_delineate_catchments(c_dam_ids):
 
             if debug_mode == True:
                 print("[DEBUG] [batch_delineate_catchments] Exception", error)
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
         # ==========================================================================
@@ -742,7 +742,7 @@ def batch_delineate_catchments(c_dam_ids):
 
             if debug_mode == True:
                 print("[DEBUG] [batch_delineate_catchments] Exception", error)
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
 
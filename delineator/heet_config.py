@@ -14,8 +14,19 @@ from datetime import datetime
 jensen_search_radius = 1000
 
 # Select upstream basin finding method
+# - 1: trace ancestors (server-side)
+# - 2: heuristic
+# - 3: pfafstetter ids (server-side)
+# - 4: local HydroBASINS topology index (hybas_index_path; see heet_hybas_index)
 upstreamMethod = 3
 
+# Local HydroBASINS topology index used by upstream method 4
+hybas_index_path = "data/hybas_index.sqlite"
+
+# Resolve the hydrobasins bounding levels of the dams in the local index
+# (hybas_index_path) instead of level by level on the server
+local_bounding_level = False
+
 # Select DEM
 # Use hydrologically conditioned DEM for parameter calculations?
 paramHydroDEM = True
@@ -32,6 +43,45 @@ hydrodataset = "03"
 # Use raw/snapped dam location for reservoir delineation
 delineate_snapped = True
 
+# Maximum number of unfinished HEET tasks in the EE queue. Further tasks wait
+# in a local queue (critical path tasks first; see heet_queue)
+max_tasks_in_flight = 50
+
+# Failed critical path tasks with a transient error (see heet_retry) are
+# resubmitted up to max_task_attempts submissions in total, after a delay
+# doubling from retry_base_delay_s (at most retry_max_delay_s) with jitter
+max_task_attempts = 3
+retry_base_delay_s = 60
+retry_max_delay_s = 900
+
+# The EE task queue is polled when the next task is expected to complete,
+# judging from the tasks completed so far (see heet_poll), but at least
+# every poll_max_step_s and at most every poll_min_step_s seconds
+poll_min_step_s = 5
+poll_max_step_s = 60
+
+# Number of worker threads making blocking EE client calls during the
+# analysis (stage actions and task starts; see heet_orchestrator)
+max_ee_workers = 8
+
+# Number of worker threads listing, deleting and renaming assets
+# (see heet_asset_ops)
+max_asset_workers = 8
+
+# Profile the catchments (reservoirs, non-inundated catchments) of all dams
+# that become ready in a poll cycle together: the mean-style metrics are
+# computed with one reduceRegions per layer group and the profiles of the
+# batch are exported to one table with a single task
+batch_profiling = False
+
+# Snap all the dams of a run to hydrorivers in one pass and export their
+# snapped points to one table with a single task
+batch_snapping = False
+
+# Number of dams whose hydrobasins level 12 sub-basins are fetched (and
+# snapped) per request; the dams of a request that fails are handled one by one
+subbasin_lookup_chunk_size = 100
+
 # ==============================================================================
 # Export Options
 # ==============================================================================
@@ -41,6 +91,14 @@ delineate_snapped = True
 export_to_drive = False
 direct_to_vis = True
 
+# Input tables of more than upload_chunk_size dams are uploaded in chunks of
+# upload_chunk_size dams (separate assets merged on the server)
+upload_chunk_size = 2500
+
+# Also write the output parameters table to output_parameters.parquet
+# (requires pyarrow)
+output_parquet = False
+
 # Export settings for "standard" outputs
 exportRawDamPts = False
 exportSnappedDamPts = True
@@ -71,6 +129,8 @@ exportMainRiver = True
 
 # Define name of the folder for storing temporary files/assets in EE
 heet_folder = "XHEET/tmp"
+# Descriptions of the EE tasks submitted by HEET start with this prefix
+task_prefix = "XHEET-X"
 # Define folder names (Must come after ee authentication check)
 # Find the list of root folders the user owns in the Earth Engine
 
@@ -97,3 +157,15 @@ dams_table_path = ps_heet_folder + "/" + "user_inputs"
 # Set in heet_cli
 output_drive_folder = ""
 output_asset_folder_name = ""
+
+
+def set_job_namespace(jobname: str) -> None:
+    """Give a job its own EE workspace, so that several jobs can share one EE
+    project and run at the same time. Temporary assets of the job are stored
+    in XHEET/tmp/<jobname> and its tasks are named XHEET-<jobname>-X..."""
+    global heet_folder, ps_heet_folder, dams_table_path, task_prefix
+
+    heet_folder = "XHEET/tmp/" + jobname
+    ps_heet_folder = root_folder + "/" + heet_folder
+    dams_table_path = ps_heet_folder + "/" + "user_inputs"
+    task_prefix = "XHEET-" + jobname + "-X"
@@ -13,6 +13,8 @@ try:
     from delineator import heet_config as cfg
     from delineator import heet_monitor as mtr
     from delineator import heet_task
+    from delineator import heet_results
+    from delineator import heet_assets
     from delineator import heet_log as lg
 
 except ModuleNotFoundError:
@@ -23,6 +25,8 @@ except ModuleNotFoundError:
     import heet_config as cfg
     import heet_monitor as mtr
     import heet_task
+    import heet_results
+    import heet_assets
     import heet_log as lg
 
 # Gets or creates a logger
@@ -185,31 +189,50 @@ export_job_specs = {
 }
 
 
+def iter_ftc_pages(ftc, page_size=1000):
+    # Download the properties of the features in a FeatureCollection, one
+    # page of features per request (geometries are not downloaded). Yields
+    # a list of rows (dicts) per page, so that pages need not all be held in
+    # memory (a single getInfo fails above 5000 features)
+    ftc = ftc.map(lambda feat: feat.setGeometry(None))
+    n_features = ftc.size().getInfo()
+
+    for offset in range(0, n_features, page_size):
+        feats = ftc.toList(page_size, offset).getInfo()
+        yield [ft["properties"] for ft in feats]
+
+
 def ftc_to_df(ftc):
     # Convert a FeatureCollection into a pandas DataFrame
-    feats = ftc.getInfo()["features"]
-
     rows_dict_list = []
+    for rows in iter_ftc_pages(ftc):
+        rows_dict_list.extend(rows)
+    return pd.DataFrame(rows_dict_list)
 
-    for ft in feats:
-        props = ft["properties"]
-        rows_dict_list.append(props)
-
-    df = pd.DataFrame(rows_dict_list)
 
-    return df
+def output_table_schema():
+    # Fields (name and type) of the output parameters table
+    yaml_file_path = Path("utils", "outputs.resource.yaml")
+    with yaml_file_path.open("r", encoding="utf-8") as ymlfile:
+        profile = yaml.safe_load(ymlfile)
+    return profile["schema"]["fields"]
 
 
-def prepare_output_table(df):
+def prepare_output_table(df, schema_fields=None):
+    # schema_fields: see output_table_schema (read if not given)
 
-    d_lookup = {"any": "str", "string": "str", "number": "float", "integer": "int"}
+    d_lookup = {
+        "any": "str",
+        "string": "str",
+        "number": "float",
+        "integer": "int",
+        "boolean": "bool",
+    }
 
-    yaml_file_path = Path("utils", "outputs.resource.yaml")
-    with yaml_file_path.open("r", encoding="utf-8") as ymlfile:
-        profile = yaml.safe_load(ymlfile)
+    if schema_fields is None:
+        schema_fields = output_table_schema()
 
     # Add missing fields
-    schema_fields = profile["schema"]["fields"]
     schema_field_names = [e["name"] for e in schema_fields]
     fields_detected = df.columns.to_list()
 
@@ -228,22 +251,110 @@ def prepare_output_table(df):
     return df
 
 
-def download_output_parameters(output_folder_path):
+def parquet_schema(schema_fields):
+    # Arrow schema of the output parameters table. Numeric fields are typed;
+    # missing data codes (e.g. "ND") in numeric fields become nulls (they
+    # are kept in the csv)
+    import pyarrow as pa
+
+    types = {"number": pa.float64(), "integer": pa.float64(), "boolean": pa.bool_()}
+    return pa.schema([(e["name"], types.get(e["type"], pa.string())) for e in schema_fields])
+
+
+def parquet_chunk(df, schema):
+    # Convert a chunk of the output parameters table to the Arrow schema
+    import pyarrow as pa
+
+    df = df.copy()
+    for field in schema:
+        if pa.types.is_floating(field.type):
+            df[field.name] = pd.to_numeric(df[field.name], errors="coerce")
+        elif pa.types.is_boolean(field.type):
+            df[field.name] = df[field.name].map(
+                lambda v: v if isinstance(v, bool) else None
+            )
+        else:
+            df[field.name] = df[field.name].map(lambda v: None if pd.isna(v) else str(v))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+def output_parameters_pages(output_folder_path, page_size=1000):
+    # Pages of rows of the output_parameters table: from the rows streamed
+    # to output_parameters.jsonl as dams completed (see heet_results) or,
+    # if there is none, from the output_parameters asset
+    result_stream = heet_results.ResultStream(
+        Path(output_folder_path, heet_results.results_file_name)
+    )
+    if result_stream.file_path.exists():
+        return result_stream.pages(page_size)
+    asset_name = cfg.ps_heet_folder + "/" + "output_parameters"
+    return iter_ftc_pages(ee.FeatureCollection(asset_name), page_size)
+
+
+def download_output_parameters(output_folder_path, parquet=None, page_size=1000):
+    # Write the output_parameters table to output_parameters.csv (and
+    # output_parameters.parquet if parquet, by default cfg.output_parquet)
+    # one page of dams at a time, so that memory use does not grow with the
+    # number of dams
+    if parquet is None:
+        parquet = cfg.output_parquet
+
+    parquet_writer = None
     try:
-        asset_name = cfg.ps_heet_folder + "/" + "output_parameters"
-        output_parameters_ftc = ee.FeatureCollection(asset_name)
-        df = ftc_to_df(output_parameters_ftc)
-        df = prepare_output_table(df)
-        df.to_csv(Path(output_folder_path, "output_parameters.csv"), index=False)
+        schema_fields = output_table_schema()
+
+        if parquet:
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                logger.warning(
+                    "[download_output_parameters] pyarrow is not installed; "
+                    + "output_parameters.parquet not written"
+                )
+            else:
+                schema = parquet_schema(schema_fields)
+                parquet_writer = pq.ParquetWriter(
+                    str(Path(output_folder_path, "output_parameters.parquet")), schema
+                )
+
+        csv_file_path = Path(output_folder_path, "output_parameters.csv")
+        header = True
+        for rows in output_parameters_pages(output_folder_path, page_size):
+            df = prepare_output_table(pd.DataFrame(rows), schema_fields)
+            df.to_csv(csv_file_path, index=False, header=header, mode="w" if header else "a")
+            header = False
+            if parquet_writer is not None:
+                parquet_writer.write_table(parquet_chunk(df, schema))
+
+        if header:
+            # Empty table
+            prepare_output_table(pd.DataFrame(), schema_fields).to_csv(csv_file_path, index=False)
         status = True
     except Exception as error:
         logger.exception(
             "[download_output_parameters] Output parameters not downloaded"
         )
         status = False
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
     return status
 
 
+def iter_output_parameters(output_folder_path, chunksize=1000):
+    # Rows of the output_parameters table read back from the csv written by
+    # download_output_parameters (values as text, missing data codes kept);
+    # read from the output parameters pages if the csv was not written
+    csv_file_path = Path(output_folder_path, "output_parameters.csv")
+    if not csv_file_path.exists():
+        for rows in output_parameters_pages(output_folder_path, chunksize):
+            yield from rows
+        return
+    for df in pd.read_csv(csv_file_path, dtype=str, keep_default_na=False, chunksize=chunksize):
+        for row in df.to_dict(orient="records"):
+            yield row
+
+
 def asset_to_drive(asset_mta):
 
     asset_type = asset_mta["type"]
@@ -268,7 +379,7 @@ def asset_to_drive(asset_mta):
         task_config = {
             "collection": asset_ftc,
             "folder": cfg.output_drive_folder,
-            "description": "XHEET-X011-0" + " Exporting to drive " + item_name,
+            "description": cfg.task_prefix + "011-0" + " Exporting to drive " + item_name,
             "fileFormat": file_format,
             "fileNamePrefix": item_name,
         }
@@ -284,7 +395,7 @@ def asset_to_drive(asset_mta):
 
         task_config = {
             "image": asset_img,
-            "description": "XHEET-X011-0" + " Exporting to drive  " + item_name,
+            "description": cfg.task_prefix + "011-0" + " Exporting to drive  " + item_name,
             "crs": projection["crs"],
             "crsTransform": projection["transform"],
             "fileNamePrefix": item_name,
@@ -292,25 +403,41 @@ def asset_to_drive(asset_mta):
 
         task = ee.batch.Export.image.toDrive(**task_config)
 
-    try:
-        heet_task.robust_task_start(task)
-    except polling2.MaxCallException:
-        logger.error(
-            f"[export_ftc] Several attempts to start export {item_name} \
-                     to drive failed. Possible connectivity issue. Drive export Skipped"
-        )
+    def start_export():
+        try:
+            heet_task.robust_task_start(task)
+        except polling2.MaxCallException:
+            logger.error(
+                f"[export_ftc] Several attempts to start export {item_name} \
+                         to drive failed. Possible connectivity issue. Drive export Skipped"
+            )
+
+    mtr.submission_queue.put("drive_export", item_name, start_export)
+
+    with mtr.task_logs_lock:
+        mtr.all_export_tasks_log[item_name] = task
+        mtr.active_export_tasks_log[item_name] = task
+
 
-    mtr.all_export_tasks_log[item_name] = task
-    mtr.active_export_tasks_log[item_name] = task
+def user_inputs_part_name(part):
+    # Asset name of a part of the user inputs uploaded in chunks
+    return "user_inputs_part_" + str(part)
 
 
-def upload_user_inputs(inputs_ftc):
+def upload_user_inputs(inputs_ftc, part=None):
+    # Upload the user inputs (or, if part is given, one of their chunks; see
+    # merge_user_inputs)
 
-    asset_id = cfg.ps_heet_folder + "/" + "user_inputs"
+    if part is None:
+        asset_id = cfg.ps_heet_folder + "/" + "user_inputs"
+        description = cfg.task_prefix + "000-0" + " User Inputs"
+    else:
+        asset_id = cfg.ps_heet_folder + "/" + user_inputs_part_name(part)
+        description = cfg.task_prefix + "000-" + str(part) + " User Inputs"
 
     task_config = {
         "collection": inputs_ftc,
-        "description": "XHEET-X000-0" + " User Inputs",
+        "description": description,
         "assetId": asset_id,
     }
 
@@ -327,6 +454,82 @@ def upload_user_inputs(inputs_ftc):
     return task
 
 
+def merge_user_inputs(n_parts):
+    # Merge the uploaded chunks of the user inputs into the user_inputs
+    # table on the server
+    parts_ftc = ee.FeatureCollection(
+        [
+            ee.FeatureCollection(cfg.ps_heet_folder + "/" + user_inputs_part_name(part))
+            for part in range(1, n_parts + 1)
+        ]
+    ).flatten()
+    return upload_user_inputs(parts_ftc)
+
+
+def queue_task(task, job_taskcode, c_dam_id_str, asset_id, delay_s=0, attempt=1):
+    # Tasks are started from the submission queue (see heet_queue) as soon as
+    # the number of tasks in the EE queue allows (and delay_s has passed)
+    def start_export():
+        try:
+            heet_task.robust_task_start(task)
+        except polling2.MaxCallException:
+            logger.error(
+                f"[export_ftc] Several attempts to start export {asset_id} failed. \
+                         Possible connectivity issue. Export to assets skipped"
+            )
+            if job_taskcode in mtr.critical_path:
+                for dam_id_str in task_dam_ids(asset_id, c_dam_id_str):
+                    mtr.pipeline.fail(int(dam_id_str))
+        else:
+            for dam_id_str in task_dam_ids(asset_id, c_dam_id_str):
+                record_task(job_taskcode, dam_id_str, task, asset_id, attempt)
+
+    mtr.submission_queue.put(job_taskcode, c_dam_id_str, start_export, delay_s)
+
+
+def task_dam_ids(asset_id, c_dam_id_str):
+    # Dams whose outputs a task exports (several for a batch table)
+    return mtr.batch_tasks.get(asset_id, [c_dam_id_str])
+
+
+def task_asset_id(task):
+    # Asset written by an export task
+    return task.config["assetExportOptions"]["earthEngineDestination"]["name"]
+
+
+def resubmit_task(failed_task, job_taskcode, c_dam_id_str, delay_s, attempt):
+    # Queue a new task with the configuration of a failed task
+    # (a failed batch task is resubmitted once for all its dams)
+    task = ee.batch.Task(
+        None, failed_task.task_type, ee.batch.Task.State.UNSUBMITTED, failed_task.config
+    )
+    asset_id = task_asset_id(failed_task)
+
+    queue_task(task, job_taskcode, c_dam_id_str, asset_id, delay_s, attempt)
+
+    for dam_id_str in task_dam_ids(asset_id, c_dam_id_str):
+        mtr.log_task(job_taskcode, dam_id_str, task)
+    return task
+
+
+def record_task(job_taskcode, c_dam_id_str, task, asset_id, attempt=1):
+    # Record a started export in the run journal (if there is one) so that
+    # an interrupted run can be resumed
+    if mtr.journal is None:
+        return
+    try:
+        mtr.journal.record_task(
+            job_taskcode,
+            c_dam_id_str,
+            task.id,
+            asset_id,
+            task.config.get("description"),
+            attempt,
+        )
+    except Exception:
+        logger.exception(f"[record_task] Problem recording export {asset_id} in the run journal")
+
+
 def export_ftc(location_ftc, c_dam_id_str, jobtype):
 
     # print ("[DEBUG] Exporting", c_dam_id_str, jobtype)
@@ -342,26 +545,101 @@ def export_ftc(location_ftc, c_dam_id_str, jobtype):
 
     task_config = {
         "collection": location_ftc,
-        "description": "XHEET-X" + job_id + "-" + c_dam_id_str + " " + job_desc,
+        "description": cfg.task_prefix + job_id + "-" + c_dam_id_str + " " + job_desc,
         "assetId": asset_id,
     }
 
     task = ee.batch.Export.table.toAsset(**task_config)
 
-    try:
-        heet_task.robust_task_start(task)
-    except polling2.MaxCallException:
-        logger.error(
-            f"[export_ftc] Several attempts to start export {asset_id} failed. \
-                     Possible connectivity issue. Export to assets skipped"
-        )
-        if job_taskcode in mtr.critical_path:
-            mtr.active_analyses.remove(int(c_dam_id_str))
+    queue_task(task, job_taskcode, c_dam_id_str, asset_id)
 
-    mtr.all_tasks_log[job_taskcode][c_dam_id_str] = task
-    mtr.active_tasks_log[job_taskcode][c_dam_id_str] = task
+    mtr.log_task(job_taskcode, c_dam_id_str, task)
 
     # print(mtr.all_tasks_log)
+    return task
+
+
+def export_batch_ftc(location_ftc, c_dam_id_strs, jobtype, dam_ftc=None):
+    """Export the outputs of several dams to one table (their rows carry the
+    dam's id) with a single task. The task is monitored for each of the dams,
+    and later stages read the rows of a dam with dam_output_ftc. dam_ftc
+    returns the collection of one dam (by dam id str), built without the other
+    dams, to export the dams one by one if the task fails (see split_batch)"""
+
+    job_id = export_job_specs[jobtype]["id"]
+    job_desc = export_job_specs[jobtype]["desc"]
+    job_fileprefix = export_job_specs[jobtype]["fileprefix"]
+    job_taskcode = export_job_specs[jobtype]["taskcode"]
+
+    # Named after the first dam of the batch (see heet_assets)
+    batch_key = "batch_" + min(c_dam_id_strs, key=int)
+    asset_id = cfg.ps_heet_folder + "/" + job_fileprefix + batch_key
+
+    task_config = {
+        "collection": location_ftc,
+        "description": cfg.task_prefix + job_id + "-" + batch_key + " " + job_desc,
+        "assetId": asset_id,
+    }
+
+    task = ee.batch.Export.table.toAsset(**task_config)
+
+    mtr.batch_tasks[asset_id] = list(c_dam_id_strs)
+    if dam_ftc is not None:
+        mtr.batch_splits[asset_id] = (jobtype, dam_ftc)
+    heet_assets.add_batch_asset(
+        mtr.batch_outputs, job_fileprefix, {"id": asset_id}, c_dam_id_strs
+    )
+
+    queue_task(task, job_taskcode, batch_key, asset_id)
+
+    for c_dam_id_str in c_dam_id_strs:
+        mtr.log_task(job_taskcode, c_dam_id_str, task)
+
+
+def split_batch(asset_id):
+    """Export the dams of a batch table one task per dam (with export_ftc),
+    e.g. after the batch task failed for good, so that a dam whose outputs
+    cannot be computed does not take the other dams down with it. Returns the
+    new tasks by dam id str (none if the batch cannot be split: a single dam,
+    or no dam_ftc was given to export_batch_ftc)"""
+    c_dam_id_strs = mtr.batch_tasks.get(asset_id, [])
+    if asset_id not in mtr.batch_splits or len(c_dam_id_strs) < 2:
+        return {}
+    jobtype, dam_ftc = mtr.batch_splits.pop(asset_id)
+    job_fileprefix = export_job_specs[jobtype]["fileprefix"]
+    job_taskcode = export_job_specs[jobtype]["taskcode"]
+    del mtr.batch_tasks[asset_id]
+
+    tasks = {}
+    for c_dam_id_str in c_dam_id_strs:
+        # Later stages read the dam's own asset
+        mtr.batch_outputs.get(job_fileprefix, {}).pop(int(c_dam_id_str), None)
+        try:
+            tasks[c_dam_id_str] = export_ftc(dam_ftc(c_dam_id_str), c_dam_id_str, jobtype)
+        except Exception:
+            msg = f"Problem exporting {job_fileprefix}{c_dam_id_str} on its own"
+            logger.exception(f"[split_batch] {msg}")
+            if job_taskcode in mtr.critical_path:
+                mtr.pipeline.fail(int(c_dam_id_str), msg)
+    return tasks
+
+
+def indexed_ftc(asset, c_dam_id):
+    """Collection of a dam from its entry in an asset index (see
+    heet_assets); only the dam's rows if the entry is a batch table"""
+    ftc = ee.FeatureCollection(heet_assets.asset_id(asset))
+    if asset.get("batch", False):
+        ftc = ftc.filter(ee.Filter.eq("id", int(c_dam_id)))
+    return ftc
+
+
+def dam_output_ftc(fileprefix, c_dam_id_str):
+    """Output of a dam written with fileprefix: the dam's own asset, or its
+    rows of a batch table (see export_batch_ftc)"""
+    asset = mtr.batch_outputs.get(fileprefix, {}).get(
+        int(c_dam_id_str), {"id": cfg.ps_heet_folder + "/" + fileprefix + c_dam_id_str}
+    )
+    return indexed_ftc(asset, c_dam_id_str)
 
 
 def export_image(location_img, c_dam_id_str, jobtype):
@@ -376,7 +654,7 @@ def export_image(location_img, c_dam_id_str, jobtype):
 
     task_config = {
         "image": location_img,
-        "description": "XHEET-X" + job_id + "-" + c_dam_id_str + " " + job_desc,
+        "description": cfg.task_prefix + job_id + "-" + c_dam_id_str + " " + job_desc,
         "assetId": asset_id,
         "crs": projection["crs"],
         "crsTransform": projection["transform"],
@@ -384,18 +662,9 @@ def export_image(location_img, c_dam_id_str, jobtype):
 
     task = ee.batch.Export.image.toAsset(**task_config)
 
-    try:
-        heet_task.robust_task_start(task)
-    except polling2.MaxCallException:
-        logger.error(
-            f"[export_ftc] Several attempts to start export {asset_id} failed. \
-                     Possible connectivity issue. Export to assets skipped"
-        )
-        if job_taskcode in mtr.critical_path:
-            mtr.active_analyses.remove(int(c_dam_id_str))
+    queue_task(task, job_taskcode, c_dam_id_str, asset_id)
 
-    mtr.all_tasks_log[job_taskcode][c_dam_id_str] = task
-    mtr.active_tasks_log[job_taskcode][c_dam_id_str] = task
+    mtr.log_task(job_taskcode, c_dam_id_str, task)
 
 
 def generate_empty_json_output():
@@ -462,7 +731,26 @@ def generate_empty_json_output():
     return entry
 
 
-def generate_json_output(out_ft):
+# Values of missing data (not converted to numbers in the json output)
+missing_codes = ["ND", "NA", "UD", "NONE", "NODATA"]
+
+
+def json_value(properties, field_name, cast=float):
+    # Value of a field of the output_parameters table in the json output
+    # (values may be read back from the csv as text e.g. "4.0")
+    value = properties.get(field_name)
+    if value in missing_codes:
+        return value
+    if value is None or value == "":
+        return None
+    if cast is int:
+        return int(float(value))
+    return cast(value)
+
+
+def generate_json_output(properties):
+    """JSON entry of a dam from its row (feature properties) of the
+    output_parameters table"""
 
     # The following categories are deliberately omitted in json
     # output (missing data categories).
@@ -470,171 +758,71 @@ def generate_json_output(out_ft):
     # - r_landcover_bysoil_9
     # - r_landcover_bysoil_18+
 
-    missing_codes = ["ND", "NA", "UD", "NONE", "NODATA"]
-
     entry = {
         "monthly_temps": [
-            float(out_ft.get("r_mean_temp_1").getInfo())
-            if out_ft.get("r_mean_temp_1").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_1").getInfo(),
-            float(out_ft.get("r_mean_temp_2").getInfo())
-            if out_ft.get("r_mean_temp_2").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_2").getInfo(),
-            float(out_ft.get("r_mean_temp_3").getInfo())
-            if out_ft.get("r_mean_temp_3").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_3").getInfo(),
-            float(out_ft.get("r_mean_temp_4").getInfo())
-            if out_ft.get("r_mean_temp_4").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_4").getInfo(),
-            float(out_ft.get("r_mean_temp_5").getInfo())
-            if out_ft.get("r_mean_temp_5").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_5").getInfo(),
-            float(out_ft.get("r_mean_temp_6").getInfo())
-            if out_ft.get("r_mean_temp_6").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_6").getInfo(),
-            float(out_ft.get("r_mean_temp_7").getInfo())
-            if out_ft.get("r_mean_temp_7").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_7").getInfo(),
-            float(out_ft.get("r_mean_temp_8").getInfo())
-            if out_ft.get("r_mean_temp_8").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_8").getInfo(),
-            float(out_ft.get("r_mean_temp_9").getInfo())
-            if out_ft.get("r_mean_temp_9").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_9").getInfo(),
-            float(out_ft.get("r_mean_temp_10").getInfo())
-            if out_ft.get("r_mean_temp_10").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_10").getInfo(),
-            float(out_ft.get("r_mean_temp_11").getInfo())
-            if out_ft.get("r_mean_temp_11").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_11").getInfo(),
-            float(out_ft.get("r_mean_temp_12").getInfo())
-            if out_ft.get("r_mean_temp_12").getInfo() not in missing_codes
-            else out_ft.get("r_mean_temp_12").getInfo(),
+            json_value(properties, "r_mean_temp_1"),
+            json_value(properties, "r_mean_temp_2"),
+            json_value(properties, "r_mean_temp_3"),
+            json_value(properties, "r_mean_temp_4"),
+            json_value(properties, "r_mean_temp_5"),
+            json_value(properties, "r_mean_temp_6"),
+            json_value(properties, "r_mean_temp_7"),
+            json_value(properties, "r_mean_temp_8"),
+            json_value(properties, "r_mean_temp_9"),
+            json_value(properties, "r_mean_temp_10"),
+            json_value(properties, "r_mean_temp_11"),
+            json_value(properties, "r_mean_temp_12"),
         ],
         "catchment": {
-            "runoff": float(out_ft.get("c_mar_mm").getInfo())
-            if out_ft.get("c_mar_mm").getInfo() not in missing_codes
-            else out_ft.get("c_mar_mm").getInfo(),
-            "area": float(out_ft.get("c_area_km2").getInfo())
-            if out_ft.get("c_area_km2").getInfo() not in missing_codes
-            else out_ft.get("c_area_km2").getInfo(),
-            "population": float(out_ft.get("c_population").getInfo())
-            if out_ft.get("c_population").getInfo() not in missing_codes
-            else out_ft.get("c_population").getInfo(),
+            "runoff": json_value(properties, "c_mar_mm"),
+            "area": json_value(properties, "c_area_km2"),
+            "population": json_value(properties, "c_population"),
             "area_fractions": [
-                float(out_ft.get("c_landcover_1").getInfo())
-                if out_ft.get("c_landcover_1").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_1").getInfo(),
-                float(out_ft.get("c_landcover_2").getInfo())
-                if out_ft.get("c_landcover_2").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_2").getInfo(),
-                float(out_ft.get("c_landcover_3").getInfo())
-                if out_ft.get("c_landcover_3").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_3").getInfo(),
-                float(out_ft.get("c_landcover_4").getInfo())
-                if out_ft.get("c_landcover_4").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_4").getInfo(),
-                float(out_ft.get("c_landcover_5").getInfo())
-                if out_ft.get("c_landcover_5").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_5").getInfo(),
-                float(out_ft.get("c_landcover_6").getInfo())
-                if out_ft.get("c_landcover_6").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_6").getInfo(),
-                float(out_ft.get("c_landcover_7").getInfo())
-                if out_ft.get("c_landcover_7").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_7").getInfo(),
-                float(out_ft.get("c_landcover_8").getInfo())
-                if out_ft.get("c_landcover_8").getInfo() not in missing_codes
-                else out_ft.get("c_landcover_8").getInfo(),
+                json_value(properties, "c_landcover_1"),
+                json_value(properties, "c_landcover_2"),
+                json_value(properties, "c_landcover_3"),
+                json_value(properties, "c_landcover_4"),
+                json_value(properties, "c_landcover_5"),
+                json_value(properties, "c_landcover_6"),
+                json_value(properties, "c_landcover_7"),
+                json_value(properties, "c_landcover_8"),
             ],
-            "slope": float(out_ft.get("c_mean_slope_pc").getInfo())
-            if out_ft.get("c_mean_slope_pc").getInfo() not in missing_codes
-            else out_ft.get("c_mean_slope_pc").getInfo(),
-            "precip": float(out_ft.get("c_map_mm").getInfo())
-            if out_ft.get("c_map_mm").getInfo() not in missing_codes
-            else out_ft.get("c_map_mm").getInfo(),
-            "etransp": float(out_ft.get("c_mpet_mm").getInfo())
-            if out_ft.get("c_mpet_mm").getInfo() not in missing_codes
-            else out_ft.get("c_mpet_mm").getInfo(),
-            "soil_wetness": float(out_ft.get("c_masm_mm").getInfo())
-            if out_ft.get("c_masm_mm").getInfo() not in missing_codes
-            else out_ft.get("c_masm_mm").getInfo(),
+            "slope": json_value(properties, "c_mean_slope_pc"),
+            "precip": json_value(properties, "c_map_mm"),
+            "etransp": json_value(properties, "c_mpet_mm"),
+            "soil_wetness": json_value(properties, "c_masm_mm"),
             "biogenic_factors": {
-                "biome": out_ft.get("c_biome").getInfo(),
-                "climate": int(out_ft.get("c_climate_zone").getInfo())
-                if out_ft.get("c_climate_zone").getInfo() not in missing_codes
-                else out_ft.get("c_climate_zone").getInfo(),
-                "soil_type": out_ft.get("c_soil_type").getInfo(),
+                "biome": properties.get("c_biome"),
+                "climate": json_value(properties, "c_climate_zone", int),
+                "soil_type": properties.get("c_soil_type"),
                 "treatment_factor": "NA",
                 "landuse_intensity": "NA",
             },
         },
         "reservoir": {
-            "volume": float(out_ft.get("r_volume_m3").getInfo())
-            if out_ft.get("r_volume_m3").getInfo() not in missing_codes
-            else out_ft.get("r_volume_m3").getInfo(),
-            "area": float(out_ft.get("r_area_km2").getInfo())
-            if out_ft.get("r_area_km2").getInfo() not in missing_codes
-            else out_ft.get("r_area_km2").getInfo(),
-            "max_depth": float(out_ft.get("r_maximum_depth_m").getInfo())
-            if out_ft.get("r_maximum_depth_m").getInfo() not in missing_codes
-            else out_ft.get("r_maximum_depth_m").getInfo(),
-            "mean_depth": float(out_ft.get("r_mean_depth_m").getInfo())
-            if out_ft.get("r_mean_depth_m").getInfo() not in missing_codes
-            else out_ft.get("r_mean_depth_m").getInfo(),
+            "volume": json_value(properties, "r_volume_m3"),
+            "area": json_value(properties, "r_area_km2"),
+            "max_depth": json_value(properties, "r_maximum_depth_m"),
+            "mean_depth": json_value(properties, "r_mean_depth_m"),
             "area_fractions": [
-                float(out_ft.get("r_landcover_bysoil_1").getInfo())
-                if out_ft.get("r_landcover_bysoil_1").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_1").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_2").getInfo())
-                if out_ft.get("r_landcover_bysoil_2").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_2").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_3").getInfo())
-                if out_ft.get("r_landcover_bysoil_3").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_3").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_4").getInfo())
-                if out_ft.get("r_landcover_bysoil_4").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_4").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_5").getInfo())
-                if out_ft.get("r_landcover_bysoil_5").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_5").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_6").getInfo())
-                if out_ft.get("r_landcover_bysoil_6").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_6").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_7").getInfo())
-                if out_ft.get("r_landcover_bysoil_7").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_7").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_8").getInfo())
-                if out_ft.get("r_landcover_bysoil_8").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_8").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_10").getInfo())
-                if out_ft.get("r_landcover_bysoil_10").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_10").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_11").getInfo())
-                if out_ft.get("r_landcover_bysoil_11").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_11").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_12").getInfo())
-                if out_ft.get("r_landcover_bysoil_12").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_12").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_13").getInfo())
-                if out_ft.get("r_landcover_bysoil_13").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_13").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_14").getInfo())
-                if out_ft.get("r_landcover_bysoil_14").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_14").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_15").getInfo())
-                if out_ft.get("r_landcover_bysoil_15").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_15").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_16").getInfo())
-                if out_ft.get("r_landcover_bysoil_16").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_16").getInfo(),
-                float(out_ft.get("r_landcover_bysoil_17").getInfo())
-                if out_ft.get("r_landcover_bysoil_17").getInfo() not in missing_codes
-                else out_ft.get("r_landcover_bysoil_17").getInfo(),
+                json_value(properties, "r_landcover_bysoil_1"),
+                json_value(properties, "r_landcover_bysoil_2"),
+                json_value(properties, "r_landcover_bysoil_3"),
+                json_value(properties, "r_landcover_bysoil_4"),
+                json_value(properties, "r_landcover_bysoil_5"),
+                json_value(properties, "r_landcover_bysoil_6"),
+                json_value(properties, "r_landcover_bysoil_7"),
+                json_value(properties, "r_landcover_bysoil_8"),
+                json_value(properties, "r_landcover_bysoil_10"),
+                json_value(properties, "r_landcover_bysoil_11"),
+                json_value(properties, "r_landcover_bysoil_12"),
+                json_value(properties, "r_landcover_bysoil_13"),
+                json_value(properties, "r_landcover_bysoil_14"),
+                json_value(properties, "r_landcover_bysoil_15"),
+                json_value(properties, "r_landcover_bysoil_16"),
+                json_value(properties, "r_landcover_bysoil_17"),
             ],
-            "soil_carbon": float(out_ft.get("r_msocs_kgperm2").getInfo())
-            if out_ft.get("r_msocs_kgperm2").getInfo() not in missing_codes
-            else out_ft.get("r_msocs_kgperm2").getInfo(),
+            "soil_carbon": json_value(properties, "r_msocs_kgperm2"),
         },
     }
 
@@ -642,33 +830,35 @@ def generate_json_output(out_ft):
 
 
 def batch_export_to_json(output_folder_path):
+    # Build output_parameters.json from the output_parameters.csv written by
+    # download_output_parameters, writing one dam's entry at a time
 
     dams_ftc = ee.FeatureCollection(cfg.dams_table_path)
 
     c_dam_ids = dams_ftc.aggregate_array("id").getInfo()
+    missing_dam_ids = {int(c_dam_id) for c_dam_id in c_dam_ids}
 
-    # Load output datasets
-    # Catchment
-    output_asset_name = cfg.ps_heet_folder + "/" + "output_parameters"
+    def json_entries():
+        for properties in iter_output_parameters(output_folder_path):
+            c_dam_id = int(float(properties["id"]))
+            missing_dam_ids.discard(c_dam_id)
+            yield "reservoir_" + str(c_dam_id), generate_json_output(properties)
 
-    out_ftc = ee.FeatureCollection(output_asset_name)
-
-    json_output = {}
-    for c_dam_id in c_dam_ids:
-
-        c_dam_id_str = str(c_dam_id)
-
-        out_ft = out_ftc.filter(ee.Filter.inList("id", ee.List([c_dam_id]))).first()
-        entry = generate_json_output(out_ft)
-
-        dam_name = "reservoir_" + c_dam_id_str
-        json_output[dam_name] = entry
-
-    json_object = json.dumps(json_output, indent=4)
+        for c_dam_id in c_dam_ids:
+            if int(c_dam_id) in missing_dam_ids:
+                logger.info(f"[batch_export_to_json] No output parameters for dam {c_dam_id}")
+                yield "reservoir_" + str(c_dam_id), generate_empty_json_output()
 
+    # Same layout as json.dumps(json_output, indent=4)
     output_file_path = Path(output_folder_path, "output_parameters.json")
     with output_file_path.open("w", encoding="utf-8") as outfile:
-        outfile.write(json_object)
+        outfile.write("{")
+        separator = "\n"
+        for dam_name, entry in json_entries():
+            entry_json = json.dumps(entry, indent=4).replace("\n", "\n    ")
+            outfile.write(separator + "    " + json.dumps(dam_name) + ": " + entry_json)
+            separator = ",\n"
+        outfile.write("\n}" if separator != "\n" else "}")
 
 
 # ==============================================================================
@@ -676,25 +866,38 @@ def batch_export_to_json(output_folder_path):
 # ==============================================================================
 
 # Convert data frame
-def df_to_ee(df):
-
-    features = []
-
+def df_to_geojson(df):
+    # Convert a table of dam locations (x, y) and properties into a GeoJSON
+    # FeatureCollection (plain dicts; values converted by pandas' json
+    # serialisation e.g. NaN to null)
     sdf = df[df.columns.difference(["x", "y"])]
-    properties = sdf.columns.to_list()
-
-    jdf_str = df.to_json()
-    jdf = json.loads(jdf_str)
+    rows = json.loads(sdf.to_json(orient="records"))
 
-    for i in range(df.shape[0]):
-        x, y = df.x[i], df.y[i]
-        latlong = [x, y]
-        g = ee.Geometry.Point(latlong)
-        feat = ee.Feature(g)
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": [float(x), float(y)]},
+            "properties": properties,
+        }
+        for x, y, properties in zip(df["x"], df["y"], rows)
+    ]
+    return {"type": "FeatureCollection", "features": features}
 
-        for p in properties:
-            feat = feat.set(p, jdf[p][str(i)])
 
-        features.append(feat)
-    ee_object = ee.FeatureCollection(features)
-    return ee_object
+def df_to_ee(df):
+    # Each feature is sent as a GeoJSON dict (rather than a chain of
+    # feat.set calls per property), so the size of the request grows
+    # linearly with the number of dams
+    return ee.FeatureCollection(df_to_geojson(df))
+
+
+def df_to_ee_chunks(df, chunk_size=None):
+    # Split the input table into FeatureCollections of at most chunk_size
+    # (by default cfg.upload_chunk_size) dams, uploaded separately
+    if chunk_size is None:
+        chunk_size = cfg.upload_chunk_size
+    df = df.reset_index(drop=True)
+    return [
+        df_to_ee(df.iloc[start : start + chunk_size])
+        for start in range(0, max(df.shape[0], 1), chunk_size)
+    ]
@@ -0,0 +1,400 @@
+""" Local topology index of the HydroBASINS levels 1-12.
+
+    The index is built once from the attribute tables of the HydroBASINS
+    levels (HYBAS_ID, NEXT_DOWN and PFAF_ID of every basin) and stored as an
+    SQLite database. For each level it holds the basins (sorted by HYBAS_ID),
+    the position of each basin's parent at the level above (the Pfafstetter
+    code of a level k basin has k digits; its parent's code is its first k-1
+    digits) and the upstream adjacency of the basins in compressed sparse row
+    (CSR) form: the basins draining directly into basin i are
+    upstream[offsets[i]:offsets[i + 1]].
+
+    Upstream basins are found by walking the adjacency locally, instead of
+    with a server-side computation per dam (see heet_basins, upstream
+    method 4; UpstreamCascade shares the search between the dams of a
+    batch), and so are the bounding levels of the dams' basins (see
+    HybasIndex.bounding_levels). Does not import ee. """
+import csv
+import sqlite3
+import logging
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+index_file_name = "hybas_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS levels (
+    level INTEGER PRIMARY KEY,
+    n_basins INTEGER,
+    hybas_ids BLOB,
+    pfaf_ids BLOB,
+    next_downs BLOB,
+    parents BLOB,
+    offsets BLOB,
+    upstream BLOB
+);
+"""
+
+# (HYBAS_ID, NEXT_DOWN, PFAF_ID)
+BasinRow = Tuple[int, int, int]
+
+
+def basin_level(pfaf_id: int) -> int:
+    """HydroBASINS level of a basin (number of digits of its PFAF_ID)"""
+    return len(str(int(pfaf_id)))
+
+
+def read_basin_tables(paths: Iterable[Union[str, Path]]) -> Dict[int, List[BasinRow]]:
+    """Read HydroBASINS attribute tables (csv with HYBAS_ID, NEXT_DOWN and
+    PFAF_ID columns; one or more levels per table). Returns the rows of each
+    level"""
+    levels: Dict[int, List[BasinRow]] = {}
+    for path in paths:
+        with open(path, newline="") as infile:
+            for row in csv.DictReader(infile):
+                pfaf_id = int(float(row["PFAF_ID"]))
+                levels.setdefault(basin_level(pfaf_id), []).append(
+                    (int(float(row["HYBAS_ID"])), int(float(row["NEXT_DOWN"])), pfaf_id)
+                )
+    return levels
+
+
+class LevelTopology:
+    """Basins of one HydroBASINS level and their upstream adjacency (CSR)"""
+
+    def __init__(self, level, hybas_ids, pfaf_ids, next_downs, parents, offsets, upstream):
+        self.level = level
+        self.hybas_ids = hybas_ids
+        self.pfaf_ids = pfaf_ids
+        self.next_downs = next_downs
+        self.parents = parents
+        self.offsets = offsets
+        self.upstream = upstream
+        self.positions = {hybas_id: position for position, hybas_id in enumerate(hybas_ids)}
+
+    @classmethod
+    def from_rows(cls, level: int, rows: Iterable[BasinRow], parent_level=None) -> "LevelTopology":
+        """Build the topology of a level from its (HYBAS_ID, NEXT_DOWN,
+        PFAF_ID) rows. parent_level is the topology of the level above (for
+        the parent pointers)"""
+        rows = sorted(rows)
+        hybas_ids = array("q", [row[0] for row in rows])
+        next_downs = array("q", [row[1] for row in rows])
+        pfaf_ids = array("q", [row[2] for row in rows])
+        positions = {hybas_id: position for position, hybas_id in enumerate(hybas_ids)}
+
+        # Parent pointers (-1 if there is no level above or no parent)
+        parents = array("q", [-1] * len(rows))
+        if parent_level is not None:
+            parent_positions = {
+                pfaf_id: position for position, pfaf_id in enumerate(parent_level.pfaf_ids)
+            }
+            for position, pfaf_id in enumerate(pfaf_ids):
+                parents[position] = parent_positions.get(pfaf_id // 10, -1)
+
+        # Upstream adjacency: count the basins draining into each basin,
+        # then fill them in (positions in HYBAS_ID order)
+        counts = [0] * (len(rows) + 1)
+        for next_down in next_downs:
+            if next_down in positions:
+                counts[positions[next_down] + 1] += 1
+        offsets = array("q", [0] * (len(rows) + 1))
+        for position in range(len(rows)):
+            offsets[position + 1] = offsets[position] + counts[position + 1]
+        upstream = array("q", [0] * offsets[-1])
+        filled = list(offsets[:-1])
+        for position, next_down in enumerate(next_downs):
+            if next_down in positions:
+                target = positions[next_down]
+                upstream[filled[target]] = position
+                filled[target] += 1
+
+        return cls(level, hybas_ids, pfaf_ids, next_downs, parents, offsets, upstream)
+
+    def direct_upstream(self, position: int) -> array:
+        """Positions of the basins draining directly into a basin"""
+        return self.upstream[self.offsets[position] : self.offsets[position + 1]]
+
+    def ancestors(self, hybas_id: int) -> List[int]:
+        """HYBAS_IDs of all basins upstream of a basin (not including it),
+        nearest first"""
+        start = self.positions[hybas_id]
+        found = []
+        seen = {start}
+        frontier = [start]
+        while len(frontier) > 0:
+            next_frontier = []
+            for position in frontier:
+                for upstream_position in self.direct_upstream(position):
+                    if upstream_position not in seen:
+                        seen.add(upstream_position)
+                        next_frontier.append(upstream_position)
+            found.extend(next_frontier)
+            frontier = next_frontier
+        return [self.hybas_ids[position] for position in found]
+
+    def downstream_hops(self, hybas_id: int) -> int:
+        """Number of basins between a basin and the outlet of its river
+        system (following NEXT_DOWN)"""
+        hops = 0
+        position = self.positions[hybas_id]
+        seen = {position}
+        while self.next_downs[position] in self.positions:
+            position = self.positions[self.next_downs[position]]
+            if position in seen:
+                break
+            seen.add(position)
+            hops = hops + 1
+        return hops
+
+    def closed_pfaf_ids(self) -> set:
+        """Pfafstetter codes of the basins with no basin draining into them"""
+        return {
+            self.pfaf_ids[position]
+            for position in range(len(self.pfaf_ids))
+            if self.offsets[position] == self.offsets[position + 1]
+        }
+
+
+class HybasIndex:
+    """Topology of the HydroBASINS levels (see LevelTopology), by level"""
+
+    def __init__(self, levels: Dict[int, LevelTopology]):
+        self.levels = levels
+        # Codes of the closed basins of each level (built when first needed)
+        self._closed_pfaf_ids: Dict[int, set] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_rows(cls, level_rows: Dict[int, Iterable[BasinRow]]) -> "HybasIndex":
+        """Build the index from the rows of each level (see read_basin_tables)"""
+        levels: Dict[int, LevelTopology] = {}
+        for level in sorted(level_rows):
+            levels[level] = LevelTopology.from_rows(
+                level, level_rows[level], levels.get(level - 1)
+            )
+        return cls(levels)
+
+    def save(self, path: Union[str, Path]) -> None:
+        """Write the index to an SQLite database (replacing any index there)"""
+        connection = sqlite3.connect(str(path))
+        try:
+            with connection:
+                connection.executescript(SCHEMA)
+                connection.execute("DELETE FROM levels")
+                for level, topology in self.levels.items():
+                    connection.execute(
+                        "INSERT INTO levels VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            level,
+                            len(topology.hybas_ids),
+                            topology.hybas_ids.tobytes(),
+                            topology.pfaf_ids.tobytes(),
+                            topology.next_downs.tobytes(),
+                            topology.parents.tobytes(),
+                            topology.offsets.tobytes(),
+                            topology.upstream.tobytes(),
+                        ),
+                    )
+        finally:
+            connection.close()
+        logger.info(f"[HybasIndex] Saved the topology of levels {sorted(self.levels)} to {path}")
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "HybasIndex":
+        """Read an index written with save"""
+        connection = sqlite3.connect(str(path))
+        try:
+            rows = connection.execute(
+                "SELECT level, hybas_ids, pfaf_ids, next_downs, parents, offsets, upstream FROM levels"
+            ).fetchall()
+        finally:
+            connection.close()
+
+        def to_array(blob):
+            values = array("q")
+            values.frombytes(blob)
+            return values
+
+        levels = {
+            row[0]: LevelTopology(row[0], *[to_array(blob) for blob in row[1:]]) for row in rows
+        }
+        return cls(levels)
+
+    def ancestors(self, hybas_id: int, level: int = 12) -> List[int]:
+        """HYBAS_IDs of all basins upstream of a basin of a level"""
+        return self.levels[level].ancestors(hybas_id)
+
+    def closed_pfaf_ids(self, level: int) -> set:
+        """Pfafstetter codes of the basins of a level with no basin draining
+        into them"""
+        with self._lock:
+            if level not in self._closed_pfaf_ids:
+                self._closed_pfaf_ids[level] = self.levels[level].closed_pfaf_ids()
+            return self._closed_pfaf_ids[level]
+
+    def bounding_levels(self, pfaf_ids: Iterable[int]) -> List[Tuple[int, str]]:
+        """Bounding level and bounding basin code of basins, from their
+        Pfafstetter codes (e.g. level 12 PFAF_IDs).
+
+        The bounding level is the finest level at which the basin containing
+        a basin has no basin draining into it, so that it encloses everything
+        upstream (level 1 if there is none; see
+        heet_basins.find_hybas_bounding_level). The code of the containing
+        basin at a level is the prefix of the basin's code, so each level is
+        looked up once for the whole batch. Returns (level, code) in the order
+        of pfaf_ids"""
+        pfaf_ids = [int(pfaf_id) for pfaf_id in pfaf_ids]
+        results: List[Optional[Tuple[int, str]]] = [None] * len(pfaf_ids)
+
+        pending = list(range(len(pfaf_ids)))
+        for level in sorted(self.levels, reverse=True):
+            closed = self.closed_pfaf_ids(level)
+            unresolved = []
+            for i in pending:
+                n_digits = basin_level(pfaf_ids[i])
+                if n_digits < level:
+                    unresolved.append(i)
+                    continue
+                code = pfaf_ids[i] // 10 ** (n_digits - level)
+                if code in closed:
+                    results[i] = (level, str(code))
+                else:
+                    unresolved.append(i)
+            pending = unresolved
+
+        # Continental (level 1) basins bound everything
+        for i in pending:
+            results[i] = (1, str(pfaf_ids[i])[:1])
+
+        return results
+
+    def parent(self, hybas_id: int, level: int = 12) -> Optional[int]:
+        """HYBAS_ID of the basin at the level above that contains a basin
+        (None at level 1)"""
+        topology = self.levels[level]
+        parent_position = topology.parents[topology.positions[hybas_id]]
+        if parent_position < 0:
+            return None
+        return self.levels[level - 1].hybas_ids[parent_position]
+
+
+class UpstreamCascade:
+    """Upstream basins of the dams of a batch, built incrementally.
+
+    Dams on the same river system share most of their upstream basins.
+    Dams are ordered upstream to downstream (see order) and the upstream
+    basins of each dam's basin are remembered, so that the search from a
+    dam further down stops at the basins of the dams above it and reuses
+    their upstream basins. The numbers of reused results are kept for the
+    run log."""
+
+    def __init__(self, index: HybasIndex, level: int = 12):
+        self.topology = index.levels[level]
+        # Upstream basins (HYBAS_IDs) of the basins searched so far
+        self.found: Dict[int, List[int]] = {}
+        # Searches answered (wholly or partly) from earlier searches, and
+        # the number of upstream basins they did not have to walk
+        self.reused_searches = 0
+        self.reused_basins = 0
+
+    def order(self, dam_ids: Iterable, dam_basins: Dict[int, int]) -> List:
+        """Dam ids ordered upstream to downstream (dams furthest from the
+        outlet of their river system first). dam_basins holds the HYBAS_ID of
+        the basin of each dam (by int dam id); dams without one come last"""
+        dam_ids = list(dam_ids)
+
+        def hops(dam_id):
+            hybas_id = dam_basins.get(int(dam_id))
+            if hybas_id is None or hybas_id not in self.topology.positions:
+                return -1
+            return self.topology.downstream_hops(hybas_id)
+
+        return sorted(dam_ids, key=lambda dam_id: -hops(dam_id))
+
+    def ancestors(self, hybas_id: int) -> List[int]:
+        """HYBAS_IDs of all basins upstream of a basin (not including it)"""
+        if hybas_id in self.found:
+            self.reused_searches = self.reused_searches + 1
+            self.reused_basins = self.reused_basins + len(self.found[hybas_id])
+            return list(self.found[hybas_id])
+
+        topology = self.topology
+        start = topology.positions[hybas_id]
+        found = []
+        reused_search = False
+        reused = 0
+        seen = {start}
+        frontier = [start]
+        while len(frontier) > 0:
+            next_frontier = []
+            for position in frontier:
+                for upstream_position in topology.direct_upstream(position):
+                    if upstream_position in seen:
+                        continue
+                    seen.add(upstream_position)
+                    upstream_id = topology.hybas_ids[upstream_position]
+                    found.append(upstream_id)
+                    if upstream_id in self.found:
+                        # Everything above was found for an upstream dam
+                        found.extend(self.found[upstream_id])
+                        reused_search = True
+                        reused = reused + len(self.found[upstream_id])
+                    else:
+                        next_frontier.append(upstream_position)
+            frontier = next_frontier
+
+        if reused_search:
+            self.reused_searches = self.reused_searches + 1
+            self.reused_basins = self.reused_basins + reused
+        self.found[hybas_id] = found
+        return list(found)
+
+
+# Indexes loaded in this process, by path
+_loaded_indexes: Dict[str, HybasIndex] = {}
+_loaded_indexes_lock = threading.Lock()
+
+
+def load_index(path: Union[str, Path]) -> HybasIndex:
+    """Index at path, loaded once per process"""
+    key = str(Path(path).resolve())
+    with _loaded_indexes_lock:
+        if key not in _loaded_indexes:
+            _loaded_indexes[key] = HybasIndex.load(path)
+        return _loaded_indexes[key]
+
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Build the local HydroBASINS topology index from attribute tables"
+    )
+    parser.add_argument("index_path", help=f"index to write (e.g. {index_file_name})")
+    parser.add_argument("tables", nargs="+", help="csv tables with HYBAS_ID, NEXT_DOWN, PFAF_ID")
+    args = parser.parse_args()
+
+    HybasIndex.from_rows(read_basin_tables(args.tables)).save(args.index_path)
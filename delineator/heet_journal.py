@@ -0,0 +1,172 @@
+""" Durable journal of an analysis run, kept as an SQLite database in the
+    local output folder (outputs/<job>/journal.sqlite). The journal records
+    every task submitted to Earth Engine, the asset it writes to and the
+    critical path stage of each dam, so that an interrupted run can be
+    resumed instead of restarted """
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+journal_file_name = "journal.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    task_code TEXT,
+    key TEXT,
+    task_id TEXT,
+    asset_id TEXT,
+    description TEXT,
+    attempt INTEGER,
+    submitted_at REAL
+);
+CREATE TABLE IF NOT EXISTS dams (
+    dam_id INTEGER PRIMARY KEY,
+    stage TEXT,
+    updated_at REAL
+);
+"""
+
+
+class RunJournal:
+    """Run journal stored in an SQLite database.
+
+    Every write is committed straight away so that the journal survives the
+    run being interrupted at any point. The journal can be written from
+    several threads (see heet_orchestrator); the connection is shared and
+    every statement holds a lock.
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.connection.executescript(SCHEMA)
+        self.connection.commit()
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def get_meta(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT value FROM meta WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row is not None else default
+
+    def meta_mismatches(
+        self, values: Dict[str, str]
+    ) -> Dict[str, Tuple[str, str]]:
+        """Return {key: (stored value, given value)} for the metadata
+        stored with a different value (keys not stored are not compared)"""
+        mismatches = {}
+        for key, value in values.items():
+            stored = self.get_meta(key)
+            if stored is not None and stored != value:
+                mismatches[key] = (stored, value)
+        return mismatches
+
+    def record_task(
+        self,
+        task_code: str,
+        key: str,
+        task_id: Optional[str],
+        asset_id: Optional[str] = None,
+        description: Optional[str] = None,
+        attempt: int = 1,
+    ) -> None:
+        """Record a task submitted to Earth Engine (attempt counts the
+        submissions of a retried task)"""
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO tasks (task_code, key, task_id, asset_id, description, attempt, submitted_at) "
+                + "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (task_code, key, task_id, asset_id, description, attempt, time.time()),
+            )
+
+    def record_stage(self, dam_id: int, stage: str) -> None:
+        """Record the critical path state of a dam"""
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO dams (dam_id, stage, updated_at) VALUES (?, ?, ?)",
+                (int(dam_id), stage, time.time()),
+            )
+
+    def dam_stages(self) -> Dict[int, str]:
+        """Last recorded state of every dam"""
+        with self._lock:
+            rows = self.connection.execute("SELECT dam_id, stage FROM dams").fetchall()
+        return {dam_id: stage for dam_id, stage in rows}
+
+    def tasks(self, task_code: Optional[str] = None) -> List[dict]:
+        """Submitted tasks (optionally of a single task code), oldest first"""
+        query = "SELECT task_code, key, task_id, asset_id, description, attempt, submitted_at FROM tasks"
+        parameters = ()
+        if task_code is not None:
+            query = query + " WHERE task_code = ?"
+            parameters = (task_code,)
+        with self._lock:
+            rows = self.connection.execute(query + " ORDER BY rowid", parameters).fetchall()
+        columns = ["task_code", "key", "task_id", "asset_id", "description", "attempt", "submitted_at"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def latest_tasks(self) -> Dict[tuple, dict]:
+        """Most recently submitted task for every (task_code, key) pair"""
+        latest = {}
+        for task in self.tasks():
+            latest[(task["task_code"], task["key"])] = task
+        return latest
+
+
+def completed_stages_from_assets(
+    asset_index: Dict[str, Dict[int, dict]], stages: List[str], stage_prefixes: Dict[str, str]
+) -> Dict[int, str]:
+    """Find the furthest critical path stage completed by each dam from the
+    assets found in the job's EE folder.
+
+    Args:
+        asset_index: assets indexed by file prefix and dam id
+            (see heet_assets.index_assets)
+        stages: task codes of the critical path, in order
+        stage_prefixes: file prefix of the asset written by each stage
+
+    Intermediate (unprofiled) assets are deleted once the following stage
+    completes, so a stage is taken as complete if its asset, or the asset of
+    any later stage, exists.
+    """
+    completed = {}
+    for stage in stages:
+        for dam_id in asset_index.get(stage_prefixes[stage], {}):
+            completed[dam_id] = stage
+    return completed
@@ -1 +1,4 @@
-log_file_name = "heet.log"
+import os
+
+# Can be overridden e.g. to give every shard of a sharded run its own log
+log_file_name = os.environ.get("HEET_LOG_FILE", "heet.log")
@@ -1,12 +1,30 @@
+import threading
+
 import ee
 
+try:
+    from delineator import heet_asset_ops
+    from delineator import heet_pipeline
+    from delineator import heet_poll
+    from delineator import heet_queue
+    from delineator import heet_retry
+    from delineator import heet_status
+except ModuleNotFoundError:
+    import heet_asset_ops
+    import heet_pipeline
+    import heet_poll
+    import heet_queue
+    import heet_retry
+    import heet_status
+
 # ==============================================================================
 # Task monitoring
 # ==============================================================================
 
-# Monitoring Dam Analysis Calculations
-active_analyses = []
+# Task status snapshots (one listing of EE operations per poll cycle)
+status_monitor = heet_status.TaskStatusMonitor()
 
+# Monitoring Dam Analysis Calculations
 critical_path = [
     'subbasin_pts',
     'catch_vec',
@@ -71,33 +89,80 @@ all_tasks_log = {
     'sres_bzone':{}
 }
 
-new_results_log = {
-    'dam_pts': [],
-    'subbasin_pts': [],
-    'watershed_cpts': [],
-    'watershed_dpts': [],
-    'catch_pix': [],
-    'catch_vec': [],
-    'catch_vec_params': [],
-    'wbs_pix': [],
-    'wbs_vec': [],
-    'res_vec': [],
-    'res_vec_params': [],
-    'sres_vec': [],
-    'mriv_vec': [],
-    'mriv_vec_params': [],
-    'sink_vec': [],
-    'trunc_sink_vec': [],
-    'source_vec': [],
-    'trunc_source_vec': [],
-    'riv_vec': [],
-    'nic_vec': [],
-    'nic_vec_params': [],
-    'out_tab': [],
-    'sres_bzone':{}
-}
+# The task logs are written by stage actions on worker threads (see
+# heet_orchestrator) while the poll loop reads them: both hold this lock
+task_logs_lock = threading.RLock()
+
+
+def log_task(task_code, key, task):
+    """Record a submitted task in the task logs"""
+    with task_logs_lock:
+        all_tasks_log[task_code][key] = task
+        active_tasks_log[task_code][key] = task
+
+
+def drop_active_task(task_code, key, task):
+    """Remove a finished task from the active task log (unless it has been
+    replaced by another task in the meantime)"""
+    with task_logs_lock:
+        if active_tasks_log[task_code].get(key) is task:
+            del active_tasks_log[task_code][key]
+
+
+def task_log_items(task_log):
+    """Snapshot of the (key, task) items of one task log"""
+    with task_logs_lock:
+        return list(task_log.items())
+
+
+def logged_tasks(task_logs):
+    """Snapshot of the (task code, task) of every task of several task logs
+    (by task code)"""
+    with task_logs_lock:
+        return [
+            (task_code, task)
+            for task_code, task_log in list(task_logs.items())
+            for task in list(task_log.values())
+        ]
+
+
+# Per-dam state of the analysis along the critical path
+# (replaced with a pipeline with stage actions in heet_task.run_analysis)
+pipeline = heet_pipeline.DamPipeline(critical_path)
+
+# Run journal (heet_journal.RunJournal) of the current job, if any
+journal = None
+
+# Output parameters of the dams of the current job, written as they complete
+# (heet_results.ResultStream), if any
+results = None
+
+# Tasks waiting to be started (limits the number of tasks in the EE queue)
+submission_queue = heet_queue.SubmissionQueue(critical_path)
+
+# Resubmission of failed tasks
+# (replaced with the configured policy in heet_task.run_analysis)
+retry_policy = heet_retry.RetryPolicy()
+# Every submission of retried tasks, by (task code, key)
+task_attempts = {}
+
+# Tasks exporting the outputs of several dams to one table
+# (see heet_export.export_batch_ftc): dam ids (str) by asset id
+batch_tasks = {}
+# Batch tables holding the outputs of dams, indexed like the job's assets
+# (by file prefix and dam id; see heet_assets.add_batch_asset)
+batch_outputs = {}
+# How to export the dams of a batch table one by one if its task fails
+# (see heet_export.split_batch): (job type, function returning the
+# collection of a dam) by asset id
+batch_splits = {}
+
+# Intervals between polls of the EE task queue, and the number of polls
+# (configured in heet_task)
+poll_schedule = heet_poll.PollSchedule()
 
-new_results_count = 0
+# Concurrent asset listing, deletion and renaming (configured in heet_task)
+asset_ops = heet_asset_ops.AssetOps()
 
 # Monitoring Exports to Google Drive
 active_exports = []
@@ -0,0 +1,183 @@
+""" Asyncio orchestrator of the analysis of a batch of dams.
+
+    The event loop polls the EE task queue, advances dams along the
+    pipeline (heet_pipeline) and starts queued tasks (heet_queue). Blocking
+    EE client calls run on a bounded pool of worker threads, so that:
+    - the stage actions of different dams (which build and export EE
+      computations and may call getInfo) run side by side,
+    - queued tasks are started concurrently, as soon as slots in the EE
+      queue are free (including right after a stage action queues them),
+    - polling carries on while stage actions and task starts are running.
+
+    Pipeline state changes are made on the event loop thread, except for
+    dams failed from a worker thread (DamPipeline holds a lock) """
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Set
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+
+class Orchestrator:
+    """Runs a DamPipeline until no dam is active.
+
+    Args:
+        pipeline: the pipeline of the batch (heet_pipeline.DamPipeline). The
+            orchestrator takes over running its stage actions.
+        submission_queue: queue of tasks waiting to be started
+            (heet_queue.SubmissionQueue).
+        status_monitor: takes task status snapshots
+            (heet_status.TaskStatusMonitor); refreshed once per poll.
+        process: callable taking a snapshot that advances or fails dams
+            whose tasks have finished. Returns the number of completed
+            tasks. Called on the event loop thread.
+        in_flight: callable taking a snapshot, returning the number of
+            unfinished tasks of the job in the EE queue.
+        max_tasks_in_flight: maximum number of unfinished tasks of the job.
+        poll_schedule: chooses the interval between polls
+            (heet_poll.PollSchedule).
+        max_workers: number of worker threads making EE client calls.
+        timeout_s: the run stops if no task completes for timeout_s seconds.
+        on_progress: optional callable called (on the event loop thread)
+            after every poll with the number of completed critical path
+            steps (e.g. to update a progress bar).
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        submission_queue,
+        status_monitor,
+        process: Callable[[Any], int],
+        in_flight: Callable[[Any], int],
+        max_tasks_in_flight: int,
+        poll_schedule,
+        max_workers: int = 8,
+        timeout_s: float = 5400,
+        on_progress: Optional[Callable[[int], None]] = None,
+    ):
+        self.pipeline = pipeline
+        self.pipeline.dispatch = self.dispatch
+        self.submission_queue = submission_queue
+        self.status_monitor = status_monitor
+        self.process = process
+        self.in_flight = in_flight
+        self.max_tasks_in_flight = max_tasks_in_flight
+        self.poll_schedule = poll_schedule
+        self.max_workers = max_workers
+        self.timeout_s = timeout_s
+        self.on_progress = on_progress
+        self.executor: Optional[ThreadPoolExecutor] = None
+        # Stage actions that have not finished
+        self._pending: Set[asyncio.Future] = set()
+        # Unfinished tasks at the last poll, and tasks started since
+        self._n_in_flight = 0
+        self._n_started = 0
+        self._submitting: Optional[asyncio.Lock] = None
+
+    async def run_blocking(self, function: Callable, *args) -> Any:
+        """Run a blocking call on a worker thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(function, *args))
+
+    def dispatch(self, stage: str, action: Callable[[List[int]], None], dam_ids: List[int]) -> None:
+        """Run the action of a stage on a worker thread (called by the
+        pipeline on the event loop thread)"""
+        future = asyncio.ensure_future(self._run_action(stage, action, dam_ids))
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+
+    async def _run_action(self, stage: str, action: Callable[[List[int]], None], dam_ids: List[int]):
+        try:
+            await self.run_blocking(action, dam_ids)
+        except Exception:
+            logger.exception(
+                f"[Orchestrator] Problem triggering the stage after {stage} for dams {dam_ids}"
+            )
+            for dam_id in dam_ids:
+                self.pipeline.fail(dam_id, f"Problem triggering the stage after {stage}")
+        # Start the tasks the action queued without waiting for the next poll
+        await self.submit()
+
+    async def submit(self) -> int:
+        """Start queued tasks (concurrently) while the number of unfinished
+        tasks is below max_tasks_in_flight. Returns the number started"""
+        async with self._submitting:
+            n_slots = self.max_tasks_in_flight - self._n_in_flight - self._n_started
+            popped = self.submission_queue.pop(n_slots)
+            self._n_started = self._n_started + len(popped)
+
+        async def start(task_code, key, start_task):
+            try:
+                await self.run_blocking(start_task)
+            except Exception:
+                logger.exception(f"[Orchestrator] Problem starting task {task_code} {key}")
+
+        await asyncio.gather(*[start(*entry) for entry in popped])
+        return len(popped)
+
+    async def poll(self) -> int:
+        """Refresh task statuses and process them. Returns the number of
+        completed tasks"""
+        self.poll_schedule.record_poll("analysis")
+        try:
+            snapshot = await self.run_blocking(self.status_monitor.refresh)
+        except Exception:
+            logger.exception("[Orchestrator] Problem fetching task statuses")
+            return 0
+        async with self._submitting:
+            self._n_in_flight = self.in_flight(snapshot)
+            self._n_started = 0
+        return self.process(snapshot)
+
+    async def run(self) -> int:
+        """Poll and submit tasks until no dam is active. Returns 0 when the
+        analysis of every dam has ended and 1 if the run timed out"""
+        loop = asyncio.get_running_loop()
+        self._submitting = asyncio.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        last_completion = loop.time()
+        try:
+            while True:
+                if await self.poll() > 0:
+                    last_completion = loop.time()
+                if self.on_progress is not None:
+                    self.on_progress(self.pipeline.completed_steps)
+
+                if len(self.pipeline.active) == 0 and len(self._pending) == 0:
+                    return 0
+                if loop.time() - last_completion > self.timeout_s:
+                    logger.info(
+                        f"[Orchestrator] No task completed in {self.timeout_s}s "
+                        + f"(active: {self.pipeline.active})"
+                    )
+                    return 1
+
+                await self.submit()
+                await asyncio.sleep(
+                    self.poll_schedule.next_step(self.submission_queue.next_ready_in())
+                )
+        finally:
+            # Stage actions already running finish their EE calls
+            if len(self._pending) > 0:
+                await asyncio.gather(*self._pending, return_exceptions=True)
+            self.executor.shutdown(wait=True)
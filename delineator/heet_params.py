@@ -3,6 +3,9 @@ debug_mode = False
 import ee
 import math
 import logging
+import weakref
+import functools
+import threading
 
 # Import asset locations from config
 import sys
@@ -48,6 +51,216 @@ file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
 
+# ==============================================================================
+# Profile context
+# ==============================================================================
+
+# Metrics of the same target (catchment, reservoir...) share sub-expressions:
+# its geometry and area, the DEM, and metrics used by other metrics (e.g.
+# runoff, used by the runoff and discharge metrics). Each target has a
+# context that builds them once, so every metric of the target refers to the
+# same objects (a smaller request graph, computed once by EE). Targets are
+# profiled on several worker threads; contexts are looked up under a lock.
+
+
+class ProfileContext:
+    """Cache of the sub-expressions of the metrics of one target"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def memo(self, key, build):
+        """Value of key, built by calling build the first time"""
+        with self._lock:
+            if key in self._values:
+                return self._values[key]
+        value = build()
+        with self._lock:
+            return self._values.setdefault(key, value)
+
+
+# Contexts by id of their target (removed when the target is garbage collected)
+_profile_contexts = {}
+_profile_contexts_lock = threading.Lock()
+
+
+def profile_context(target_ftc):
+    """Profile context of a target FeatureCollection"""
+    key = id(target_ftc)
+    with _profile_contexts_lock:
+        entry = _profile_contexts.get(key)
+        if entry is not None and entry[0]() is target_ftc:
+            return entry[1]
+        context = ProfileContext()
+        _profile_contexts[key] = (weakref.ref(target_ftc), context)
+        weakref.finalize(target_ftc, _profile_contexts.pop, key, None)
+        return context
+
+
+def memoised_metric(metric_function):
+    """Compute a metric of a target (a function of the target only) once per
+    target"""
+
+    @functools.wraps(metric_function)
+    def wrapper(*args, **kwargs):
+        # The target is the only argument (by position or by name)
+        target_ftc = args[0] if len(args) > 0 else next(iter(kwargs.values()))
+        return profile_context(target_ftc).memo(
+            metric_function.__name__, lambda: metric_function(*args, **kwargs)
+        )
+
+    return wrapper
+
+
+def target_geometry(target_ftc):
+    """Geometry of a target (shared by its metrics)"""
+    return profile_context(target_ftc).memo("geometry", target_ftc.geometry)
+
+
+# Nominal scales of the datasets, by dataset name; the scale of a dataset is
+# the same for every target
+_nominal_scales = {}
+_nominal_scales_lock = threading.Lock()
+
+
+def nominal_scale(image, dataset):
+    """Nominal scale (m) of the projection of an image of a dataset (the asset
+    or layer group the image is made from; one scale is kept per dataset)"""
+    with _nominal_scales_lock:
+        if dataset not in _nominal_scales:
+            _nominal_scales[dataset] = ee.Image(image).projection().nominalScale()
+        return _nominal_scales[dataset]
+
+
+def target_dem(target_ftc):
+    """DEM used for the metrics of a target"""
+    return profile_context(target_ftc).memo("dem", dem_image)
+
+
+def dem_asset():
+    """Asset of the DEM used for parameter calculations"""
+    if cfg.paramHydroDEM == True:
+        return lib.get_public_asset("hydrosheds") + cfg.hydrodataset + "CONDEM"
+    return lib.get_public_asset("nasa_srtm")
+
+
+def dem_image():
+    """DEM used for parameter calculations (band "elevation")"""
+    if cfg.paramHydroDEM == True:
+        DEM = ee.Image(dem_asset()).rename(["elevation"])
+    else:
+        DEM = ee.Image(dem_asset())
+    return DEM
+
+
+# ==============================================================================
+# Mean layers
+# ==============================================================================
+
+# The mean-style metrics are read from layers reduced together: the layers
+# of a group share a projection (and so a scale) and are stacked into one
+# image with a band per layer, so that each group takes a single
+# reduceRegion per target (e.g. all Soil Grids metrics). Layers with
+# different projections are kept in separate groups, so that each layer is
+# still reduced at its own scale and on its own pixel grid.
+
+
+def soilgrids_layers():
+    # Soil Grids (250 m)
+    return ee.Image.cat(
+        [
+            ee.Image(lib.get_public_asset("soilgrids250m_ocs")).select("ocs_0-30cm_mean"),
+            soil_oc_content(),
+            soc_percent(),
+            soil_nitrogen_content(),
+            soil_bdod(),
+            global_strata_weighted_mol_c(),
+            global_strata_weighted_mol_n(),
+            doc_export_rate(),
+        ]
+    )
+
+
+def population_layers():
+    # GPW v4.11 population density; first image (2020)
+    POPULATION = ee.ImageCollection(lib.get_public_asset("GPWv411_pop_den"))
+    return ee.Image(POPULATION.limit(1, "system:time_start", False).first()).select(
+        "population_density"
+    )
+
+
+def slope_layers():
+    # Slope (degrees) of the parameter DEM
+    return ee.Terrain.slope(dem_image().select("elevation"))
+
+
+# Image builders of the groups of layers
+mean_layer_groups = {
+    "soilgrids": soilgrids_layers,
+    "runoff": lambda: ee.Image(lib.get_private_asset("cmp_ro_grdc_runoff")).select("b1"),
+    "precipitation": lambda: ee.Image(lib.get_private_asset("worldclim_bio")).select(
+        ["b1"], ["bio12"]
+    ),
+    "population": population_layers,
+    "olsen": lambda: ee.Image(lib.get_private_asset("OlsenP_kgha1_World")).select("b1"),
+    "twbda_pet": lambda: ee.Image(lib.get_private_asset("Eo150_clim")).select("b1"),
+    "slope": slope_layers,
+}
+
+
+def layer_means(target_ftc, group):
+    """Means of the layers of a group over a target (ee.Dictionary of band
+    name to mean), computed with one reduceRegion per group and target"""
+
+    def reduce_group():
+        layers = mean_layer_groups[group]()
+        return layers.reduceRegion(
+            **{
+                "reducer": ee.Reducer.mean(),
+                "geometry": target_geometry(target_ftc),
+                "scale": nominal_scale(layers, "layers:" + group),
+                "maxPixels": 2e11,
+            }
+        )
+
+    return profile_context(target_ftc).memo("layer_means:" + group, reduce_group)
+
+
+def batch_layer_means(targets, groups=None):
+    """Compute the layer means (see layer_means) of several targets with one
+    reduceRegions per group. targets is a list of (dam id, target_ftc); the
+    means of each target are read from its dam's row of the reduction"""
+    if groups is None:
+        groups = list(mean_layer_groups)
+
+    regions = ee.FeatureCollection(
+        [
+            ee.Feature(target_geometry(target_ftc), {"id": c_dam_id})
+            for c_dam_id, target_ftc in targets
+        ]
+    )
+
+    for group in groups:
+        layers = mean_layer_groups[group]()
+        band_names = layers.bandNames()
+        means_ftc = layers.reduceRegions(
+            **{
+                "collection": regions,
+                "reducer": ee.Reducer.mean().forEachBand(layers),
+                "scale": nominal_scale(layers, "layers:" + group),
+            }
+        )
+
+        for c_dam_id, target_ftc in targets:
+            means_feat = ee.Feature(means_ftc.filter(ee.Filter.eq("id", c_dam_id)).first())
+            # Null (rather than missing) means of targets without pixels
+            means = ee.Dictionary.fromLists(
+                band_names, band_names.map(lambda band: means_feat.get(band))
+            )
+            profile_context(target_ftc).memo("layer_means:" + group, lambda: means)
+
+
 # ==============================================================================
 # Buffer Zone Delineation
 # ==============================================================================
@@ -78,8 +291,9 @@ def delineate_buffer_zone(res_ftc):
 
 
 # Catchment/reservoir area (km)
+@memoised_metric
 def area(land_ftc):
-    land_geom = land_ftc.geometry()
+    land_geom = target_geometry(land_ftc)
     return land_geom.area(1).divide(1000 * 1000)
 
 
@@ -92,31 +306,8 @@ def degrees_to_perc_slope(mean_slope_degrees_value):
 
 def mean_slope_degrees(catchment_ftc):
 
-    catchment_geom = catchment_ftc.geometry()
-
-    if cfg.paramHydroDEM == True:
-        DEM = ee.Image(lib.get_public_asset(asset_name="hydrosheds") + cfg.hydrodataset + "CONDEM").rename(
-            ["elevation"]
-        )
-    else:
-        DEM = ee.Image(lib.get_public_asset("nasa_srtm"))
-
     # Expected SCALE = 30
-
-    elevationDEM = ee.Image(DEM).select("elevation")
-    slopeDEM = ee.Terrain.slope(elevationDEM)
-
-    projection = ee.Image(slopeDEM).projection()
-    SCALE = projection.nominalScale()
-
-    mean_slope_degrees_value = slopeDEM.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": catchment_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("slope")
+    mean_slope_degrees_value = layer_means(catchment_ftc, "slope").get("slope")
 
     return mean_slope_degrees_value
 
@@ -138,23 +329,9 @@ def mean_slope(catchment_ftc):
 
 def mean_soil_oc_stocks(land_ftc):
 
-    SOIL_CARBON = ee.Image(lib.get_public_asset("soilgrids250m_ocs"))
     # Expected SCALE = 250
-
-    projection = ee.Image(SOIL_CARBON).projection()
-    SCALE = projection.nominalScale()
-
-    land_geom = land_ftc.geometry()
-
     mean_soil_carbon_hgpm2 = ee.Number(
-        SOIL_CARBON.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": land_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        ).get("ocs_0-30cm_mean")
+        layer_means(land_ftc, "soilgrids").get("ocs_0-30cm_mean")
     )
 
     # Handle null values
@@ -168,8 +345,7 @@ def mean_soil_oc_stocks(land_ftc):
     return mean_soil_carbon_kgpm2_value
 
 
-def mean_soil_oc_content(target_ftc):
-
+def soil_oc_content():
     soil_grids_soc = ee.Image(lib.get_public_asset("soilgrids250m_soc"))
     soil_grids_psoc = soil_grids_soc.expression(
         "SOC_GPERKG = (SOC_0to5CM_MEAN * 0.1 * 5 + SOC_5to15CM_MEAN * 0.1 * 10 + SOC_15to30CM_MEAN * 0.1 * 15) / 30",
@@ -179,28 +355,19 @@ def mean_soil_oc_content(target_ftc):
             "SOC_15to30CM_MEAN": soil_grids_soc.select("soc_15-30cm_mean"),
         },
     )
+    return soil_grids_psoc
 
-    target_geom = target_ftc.geometry()
 
-    projection = ee.Image(soil_grids_psoc).projection()
-    SCALE = projection.nominalScale()
+def mean_soil_oc_content(target_ftc):
 
-    mean_soc_gperkg_value = soil_grids_psoc.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": target_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("SOC_GPERKG")
+    mean_soc_gperkg_value = layer_means(target_ftc, "soilgrids").get("SOC_GPERKG")
 
     # Explicit null handling not needed
 
     return mean_soc_gperkg_value
 
 
-def mean_soil_nitrogen_content(target_ftc):
-
+def soil_nitrogen_content():
     soil_grids_nitrogen = ee.Image(lib.get_public_asset("soilgrids250m_n"))
 
     soil_grids_nitrogen = soil_grids_nitrogen.expression(
@@ -211,27 +378,18 @@ def mean_soil_nitrogen_content(target_ftc):
             "N_15to30CM_MEAN": soil_grids_nitrogen.select("nitrogen_15-30cm_mean"),
         },
     )
+    return soil_grids_nitrogen
 
-    target_geom = target_ftc.geometry()
 
-    projection = ee.Image(soil_grids_nitrogen).projection()
-    SCALE = projection.nominalScale()
+def mean_soil_nitrogen_content(target_ftc):
 
-    mean_n_gperkg_value = soil_grids_nitrogen.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": target_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("N_GPERKG")
+    mean_n_gperkg_value = layer_means(target_ftc, "soilgrids").get("N_GPERKG")
 
     # Explicit null handling not needed
     return mean_n_gperkg_value
 
 
-def mean_soil_bdod(target_ftc):
-
+def soil_bdod():
     soil_grids_bdod = ee.Image(lib.get_public_asset("soilgrids250m_bdod"))
     soil_grids_bdod = soil_grids_bdod.expression(
         "BDOD_KGPERDM3 = (BDOD_0to5CM_MEAN * 0.01 * 5 + BDOD_5to15CM_MEAN * 0.01 * 10 + BDOD_15to30CM_MEAN * 0.01 * 15) / 30",
@@ -241,20 +399,12 @@ def mean_soil_bdod(target_ftc):
             "BDOD_15to30CM_MEAN": soil_grids_bdod.select("bdod_15-30cm_mean"),
         },
     )
+    return soil_grids_bdod
 
-    target_geom = target_ftc.geometry()
 
-    projection = ee.Image(soil_grids_bdod).projection()
-    SCALE = projection.nominalScale()
+def mean_soil_bdod(target_ftc):
 
-    mean_bdod_kgperdm3_value = soil_grids_bdod.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": target_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("BDOD_KGPERDM3")
+    mean_bdod_kgperdm3_value = layer_means(target_ftc, "soilgrids").get("BDOD_KGPERDM3")
 
     # Explicit null handling not needed
     return mean_bdod_kgperdm3_value
@@ -277,20 +427,8 @@ def global_strata_weighted_mol_c():
 
 
 def mean_strata_weighted_mol_c(target_ftc):
-    sum_weighted_mol_c_kg = global_strata_weighted_mol_c()
-    target_geom = target_ftc.geometry()
 
-    projection = ee.Image(sum_weighted_mol_c_kg).projection()
-    SCALE = projection.nominalScale()
-
-    mean_strata_weighted_mol_c_value = sum_weighted_mol_c_kg.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": target_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("WMOLCKG")
+    mean_strata_weighted_mol_c_value = layer_means(target_ftc, "soilgrids").get("WMOLCKG")
 
     # Explicit null handling not needed
     return mean_strata_weighted_mol_c_value
@@ -313,26 +451,14 @@ def global_strata_weighted_mol_n():
 
 
 def mean_strata_weighted_mol_n(target_ftc):
-    sum_weighted_mol_n_kg = global_strata_weighted_mol_n()
-    target_geom = target_ftc.geometry()
-
-    projection = ee.Image(sum_weighted_mol_n_kg).projection()
-    SCALE = projection.nominalScale()
 
-    mean_strata_weighted_mol_n_value = sum_weighted_mol_n_kg.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": target_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("WMOLNKG")
+    mean_strata_weighted_mol_n_value = layer_means(target_ftc, "soilgrids").get("WMOLNKG")
 
     # Explicit null handling not needed
     return mean_strata_weighted_mol_n_value
 
 
-def total_doc_export(target_ftc):
+def doc_export_rate():
 
     sum_weighted_mol_n_kg = global_strata_weighted_mol_n()
     sum_weighted_mol_c_kg = global_strata_weighted_mol_c()
@@ -351,21 +477,14 @@ def total_doc_export(target_ftc):
         "KGDOCHAYR = 4.8634 * CN - 60.873",
         {"CN": molar_cn_ratio.select("CNRATIO")},
     )
+    return kg_doc_ha_yr
 
-    target_geom = target_ftc.geometry()
-    target_geom_area_ha = target_geom.area(1).divide(10000)
 
-    projection = ee.Image(kg_doc_ha_yr).projection()
-    SCALE = projection.nominalScale()
+def total_doc_export(target_ftc):
 
-    mean_kg_doc_ha_yr = kg_doc_ha_yr.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": target_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("KGDOCHAYR")
+    target_geom_area_ha = area(target_ftc).multiply(100)
+
+    mean_kg_doc_ha_yr = layer_means(target_ftc, "soilgrids").get("KGDOCHAYR")
 
     total_kg_doc_yr_value = ee.Algorithms.If(
         ee.Algorithms.IsEqual(mean_kg_doc_ha_yr, None),
@@ -387,8 +506,7 @@ def landcover(land_ftc, landcover_analysis_file_str):
         print("[landcover object] landcover", LANDCOVER_ESA.getInfo())
 
     # Expected SCALE = 300
-    projection = ee.Image(LANDCOVER_ESA).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(LANDCOVER_ESA, landcover_analysis_file_str)
 
     LANDCOVER_IHA = LANDCOVER_ESA.remap(
         # ESA CODES
@@ -475,7 +593,7 @@ def landcover(land_ftc, landcover_analysis_file_str):
         ],
     ).select(["remapped"], ["land_use"])
 
-    land_geom = land_ftc.geometry()
+    land_geom = target_geometry(land_ftc)
 
     ihaCategories = ee.Dictionary(
         {
@@ -541,7 +659,7 @@ def soil_type_gres(target_ftc):
 
     # >=40 kg/m2; Organic
     #  <40 kg/m2; Mineral
-    target_geom = target_ftc.geometry()
+    target_geom = target_geometry(target_ftc)
 
     # Soil Type
     SOIL_CARBON_CAT = (
@@ -549,8 +667,7 @@ def soil_type_gres(target_ftc):
     )
 
     # Expected SCALE = 1000
-    projection = ee.Image(SOIL_CARBON_CAT).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(SOIL_CARBON_CAT, "soilgrids250m_ocs")
 
     stats = SOIL_CARBON_CAT.reduceRegion(
         **{
@@ -590,19 +707,7 @@ def soc_percent(target_ftc=None):
 
     if target_ftc is not None:
 
-        target_geom = target_ftc.geometry()
-
-        projection = ee.Image(soil_grids_psoc).projection()
-        SCALE = projection.nominalScale()
-
-        soc_percent_value = soil_grids_psoc.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": target_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        ).get("PSOC")
+        soc_percent_value = layer_means(target_ftc, "soilgrids").get("PSOC")
 
         # Explicit null handling not needed
         return soc_percent_value
@@ -612,7 +717,7 @@ def soc_percent(target_ftc=None):
 
 def soil_type(target_ftc):
 
-    target_geom = target_ftc.geometry()
+    target_geom = target_geometry(target_ftc)
 
     # IPCC definition of organic soils
     # > 12% organic carbon by weight in the 0-30cm soil horizon.
@@ -624,8 +729,7 @@ def soil_type(target_ftc):
     SOIL_CARBON_CAT = soc_percent(target_ftc=None).gt(12)
 
     # Expected SCALE = 1000
-    projection = ee.Image(SOIL_CARBON_CAT).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(SOIL_CARBON_CAT, "soilgrids250m_soc")
 
     stats = SOIL_CARBON_CAT.reduceRegion(
         **{
@@ -691,8 +795,7 @@ def landcover_bysoil(land_ftc, landcover_analysis_file_str):
 
     # Expected SCALE = 300
 
-    projection = ee.Image(LANDCOVER_ESA).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(LANDCOVER_ESA, landcover_analysis_file_str)
 
     LANDCOVER_IHA = LANDCOVER_ESA.remap(
         # ESA CODES
@@ -779,7 +882,7 @@ def landcover_bysoil(land_ftc, landcover_analysis_file_str):
         ],
     ).select(["remapped"], ["land_use"])
 
-    land_geom = land_ftc.geometry()
+    land_geom = target_geometry(land_ftc)
 
     ihaCategories = ee.Dictionary(
         {
@@ -897,7 +1000,7 @@ def landcover_bysoil(land_ftc, landcover_analysis_file_str):
 
 def mghr(catchment_ftc):
 
-    catch_geom = catchment_ftc.geometry()
+    catch_geom = target_geometry(catchment_ftc)
 
     GHI_NASA_low = ee.FeatureCollection(
         lib.get_private_asset("ghi_nasa_low")
@@ -932,20 +1035,7 @@ def mghr(catchment_ftc):
 
 def twbda_annual_mean_pet(target_ftc):
 
-    twbda_pet = ee.Image(lib.get_private_asset("Eo150_clim"))
-    target_geom = target_ftc.geometry()
-
-    projection = ee.Image(twbda_pet).projection()
-    SCALE = projection.nominalScale()
-
-    mean_annual_pet_value = twbda_pet.reduceRegion(
-        **{
-            "reducer": ee.Reducer.mean(),
-            "geometry": target_geom,
-            "scale": SCALE,
-            "maxPixels": 2e11,
-        }
-    ).get("b1")
+    mean_annual_pet_value = layer_means(target_ftc, "twbda_pet").get("b1")
 
     if debug_mode == True:
         print(
@@ -957,66 +1047,112 @@ def twbda_annual_mean_pet(target_ftc):
     return mean_annual_pet_value
 
 
-def terraclim_monthly_mean(start_yr, end_yr, target_var, scale_factor, target_ftc):
-
-    target_years = ee.List.sequence(start_yr, end_yr)
-    target_geom = target_ftc.geometry()
-
-    # print("[DEBUG]\n [terraclim_monthly_mean]\n ", target_var.getInfo())
-    # print("[DEBUG]\n [terraclim_monthly_mean]\n ", target_years.getInfo())
-
-    TERRACLIM = ee.ImageCollection(
-        lib.get_public_asset("idaho_terraclimate")).select([target_var])
-
+# Climate statistics
+# The yearly images of the climate datasets (annual sums and annual means of
+# monthly images) are stacked into one multi-band image per target and
+# period, with a band per variable, statistic and year, and reduced with a
+# single reduceRegion. Every annual and monthly mean of a target (all
+# variables of its group) is read from that one result.
+climate_datasets = {
     # Expected SCALE = 4638
-    projection = ee.Image(TERRACLIM.first()).projection()
-    SCALE = projection.nominalScale()
-
-    # Calculation fails with null values using nominal scale
-    # SCALE = 30
-
-    def aggregate_months(year):
-
-        date_start = ee.Date.fromYMD(year, 1, 1)
-        date_end = date_start.advance(1, "year")
-
-        year_img = (
-            TERRACLIM.filterDate(date_start, date_end)
-            .mean()
-            .set({"year": year, "system:time_start": date_start})
-        )
-        return year_img
-
-    # Convert monthly image collection to yearly
-    metric_yearly_cimg = ee.ImageCollection(target_years.map(aggregate_months))
+    # (variables of catchments and of reservoirs)
+    "terraclimate": {
+        "asset": "idaho_terraclimate",
+        "variable_groups": [["ro", "pr", "pet", "soil"], ["vs"]],
+    },
+    # Expected SCALE = 10000
+    "smap": {
+        "asset": "nasa_smap_soil_moisture",
+        "variable_groups": [["smp"]],
+    },
+}
 
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", metric_yearly_cimg.getInfo())
 
-    # Get regional values
-    def get_regional_value(img, first):
+def climate_variables(dataset, target_var):
+    """Variables of a climate dataset reduced together with target_var"""
+    for variables in climate_datasets[dataset]["variable_groups"]:
+        if target_var in variables:
+            return variables
+    # Variables outside the dataset's groups are reduced on their own
+    return [target_var]
+
+
+def climate_band_name(target_var, statistic, year):
+    # e.g. ro_sum_2000 (annual sum of ro in 2000)
+    return f"{target_var}_{statistic}_{year}"
+
+
+def climate_statistics(target_ftc, dataset, start_yr, end_yr, variables):
+    """Regional means of the yearly images of the variables of a climate
+    dataset over a target (ee.Dictionary by climate_band_name; null for
+    years without data over the target), computed with one reduceRegion"""
+
+    def reduce_yearly_images():
+        collection = ee.ImageCollection(
+            lib.get_public_asset(climate_datasets[dataset]["asset"])
+        ).select(variables)
+
+        # Calculation fails with null values using nominal scale
+        # SCALE = 30
+        SCALE = nominal_scale(collection.first(), climate_datasets[dataset]["asset"])
+
+        yearly_imgs = []
+        for year in range(start_yr, end_yr + 1):
+            date_start = ee.Date.fromYMD(year, 1, 1)
+            date_end = date_start.advance(1, "year")
+            year_cimg = collection.filterDate(date_start, date_end)
+            has_images = year_cimg.size().gt(0)
+            for target_var in variables:
+                var_cimg = year_cimg.select([target_var])
+                for statistic, img in [("sum", var_cimg.sum()), ("mean", var_cimg.mean())]:
+                    # A year without images has no bands to reduce; a fully
+                    # masked band reduces to null instead
+                    yearly_img = ee.Image(
+                        ee.Algorithms.If(
+                            has_images, img, ee.Image.constant(0).updateMask(0)
+                        )
+                    )
+                    yearly_imgs.append(
+                        yearly_img.rename(climate_band_name(target_var, statistic, year))
+                    )
 
-        stats = img.reduceRegion(
+        return ee.Image.cat(yearly_imgs).reduceRegion(
             **{
                 "reducer": ee.Reducer.mean(),
-                "geometry": target_geom,
+                "geometry": target_geometry(target_ftc),
                 "scale": SCALE,
                 "maxPixels": 2e11,
             }
         )
 
-        # Map null values to -999
-        stats = stats.map(
-            lambda k, v: ee.Algorithms.If(
-                ee.Algorithms.IsEqual(v, None), -999, stats.get(k)
-            )
-        )
-        metric = stats.get(target_var)
-        returnValue = ee.List(first).add(metric)
+    key = f"climate:{dataset}:{start_yr}-{end_yr}:{','.join(variables)}"
+    return profile_context(target_ftc).memo(key, reduce_yearly_images)
+
 
-        return returnValue
+def climate_yearly_values(
+    target_ftc, dataset, start_yr, end_yr, target_var, statistic, scale_factor=None
+):
+    """Yearly regional values of a variable (ee.List; years without data
+    over the target are dropped), optionally multiplied by scale_factor"""
 
-    results = ee.List([])
-    regional_metrics_yearly = metric_yearly_cimg.iterate(get_regional_value, results)
+    variables = climate_variables(dataset, target_var)
+    stats = climate_statistics(target_ftc, dataset, start_yr, end_yr, variables)
+    band_names = [
+        climate_band_name(target_var, statistic, year)
+        for year in range(start_yr, end_yr + 1)
+    ]
+    values = stats.values(band_names).removeAll([None])
+
+    if scale_factor is not None:
+        values = values.map(lambda v: ee.Number(v).multiply(scale_factor))
+    return values
+
+
+def terraclim_monthly_mean(start_yr, end_yr, target_var, scale_factor, target_ftc):
+
+    regional_metrics_yearly = climate_yearly_values(
+        target_ftc, "terraclimate", start_yr, end_yr, target_var, "mean", scale_factor
+    )
 
     if debug_mode == True:
         print(
@@ -1024,12 +1160,7 @@ def terraclim_monthly_mean(start_yr, end_yr, target_var, scale_factor, target_ft
             regional_metrics_yearly.getInfo(),
         )
 
-    mean_monthly_value = ee.Number(
-        ee.List(regional_metrics_yearly)
-        .filter(ee.Filter.neq("item", -999))
-        .map(lambda v: ee.Number(v).multiply(scale_factor))
-        .reduce("mean")
-    )
+    mean_monthly_value = ee.Number(regional_metrics_yearly.reduce("mean"))
 
     # Explicit null handling not needed
     return mean_monthly_value
@@ -1037,216 +1168,41 @@ def terraclim_monthly_mean(start_yr, end_yr, target_var, scale_factor, target_ft
 
 def terraclim_annual_mean(start_yr, end_yr, target_var, scale_factor, target_ftc):
 
-    target_years = ee.List.sequence(start_yr, end_yr)
-    target_geom = target_ftc.geometry()
-
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", target_var.getInfo())
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", target_years.getInfo())
-
-    TERRACLIM = ee.ImageCollection(
-        lib.get_public_asset("idaho_terraclimate")).select([target_var])
-
-    # Expected SCALE = 4638
-    projection = ee.Image(TERRACLIM.first()).projection()
-    SCALE = projection.nominalScale()
-
-    # Calculation fails with null values using nominal scale
-    # SCALE = 30
-
-    def aggregate_months(year):
-
-        date_start = ee.Date.fromYMD(year, 1, 1)
-        date_end = date_start.advance(1, "year")
-
-        year_img = (
-            TERRACLIM.filterDate(date_start, date_end)
-            .sum()
-            .set({"year": year, "system:time_start": date_start})
-        )
-        return year_img
-
-    # Convert monthly image collection to yearly
-    metric_yearly_cimg = ee.ImageCollection(target_years.map(aggregate_months))
-
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", metric_yearly_cimg.getInfo())
-
-    # Get regional values
-    def get_regional_value(img, first):
-
-        stats = img.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": target_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        )
-
-        # Map null values to -999
-        stats = stats.map(
-            lambda k, v: ee.Algorithms.If(
-                ee.Algorithms.IsEqual(v, None), -999, stats.get(k)
-            )
-        )
-        metric = stats.get(target_var)
-        returnValue = ee.List(first).add(metric)
-
-        return returnValue
-
-    results = ee.List([])
-    regional_metrics_yearly = metric_yearly_cimg.iterate(get_regional_value, results)
-
-    mean_annual_value = ee.Number(
-        ee.List(regional_metrics_yearly)
-        .filter(ee.Filter.neq("item", -999))
-        .map(lambda v: ee.Number(v).multiply(scale_factor))
-        .reduce("mean")
+    regional_metrics_yearly = climate_yearly_values(
+        target_ftc, "terraclimate", start_yr, end_yr, target_var, "sum", scale_factor
     )
 
+    mean_annual_value = ee.Number(regional_metrics_yearly.reduce("mean"))
+
     # Explicit null handling not needed
     return mean_annual_value
 
 
 def smap_annual_mean(start_yr, end_yr, target_var, target_ftc):
 
-    target_years = ee.List.sequence(start_yr, end_yr)
-    target_geom = target_ftc.geometry()
-
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", target_var.getInfo())
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", target_years.getInfo())
-
-    SMAP10KM = ee.ImageCollection(
-        lib.get_public_asset("nasa_smap_soil_moisture")).select([target_var])
-
-    # Expected SCALE = 10000
-    projection = ee.Image(SMAP10KM.first()).projection()
-    SCALE = projection.nominalScale()
-
-    def aggregate_months(year):
-
-        date_start = ee.Date.fromYMD(year, 1, 1)
-        date_end = date_start.advance(1, "year")
-
-        year_img = (
-            SMAP10KM.filterDate(date_start, date_end)
-            .sum()
-            .set({"year": year, "system:time_start": date_start})
-        )
-        return year_img
-
-    # Convert monthly image collection to yearly
-    metric_yearly_cimg = ee.ImageCollection(target_years.map(aggregate_months))
-
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", metric_yearly_cimg.getInfo())
-
-    # Get regional values
-    def get_regional_value(img, first):
-
-        stats = img.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": target_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        )
-
-        # Map null values to -999
-        stats = stats.map(
-            lambda k, v: ee.Algorithms.If(
-                ee.Algorithms.IsEqual(v, None), -999, stats.get(k)
-            )
-        )
-        metric = stats.get(target_var)
-        returnValue = ee.List(first).add(metric)
-
-        return returnValue
-
-    results = ee.List([])
-    regional_metrics_yearly = metric_yearly_cimg.iterate(get_regional_value, results)
-
-    mean_annual_value = ee.Number(
-        ee.List(regional_metrics_yearly)
-        .filter(ee.Filter.neq("item", -999))
-        .reduce("mean")
+    regional_metrics_yearly = climate_yearly_values(
+        target_ftc, "smap", start_yr, end_yr, target_var, "sum"
     )
 
+    mean_annual_value = ee.Number(regional_metrics_yearly.reduce("mean"))
+
     # Explicit null handling not needed
     return mean_annual_value
 
 
 def smap_monthly_mean(start_yr, end_yr, target_var, target_ftc):
 
-    target_years = ee.List.sequence(start_yr, end_yr)
-    target_geom = target_ftc.geometry()
-
-    # print("[DEBUG]\n [terraclim_monthly_mean]\n ", target_var.getInfo())
-    # print("[DEBUG]\n [terraclim_monthly_mean]\n ", target_years.getInfo())
-
-    SMAP10KM = ee.ImageCollection(
-        lib.get_public_asset("nasa_smap_soil_moisture")).select([target_var])
-
-    # Expected SCALE = 10km
-    projection = ee.Image(SMAP10KM.first()).projection()
-    SCALE = projection.nominalScale()
-
-    # Calculation fails with null values using nominal scale
-    # SCALE = 30
-
-    def aggregate_months(year):
-
-        date_start = ee.Date.fromYMD(year, 1, 1)
-        date_end = date_start.advance(1, "year")
-
-        year_img = (
-            SMAP10KM.filterDate(date_start, date_end)
-            .mean()
-            .set({"year": year, "system:time_start": date_start})
-        )
-        return year_img
-
-    # Convert monthly image collection to yearly
-    metric_yearly_cimg = ee.ImageCollection(target_years.map(aggregate_months))
-
-    # print("[DEBUG]\n [terraclim_annual_mean]\n ", metric_yearly_cimg.getInfo())
-
-    # Get regional values
-    def get_regional_value(img, first):
-
-        stats = img.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": target_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        )
-
-        # Map null values to -999
-        stats = stats.map(
-            lambda k, v: ee.Algorithms.If(
-                ee.Algorithms.IsEqual(v, None), -999, stats.get(k)
-            )
-        )
-        metric = stats.get(target_var)
-        returnValue = ee.List(first).add(metric)
-
-        return returnValue
-
-    results = ee.List([])
-    regional_metrics_yearly = metric_yearly_cimg.iterate(get_regional_value, results)
+    regional_metrics_yearly = climate_yearly_values(
+        target_ftc, "smap", start_yr, end_yr, target_var, "mean"
+    )
 
     if debug_mode == True:
         print(
-            "[terraclim_monthly_mean] regional_metrics_yearly",
+            "[smap_monthly_mean] regional_metrics_yearly",
             regional_metrics_yearly.getInfo(),
         )
 
-    mean_monthly = ee.Number(
-        ee.List(regional_metrics_yearly)
-        .filter(ee.Filter.neq("item", -999))
-        .reduce("mean")
-    )
+    mean_monthly = ee.Number(regional_metrics_yearly.reduce("mean"))
 
     # null handling
     mean_monthly_value = ee.Algorithms.If(
@@ -1260,27 +1216,12 @@ def smap_monthly_mean(start_yr, end_yr, target_var, target_ftc):
 
 
 # Mean annual runoff
+@memoised_metric
 def mean_annual_runoff_mm(catchment_ftc):
 
-    catchment_geom = catchment_ftc.geometry()
-
     # FEKETE (30' ~ 55560 m )
-    RUNOFF = ee.Image(lib.get_private_asset("cmp_ro_grdc_runoff"))
-
     # Expected SCALE = 55560
-    projection = ee.Image(RUNOFF).projection()
-    SCALE = projection.nominalScale()
-
-    mean_runoff_mm_value = ee.Number(
-        RUNOFF.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": catchment_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        ).get("b1")
-    )
+    mean_runoff_mm_value = ee.Number(layer_means(catchment_ftc, "runoff").get("b1"))
 
     # Explicit null handling not needed
     if debug_mode == True:
@@ -1294,24 +1235,9 @@ def mean_annual_runoff_mm(catchment_ftc):
 def mean_annual_prec_mm(catchment_ftc) -> ee.Number:
 
     # World Clim 2.1 30 Arc seconds resolution; ~900m
-    BIOCLIMATE = ee.Image(lib.get_private_asset("worldclim_bio"))
-    BIOPRECIPITATION = BIOCLIMATE.select(["b1"], ["bio12"])
-
     # Expected SCALE = 900
-    projection = ee.Image(BIOCLIMATE).projection()
-    SCALE = projection.nominalScale()
-
-    catchment_geom = catchment_ftc.geometry()
-
     mean_annual_prec_mm_value = ee.Number(
-        BIOPRECIPITATION.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": catchment_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        ).get("bio12")
+        layer_means(catchment_ftc, "precipitation").get("bio12")
     )
 
     # Explicit null handling not needed
@@ -1324,7 +1250,7 @@ def predominant_biome(catchment_ftc):
     # Biome
     BIOMES = ee.FeatureCollection(lib.get_public_asset("biome2017"))
 
-    catchment_geom = catchment_ftc.geometry()
+    catchment_geom = target_geometry(catchment_ftc)
     catchment_buffer_geom = catchment_geom.buffer(500)
     catchment_bbox = catchment_buffer_geom.bounds()
 
@@ -1372,14 +1298,13 @@ def predominant_biome(catchment_ftc):
 
 def predominant_climate(catchment_ftc):
 
-    catchment_geom = catchment_ftc.geometry()
+    catchment_geom = target_geometry(catchment_ftc)
 
     # Climate
     CLIMATE = ee.Image(lib.get_private_asset("beck_clim"))
 
     # Expected SCALE = 1000
-    projection = ee.Image(CLIMATE).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(CLIMATE, "beck_clim")
 
     modal_climate_category = CLIMATE.reduceRegion(
         **{
@@ -1396,36 +1321,11 @@ def predominant_climate(catchment_ftc):
 # Population
 
 
+@memoised_metric
 def population_density(target_ftc):
 
-    target_geom = target_ftc.geometry()
-
-    # ==========================================================================
-    #  LOAD DATA
-    # ==========================================================================
-    POPULATION = ee.ImageCollection(lib.get_public_asset("GPWv411_pop_den"))
-
-    # First image; 2020
-    POPULATION = POPULATION.limit(1, "system:time_start", False).first()
     # Expected SCALE = 927.67
-
-    projection = ee.Image(POPULATION).projection()
-    SCALE = projection.nominalScale()
-
-    # ==========================================================================
-    #  Population
-    # ==========================================================================
-
-    mean_pop_density = (
-        POPULATION.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": target_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        )
-    ).get("population_density")
+    mean_pop_density = layer_means(target_ftc, "population").get("population_density")
     # Explicit null handling not needed
     return mean_pop_density
 
@@ -1435,8 +1335,7 @@ def population(target_ftc):
     mean_pop_density = population_density(target_ftc)
 
     # Calculate the area of the catchment in km;
-    target_geom = target_ftc.geometry()
-    targetAreaValue = target_geom.area(1).divide(1000 * 1000)
+    targetAreaValue = area(target_ftc)
 
     # Handle null values
     pop_count_value = ee.Algorithms.If(
@@ -1454,18 +1353,13 @@ def population(target_ftc):
 # ==============================================================================
 
 # Utils
+@memoised_metric
 def minimum_elevation_dam(reservoir_ftc):
 
-    if cfg.paramHydroDEM == True:
-        DEM = ee.Image(lib.get_public_asset("hydrosheds") + cfg.hydrodataset + "CONDEM").rename(
-            ["elevation"]
-        )
-    else:
-        DEM = ee.Image(lib.get_public_asset("nasa_srtm"))
+    DEM = target_dem(reservoir_ftc)
 
     # Expected SCALE = 30 for SRTM
-    projection = ee.Image(DEM).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(DEM, dem_asset())
 
     snapped_dam_longitude = ee.Number(ee.Feature(reservoir_ftc.first()).get("ps_lon"))
     snapped_dam_latitude = ee.Number(ee.Feature(reservoir_ftc.first()).get("ps_lat"))
@@ -1498,20 +1392,15 @@ def minimum_elevation_dam(reservoir_ftc):
 
 
 # Not needed if maximum_depth_alt2 not used.
+@memoised_metric
 def minimum_elevation(reservoir_ftc):
 
-    reservoir_geom = reservoir_ftc.geometry()
+    reservoir_geom = target_geometry(reservoir_ftc)
 
-    if cfg.paramHydroDEM == True:
-        DEM = ee.Image(lib.get_public_asset("hydrosheds") + cfg.hydrodataset + "CONDEM").rename(
-            ["elevation"]
-        )
-    else:
-        DEM = ee.Image(lib.get_public_asset("nasa_srtm"))
+    DEM = target_dem(reservoir_ftc)
 
     # Expected SCALE = 30
-    projection = ee.Image(DEM).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(DEM, dem_asset())
 
     geom_min_elevation = ee.Number(
         DEM.reduceRegion(
@@ -1528,20 +1417,15 @@ def minimum_elevation(reservoir_ftc):
 
 
 # Not needed if maximum_depth_alt1, maximum_depth_alt2 not used.
+@memoised_metric
 def maximum_elevation(reservoir_ftc):
 
-    reservoir_geom = reservoir_ftc.geometry()
+    reservoir_geom = target_geometry(reservoir_ftc)
 
-    if cfg.paramHydroDEM == True:
-        DEM = ee.Image(lib.get_public_asset("hydrosheds") + cfg.hydrodataset + "CONDEM").rename(
-            ["elevation"]
-        )
-    else:
-        DEM = ee.Image(lib.get_public_asset("nasa_srtm"))
+    DEM = target_dem(reservoir_ftc)
 
     # Expected SCALE = 30
-    projection = ee.Image(DEM).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(DEM, dem_asset())
 
     geom_max_elevation = DEM.reduceRegion(
         **{
@@ -1556,30 +1440,29 @@ def maximum_elevation(reservoir_ftc):
     return geom_max_elevation
 
 
+def depth_image(reservoir_ftc):
+    # Depth = water surface elevation - elevation (band "elevation")
+    def build():
+        water_level_elevation = ee.Number.parse(
+            reservoir_ftc.first().get("r_imputed_water_elevation")
+        )
+        return target_dem(reservoir_ftc).multiply(-1).add(water_level_elevation)
+
+    return profile_context(reservoir_ftc).memo("depth", build)
+
+
 # Outputs
 def maximum_depth(reservoir_ftc):
 
-    reservoir_geom = reservoir_ftc.geometry()
+    reservoir_geom = target_geometry(reservoir_ftc)
 
-    # Depth = water surface elevation - elevation
-    water_level_elevation = ee.Number.parse(
-        reservoir_ftc.first().get("r_imputed_water_elevation")
-    )
-
-    if cfg.paramHydroDEM == True:
-        DEM = ee.Image(lib.get_public_asset("hydrosheds") + cfg.hydrodataset + "CONDEM").rename(
-            ["elevation"]
-        )
-    else:
-        DEM = ee.Image(lib.get_public_asset("nasa_srtm"))
+    DEM = target_dem(reservoir_ftc)
 
     # Expected SCALE = 30
-    projection = ee.Image(DEM).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(DEM, dem_asset())
 
     max_depth = (
-        DEM.multiply(-1)
-        .add(water_level_elevation)
+        depth_image(reservoir_ftc)
         .reduceRegion(
             **{
                 "reducer": ee.Reducer.max(),
@@ -1639,28 +1522,17 @@ def maximum_depth_alt2(reservoir_ftc):
     return max_depth
 
 
+@memoised_metric
 def mean_depth(reservoir_ftc):
-    reservoir_geom = reservoir_ftc.geometry()
+    reservoir_geom = target_geometry(reservoir_ftc)
 
-    # Depth = water surface elevation - elevation
-    water_level_elevation = ee.Number.parse(
-        reservoir_ftc.first().get("r_imputed_water_elevation")
-    )
-
-    if cfg.paramHydroDEM == True:
-        DEM = ee.Image(lib.get_public_asset("hydrosheds") + cfg.hydrodataset + "CONDEM").rename(
-            ["elevation"]
-        )
-    else:
-        DEM = ee.Image(lib.get_public_asset("nasa_srtm"))
+    DEM = target_dem(reservoir_ftc)
 
     # Expected SCALE = 30
-    projection = ee.Image(DEM).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(DEM, dem_asset())
 
     mean_depth_value = (
-        DEM.multiply(-1)
-        .add(water_level_elevation)
+        depth_image(reservoir_ftc)
         .reduceRegion(
             **{
                 "reducer": ee.Reducer.mean(),
@@ -1699,14 +1571,13 @@ def reservoir_volume(surface_area, mean_depth):
 # Mean monthly temperatures
 def mean_monthly_temps(reservoir_ftc):
 
-    reservoir_geom = reservoir_ftc.geometry()
+    reservoir_geom = target_geometry(reservoir_ftc)
 
     TAVG = ee.ImageCollection(lib.get_private_asset("worldclim_tavg"))
     TEMPERATURE = TAVG.select(["b1"]).toList(12)
 
     # Expected SCALE = 30
-    projection = ee.Image(TAVG.first()).projection()
-    SCALE = projection.nominalScale()
+    SCALE = nominal_scale(TAVG.first(), "worldclim_tavg")
 
     months = ee.List.sequence(0, 11, 1)
 
@@ -1736,28 +1607,15 @@ def mean_monthly_temps(reservoir_ftc):
 
 
 def mean_olsen_kgperha(catchment_ftc):
-    catch_geom = catchment_ftc.geometry()
 
-    OLSEN = ee.Image(lib.get_private_asset("OlsenP_kgha1_World"))
     # Expected SCALE = 30
-    projection = ee.Image(OLSEN).projection()
-    SCALE = projection.nominalScale()
-
-    mean_p_value = ee.Number(
-        OLSEN.reduceRegion(
-            **{
-                "reducer": ee.Reducer.mean(),
-                "geometry": catch_geom,
-                "scale": SCALE,
-                "maxPixels": 2e11,
-            }
-        ).get("b1")
-    )
+    mean_p_value = ee.Number(layer_means(catchment_ftc, "olsen").get("b1"))
 
     # Explicit null handling not needed
     return mean_p_value
 
 
+@memoised_metric
 def mean_discharge_peryr(catchment_ftc):
     # Mean discharge
     mar_mm = mean_annual_runoff_mm(catchment_ftc)
@@ -2513,22 +2371,79 @@ def batch_delete_shapes(c_dam_ids, output_type):
 
     file_prefix = heet_export.export_job_specs[output_type]["fileprefix"]
 
-    for c_dam_id in c_dam_ids:
+    targetAssetNames = [
+        cfg.ps_heet_folder + "/" + file_prefix + str(c_dam_id) for c_dam_id in c_dam_ids
+    ]
 
-        c_dam_id_str = str(c_dam_id)
+    # Deleted concurrently (see heet_asset_ops); a failed deletion is logged
+    # and does not stop the others
+    for (targetAssetName,), error in mtr.asset_ops.delete(targetAssetNames):
+        msg = f"Problem deleting intermediate output {targetAssetName}"
+        logger.error(f"{msg}: {error}")
+
+
+def set_dam_id(target_ftc, c_dam_id):
+    # Rows of a batch table carry the id of their dam
+    return target_ftc.map(lambda feat: feat.set("id", c_dam_id))
+
+
+def batch_profile(c_dam_ids, fileprefix, jobtype, profile):
+    """Profile the shapes (fileprefix assets) of several dams and export the
+    profiles to one table with a single task (see heet_export.export_batch_ftc).
+    The mean-style metrics of the whole batch are computed with one
+    reduceRegions per layer group. profile is called with a dam's id and shape
+    and returns the profiled shape"""
 
-        targetAssetName = cfg.ps_heet_folder + "/" + file_prefix + c_dam_id_str
+    targets = [
+        (c_dam_id, ee.FeatureCollection(cfg.ps_heet_folder + "/" + fileprefix + str(c_dam_id)))
+        for c_dam_id in c_dam_ids
+    ]
+    batch_layer_means(targets)
 
+    profiled_ftcs = []
+    profiled_dam_id_strs = []
+    for c_dam_id, target_ftc in targets:
         try:
-            ee.data.deleteAsset(targetAssetName)
+            profiled_ftcs.append(set_dam_id(profile(c_dam_id, target_ftc), c_dam_id))
+            profiled_dam_id_strs.append(str(c_dam_id))
         except Exception as error:
-            msg = f"Problem deleting intermediate output {targetAssetName}"
+            msg = f"Problem profiling {fileprefix}{c_dam_id} in batch"
             logger.exception(f"{msg}")
+            mtr.pipeline.fail(int(c_dam_id))
             continue
 
+    if len(profiled_dam_id_strs) == 0:
+        return
+
+    def dam_profile_ftc(c_dam_id_str):
+        # The dam's shape profiled on its own (without the batch reductions)
+        target_ftc = ee.FeatureCollection(cfg.ps_heet_folder + "/" + fileprefix + c_dam_id_str)
+        return set_dam_id(profile(int(c_dam_id_str), target_ftc), int(c_dam_id_str))
+
+    logger.info(f"[batch_profile] Exporting {jobtype} of {len(profiled_dam_id_strs)} dams in one task")
+    heet_export.export_batch_ftc(
+        ee.FeatureCollection(profiled_ftcs).flatten(),
+        profiled_dam_id_strs,
+        jobtype,
+        dam_profile_ftc,
+    )
+
 
 def batch_profile_reservoirs(c_dam_ids):
 
+    if cfg.batch_profiling == True:
+        batch_profile(
+            c_dam_ids,
+            "r_",
+            "reservoir_vector_params",
+            lambda c_dam_id, reservoir_ftc: profile_reservoir(
+                reservoir_ftc,
+                str(mtr.id_landcover_analysis_file_lookup[c_dam_id]),
+                c_dam_id,
+            ),
+        )
+        return
+
     for c_dam_id in c_dam_ids:
 
         c_dam_id_str = str(c_dam_id)
@@ -2549,12 +2464,23 @@ def batch_profile_reservoirs(c_dam_ids):
         except Exception as error:
             msg = "Problem updating Reservoir vector with calculated parameters"
             logger.exception(f"{msg}")
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
 
 def batch_profile_catchments(c_dam_ids):
 
+    if cfg.batch_profiling == True:
+        batch_profile(
+            c_dam_ids,
+            "c_",
+            "catchment_vector_params",
+            lambda c_dam_id, catchment_ftc: profile_catchment(
+                catchment_ftc, str(mtr.id_landcover_analysis_file_lookup[c_dam_id])
+            ),
+        )
+        return
+
     for c_dam_id in c_dam_ids:
 
         c_dam_id_str = str(c_dam_id)
@@ -2575,7 +2501,7 @@ def batch_profile_catchments(c_dam_ids):
         except Exception as error:
             msg = "Problem updating Catchment vector with calculated parameters"
             logger.exception(f"{msg}")
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
 
@@ -2598,12 +2524,21 @@ def batch_profile_rivers(c_dam_ids):
         except Exception as error:
             msg = "Problem updating River vector with calculated parameters"
             logger.exception(f"{msg}")
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
 
 def batch_profile_nicatchments(c_dam_ids):
 
+    if cfg.batch_profiling == True:
+        batch_profile(
+            c_dam_ids,
+            "n_",
+            "ni_catchment_vector_params",
+            lambda c_dam_id, nicatchment_ftc: profile_nicatchment(nicatchment_ftc),
+        )
+        return
+
     for c_dam_id in c_dam_ids:
 
         c_dam_id_str = str(c_dam_id)
@@ -2619,7 +2554,7 @@ def batch_profile_nicatchments(c_dam_ids):
         except Exception as error:
             msg = "Problem updating NI Catchment vector with calculated parameters"
             logger.exception(f"{msg}")
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
 
@@ -0,0 +1,190 @@
+""" Per-dam state machine for the stages of the analysis critical path.
+
+    Each dam waits on exactly one critical path stage at a time. When the
+    task of that stage completes, the dam is advanced immediately and the
+    action that submits its next stage is run for that dam alone. A dam
+    leaves the pipeline when its final stage completes (DONE) or when any
+    of its stages fails (FAILED) """
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+# Terminal states
+DONE = "DONE"
+FAILED = "FAILED"
+
+
+class DamPipeline:
+    """State machine tracking the critical path stage of every dam.
+
+    Args:
+        stages: ordered task codes of the critical path; the state of an
+            active dam is the task code it is waiting for.
+        actions: mapping of task code to a callable taking a list of dam ids.
+            It is called when a dam completes that stage, after the dam has
+            moved on to the next stage (it submits the next stage's tasks).
+        on_change: optional callable taking a dam id and its new state, called
+            on every state change (e.g. to record it in the run journal).
+        dispatch: optional callable taking a stage, its action and a list of
+            dam ids that runs the action instead of the pipeline (e.g. on a
+            worker thread; see heet_orchestrator). It is then responsible
+            for failing the dams if the action raises.
+
+    State changes may come from several threads; they hold a lock.
+    """
+
+    def __init__(
+        self,
+        stages: Iterable[str],
+        actions: Optional[Dict[str, Callable[[List[int]], None]]] = None,
+        on_change: Optional[Callable[[int, str], None]] = None,
+        dispatch: Optional[Callable[[str, Callable[[List[int]], None], List[int]], None]] = None,
+    ):
+        self.stages = list(stages)
+        self.actions = actions if actions is not None else {}
+        self.on_change = on_change
+        self.dispatch = dispatch
+        self._lock = threading.RLock()
+        self.states: Dict[int, str] = {}
+        self.failures: Dict[int, str] = {}
+        # Number of critical path stages completed by all dams
+        self.completed_steps = 0
+
+    def start(self, dam_ids: Iterable[int]) -> None:
+        """Put dams at the start of the critical path"""
+        for dam_id in dam_ids:
+            self._set_state(dam_id, self.stages[0])
+
+    def restore(self, dam_id: int, completed_stage: Optional[str]) -> str:
+        """Put a dam back in the pipeline after completed_stage (at the start
+        of the critical path if None), without running any action. Used to
+        resume an interrupted run. Returns the new state of the dam"""
+        if completed_stage is None:
+            state = self.stages[0]
+        else:
+            state = self.next_stage(completed_stage)
+        self._set_state(dam_id, state)
+        return state
+
+    def _set_state(self, dam_id: int, state: str) -> None:
+        self.states[dam_id] = state
+        if self.on_change is not None:
+            try:
+                self.on_change(dam_id, state)
+            except Exception:
+                logger.exception(f"[DamPipeline] Problem recording state {state} for dam {dam_id}")
+
+    @property
+    def active(self) -> List[int]:
+        """Dams that have neither finished nor failed"""
+        return [d for d, s in self.states.items() if s not in [DONE, FAILED]]
+
+    @property
+    def done(self) -> List[int]:
+        return [d for d, s in self.states.items() if s == DONE]
+
+    @property
+    def failed(self) -> List[int]:
+        return [d for d, s in self.states.items() if s == FAILED]
+
+    def state(self, dam_id: int) -> Optional[str]:
+        return self.states.get(dam_id)
+
+    def is_active(self, dam_id: int) -> bool:
+        return self.states.get(dam_id) not in [None, DONE, FAILED]
+
+    def next_stage(self, stage: str) -> str:
+        """Stage following stage on the critical path (DONE after the last)"""
+        position = self.stages.index(stage)
+        if position + 1 < len(self.stages):
+            return self.stages[position + 1]
+        return DONE
+
+    def complete(self, dam_id: int, stage: str) -> Optional[str]:
+        """Record completion of stage for dam_id, advance the dam and run the
+        stage's action. Returns the new state of the dam, or None if the
+        completion was not expected (dam inactive or in another stage)"""
+        with self._lock:
+            if self.states.get(dam_id) != stage:
+                logger.debug(
+                    f"[DamPipeline] Ignoring completion of {stage} for dam {dam_id} "
+                    + f"(state: {self.states.get(dam_id)})"
+                )
+                return None
+
+            self._set_state(dam_id, self.next_stage(stage))
+            self.completed_steps = self.completed_steps + 1
+
+        self.trigger(stage, [dam_id])
+
+        return self.states[dam_id]
+
+    def complete_all(self, dam_ids: Iterable[int], stage: str) -> List[int]:
+        """Record completion of stage for several dams and run the stage's
+        action once for all of them (e.g. to batch their next stage).
+        Returns the dams that were advanced (see complete)"""
+        advanced = []
+        with self._lock:
+            for dam_id in dam_ids:
+                if self.states.get(dam_id) != stage:
+                    logger.debug(
+                        f"[DamPipeline] Ignoring completion of {stage} for dam {dam_id} "
+                        + f"(state: {self.states.get(dam_id)})"
+                    )
+                    continue
+                self._set_state(dam_id, self.next_stage(stage))
+                self.completed_steps = self.completed_steps + 1
+                advanced.append(dam_id)
+
+        self.trigger(stage, advanced)
+
+        return advanced
+
+    def trigger(self, stage: str, dam_ids: List[int]) -> None:
+        """Run the action of stage for dams that have completed it. Dams for
+        which the action raises are failed"""
+        action = self.actions.get(stage)
+        if action is None or len(dam_ids) == 0:
+            return
+        if self.dispatch is not None:
+            self.dispatch(stage, action, dam_ids)
+            return
+        try:
+            action(dam_ids)
+        except Exception:
+            logger.exception(
+                f"[DamPipeline] Problem triggering the stage after {stage} for dams {dam_ids}"
+            )
+            for dam_id in dam_ids:
+                self.fail(dam_id, f"Problem triggering the stage after {stage}")
+
+    def fail(self, dam_id: int, reason: str = "") -> None:
+        """End the analysis of dam_id (a failed critical path stage ends the
+        analysis of a dam)"""
+        with self._lock:
+            if not self.is_active(dam_id):
+                return
+            logger.info(
+                f"[DamPipeline] Dam {dam_id} failed at stage {self.states[dam_id]}. {reason}"
+            )
+            self.failures[dam_id] = self.states[dam_id]
+            self._set_state(dam_id, FAILED)
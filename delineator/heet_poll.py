@@ -0,0 +1,152 @@
+""" Adaptive intervals between polls of the EE task queue.
+
+    The time each stage (task code) takes is learnt from the tasks that
+    complete during the run: their wall-clock duration and the EECU seconds
+    they used (batch_eecu_usage_seconds). After every poll, the time left
+    before each unfinished task is expected to complete is estimated from
+    its elapsed time and, while it runs, from the rate at which it uses
+    EECU. The next poll is scheduled when the first completion is expected:
+    rarely while nothing can finish and often when completions are due.
+    Stages that have not completed yet in the run are polled at the
+    shortest interval. """
+import time
+import logging
+import statistics
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+# Task states (as reported by ee.batch.Task.status()) of finished tasks
+# (as in heet_status, which imports ee)
+FINISHED_STATES = ["COMPLETED", "CANCELLED", "FAILED"]
+
+
+class PollSchedule:
+    """Chooses the interval between polls from observed task durations.
+
+    Args:
+        min_step_s: shortest interval between polls.
+        max_step_s: longest interval between polls (bounds the latency
+            added when a task completes sooner than expected).
+        clock: callable returning the current time in seconds since the
+            epoch (EE task timestamps are epoch milliseconds).
+    """
+
+    def __init__(
+        self,
+        min_step_s: float = 5.0,
+        max_step_s: float = 60.0,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.min_step_s = min_step_s
+        self.max_step_s = max_step_s
+        self.clock = clock
+        # Wall-clock seconds and EECU seconds of completed tasks, by task code
+        self.durations: Dict[str, List[float]] = {}
+        self.eecu_usage: Dict[str, List[float]] = {}
+        # Number of polls, by wait loop
+        self.polls: Dict[str, int] = {}
+        self._running: List[Tuple[str, dict]] = []
+        self._recorded: Set[str] = set()
+
+    @property
+    def total_polls(self) -> int:
+        return sum(self.polls.values())
+
+    def record_poll(self, loop_name: str) -> None:
+        """Count a poll made by a wait loop"""
+        self.polls[loop_name] = self.polls.get(loop_name, 0) + 1
+
+    def update(
+        self, statuses: Iterable[Tuple[str, dict]], task_codes: Optional[Iterable[str]] = None
+    ) -> None:
+        """Record the (task code, status) of the tasks seen in a poll.
+
+        The duration of each completed task is recorded once. Unfinished
+        tasks (restricted to task_codes, if given) are the tasks whose
+        completion the next poll waits for.
+        """
+        task_codes = None if task_codes is None else set(task_codes)
+        running = []
+        for task_code, status in statuses:
+            state = status.get("state")
+            if state == "COMPLETED":
+                self._record_duration(task_code, status)
+            elif state not in FINISHED_STATES:
+                if task_codes is None or task_code in task_codes:
+                    running.append((task_code, status))
+        self._running = running
+
+    def _record_duration(self, task_code: str, status: dict) -> None:
+        task_id = status.get("id")
+        if task_id is None or task_id in self._recorded:
+            return
+        self._recorded.add(task_id)
+        started_ms = status.get("start_timestamp_ms", status.get("creation_timestamp_ms"))
+        finished_ms = status.get("update_timestamp_ms")
+        if started_ms is None or finished_ms is None:
+            return
+        self.durations.setdefault(task_code, []).append(max(finished_ms - started_ms, 0) / 1000)
+        if status.get("batch_eecu_usage_seconds") is not None:
+            self.eecu_usage.setdefault(task_code, []).append(status["batch_eecu_usage_seconds"])
+
+    def expected_duration(self, task_code: str) -> Optional[float]:
+        """Median wall-clock seconds of the completed tasks of a task code"""
+        durations = self.durations.get(task_code)
+        if not durations:
+            return None
+        return statistics.median(durations)
+
+    def remaining(self, task_code: str, status: dict) -> Optional[float]:
+        """Seconds until an unfinished task is expected to complete (None if
+        no task of its task code has completed yet)"""
+        expected_s = self.expected_duration(task_code)
+        if expected_s is None:
+            return None
+
+        started_ms = status.get("start_timestamp_ms")
+        if started_ms is None:
+            # Not running yet
+            return expected_s
+        elapsed_s = max(self.clock() - started_ms / 1000, 0)
+        remaining_s = max(expected_s - elapsed_s, 0)
+
+        # Extrapolate the EECU used so far to the typical EECU of the stage
+        eecu_s = status.get("batch_eecu_usage_seconds")
+        if self.eecu_usage.get(task_code) and eecu_s and elapsed_s > 0:
+            expected_eecu_s = statistics.median(self.eecu_usage[task_code])
+            eecu_rate = eecu_s / elapsed_s
+            remaining_s = min(remaining_s, max(expected_eecu_s - eecu_s, 0) / eecu_rate)
+
+        return remaining_s
+
+    def next_step(self, wake_in_s: Optional[float] = None) -> float:
+        """Seconds to wait before the next poll.
+
+        Args:
+            wake_in_s: seconds until something else (e.g. a delayed task
+                in the submission queue) needs a poll, if anything.
+        """
+        estimates = [self.remaining(task_code, status) for task_code, status in self._running]
+        if wake_in_s is not None:
+            estimates.append(wake_in_s)
+        if len(estimates) == 0 or None in estimates:
+            return self.min_step_s
+        return min(max(min(estimates), self.min_step_s), self.max_step_s)
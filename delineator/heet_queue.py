@@ -0,0 +1,130 @@
+""" Local queue of EE tasks waiting to be submitted.
+
+    Tasks are built as soon as a dam reaches a stage but are only started
+    while the number of unfinished HEET tasks is below a limit
+    (heet_config.max_tasks_in_flight), so that optional exports do not
+    compete in the EE queue with tasks on the critical path.
+
+    Queued tasks are started in priority order:
+    - tasks on the critical path before any other (diagnostic) task
+    - critical path tasks of dams with the most remaining stages first, so
+      that the longest remaining chains of tasks start as early as
+      possible and the whole batch finishes sooner
+    - otherwise in the order they were queued
+
+    A task can be queued with a delay (e.g. the backoff before a retry); it
+    is not started before the delay has passed. Tasks can be queued from
+    several threads (see heet_orchestrator) """
+import time
+import heapq
+import logging
+import threading
+import itertools
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+
+class SubmissionQueue:
+    """Priority queue of tasks waiting to be started.
+
+    Args:
+        critical_path: ordered task codes of the critical path.
+        clock: callable returning the current time in seconds.
+    """
+
+    def __init__(self, critical_path: Iterable[str], clock: Callable[[], float] = time.monotonic):
+        self.critical_path = list(critical_path)
+        self.clock = clock
+        self._heap: List[tuple] = []
+        # Delayed tasks, by the time they can be started
+        self._delayed: List[tuple] = []
+        self._sequence = itertools.count()
+        # Seconds each task spent in the queue (once it could be started),
+        # by (task code, key), one per submission of a retried task
+        self.waits: Dict[Tuple[str, str], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap) + len(self._delayed)
+
+    def priority(self, task_code: str) -> tuple:
+        """Sort key of a task code (lower is started first)"""
+        if task_code in self.critical_path:
+            remaining_stages = len(self.critical_path) - self.critical_path.index(task_code)
+            return (0, -remaining_stages)
+        return (1, 0)
+
+    def put(self, task_code: str, key: str, start: Callable[[], None], delay_s: float = 0.0) -> None:
+        """Queue a task. start is called (without arguments) to start it,
+        no earlier than delay_s seconds from now"""
+        with self._lock:
+            ready_at = self.clock() + delay_s
+            entry = (self.priority(task_code), next(self._sequence), task_code, key, start, ready_at)
+            if delay_s > 0:
+                heapq.heappush(self._delayed, (ready_at, entry))
+            else:
+                heapq.heappush(self._heap, entry)
+
+    def pop(self, n_slots: int) -> List[Tuple[str, str, Callable[[], None]]]:
+        """Take up to n_slots tasks off the queue, in the order they should
+        be started, without starting them. Returns (task code, key, start)"""
+        with self._lock:
+            # Delayed tasks whose delay has passed join the queue
+            now = self.clock()
+            while len(self._delayed) > 0 and self._delayed[0][0] <= now:
+                heapq.heappush(self._heap, heapq.heappop(self._delayed)[1])
+
+            popped = []
+            while len(popped) < n_slots and len(self._heap) > 0:
+                _, _, task_code, key, start, ready_at = heapq.heappop(self._heap)
+                self.waits.setdefault((task_code, key), []).append(self.clock() - ready_at)
+                popped.append((task_code, key, start))
+            return popped
+
+    def submit(self, n_slots: int) -> int:
+        """Start up to n_slots queued tasks. Returns the number started"""
+        popped = self.pop(n_slots)
+        for task_code, key, start in popped:
+            try:
+                start()
+            except Exception:
+                logger.exception(f"[SubmissionQueue] Problem starting task {task_code} {key}")
+
+        if len(popped) > 0:
+            logger.debug(f"[SubmissionQueue] Started {len(popped)} tasks, {len(self)} queued")
+        return len(popped)
+
+    def next_ready_in(self) -> Optional[float]:
+        """Seconds until the next delayed task can be started (None if no
+        task is delayed)"""
+        with self._lock:
+            if len(self._delayed) == 0:
+                return None
+            return max(self._delayed[0][0] - self.clock(), 0.0)
+
+    def clear(self) -> int:
+        """Drop all queued tasks. Returns the number dropped"""
+        with self._lock:
+            n_dropped = len(self._heap) + len(self._delayed)
+            self._heap = []
+            self._delayed = []
+        return n_dropped
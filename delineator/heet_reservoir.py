@@ -87,13 +87,12 @@ def batch_delineate_reservoirs(c_dam_ids):
 
         c_dam_id_str = str(c_dam_id)
 
-        snapped_point_name = cfg.ps_heet_folder + "/" + "PS_" + c_dam_id_str
+        # First OK; single feature (the dam's own asset or its row of a
+        # batch table)
+        damFeat = heet_export.dam_output_ftc("PS_", c_dam_id_str).first()
 
-        # First OK; single feature
-        damFeat = ee.FeatureCollection(snapped_point_name).first()
-
-        catchmentAssetName = cfg.ps_heet_folder + "/" + "C_" + c_dam_id_str
-        catchmentVector = ee.FeatureCollection(catchmentAssetName)
+        # The dam's own asset or its rows of a batch table
+        catchmentVector = heet_export.dam_output_ftc("C_", c_dam_id_str)
 
         if c_dam_id in mtr.existing_dams:
             landcover_delineation_file_str = str(
@@ -128,7 +127,7 @@ def batch_delineate_reservoirs(c_dam_ids):
 
         except Exception as error:
             logger.exception(f"{msg} {c_dam_id_str}")
-            mtr.active_analyses.remove(int(c_dam_id_str))
+            mtr.pipeline.fail(int(c_dam_id_str))
             continue
 
 
@@ -0,0 +1,104 @@
+""" Append-only stream of the output parameters of each dam.
+
+    The output parameters row of a dam is appended to
+    output_parameters.jsonl (one JSON object per line) as soon as the dam
+    completes the last stage of the critical path, so that the results of
+    completed dams can be used while the rest of the batch is running. Rows
+    of the dams that did not complete are appended once the analysis ends.
+    The csv and json results are built from this file.
+
+    A dam may have more than one row (e.g. after resuming a run); the last
+    row of a dam is its result. """
+import json
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Set
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+results_file_name = "output_parameters.jsonl"
+
+
+class ResultStream:
+    """Output parameters rows of a job, one JSON object per line.
+
+    Rows are appended from the worker threads running stage actions; each
+    append holds a lock and is flushed, so that readers only see whole
+    rows.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = Path(file_path)
+        self._lock = threading.Lock()
+
+    def append(self, rows: Iterable[dict]) -> int:
+        """Append rows (each with an id). Returns the number appended"""
+        lines = [json.dumps(row) + "\n" for row in rows]
+        if len(lines) == 0:
+            return 0
+        with self._lock:
+            with self.file_path.open("a", encoding="utf-8") as outfile:
+                outfile.writelines(lines)
+                outfile.flush()
+        return len(lines)
+
+    def _offsets(self) -> Dict[int, int]:
+        # Position in the file of the last row of each dam
+        offsets: Dict[int, int] = {}
+        if not self.file_path.exists():
+            return offsets
+        with self.file_path.open("rb") as infile:
+            offset = 0
+            for line in infile:
+                # Skip a partly written last line (e.g. the run was killed)
+                if line.endswith(b"\n"):
+                    try:
+                        offsets[int(json.loads(line)["id"])] = offset
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(
+                            f"[ResultStream] Skipping invalid line at {offset} in {self.file_path}"
+                        )
+                offset = offset + len(line)
+        return offsets
+
+    def dam_ids(self) -> Set[int]:
+        """Ids of the dams with a row"""
+        return set(self._offsets())
+
+    def rows(self) -> Iterator[dict]:
+        """Last row of each dam, in dam id order. Only the position of each
+        row is held in memory"""
+        offsets = self._offsets()
+        with self.file_path.open("rb") as infile:
+            for dam_id in sorted(offsets):
+                infile.seek(offsets[dam_id])
+                yield json.loads(infile.readline())
+
+    def pages(self, page_size: int = 1000) -> Iterator[List[dict]]:
+        """Rows (see rows) in lists of page_size rows"""
+        page = []
+        for row in self.rows():
+            page.append(row)
+            if len(page) == page_size:
+                yield page
+                page = []
+        if len(page) > 0:
+            yield page
@@ -0,0 +1,102 @@
+""" Retry policy for EE tasks that fail.
+
+    Some task failures are transient (e.g. "Computation timed out." or "Too
+    many concurrent aggregations.") and the same task succeeds when it is
+    submitted again later. Failures are classified from the task's error
+    message; retryable failures are resubmitted up to a maximum number of
+    attempts, after an exponentially growing delay with random jitter. Any
+    other failure is fatal and ends the analysis of the dam """
+import re
+import random
+import logging
+from typing import Callable, List
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+RETRYABLE = "retryable"
+FATAL = "fatal"
+
+# Error messages of transient failures (case insensitive)
+retryable_errors: List[str] = [
+    r"computation timed out",
+    r"too many concurrent",
+    r"internal error",
+    r"service unavailable",
+    r"deadline exceeded",
+    r"backend error",
+    r"rate limit",
+    # EE's rejection of throttled requests (HTTP 429)
+    r"too many requests",
+    r"request rate or concurrency limit",
+    # Per minute quotas clear after a backoff (daily and storage quotas do
+    # not, so other quota errors are fatal)
+    r"quota exceeded.*per (minute|second)",
+    r"please try again",
+    r"execution failed; out of resources",
+]
+
+
+def classify_error(error_message: str) -> str:
+    """Classify the error message of a failed task as RETRYABLE or FATAL"""
+    for pattern in retryable_errors:
+        if re.search(pattern, error_message or "", flags=re.IGNORECASE):
+            return RETRYABLE
+    return FATAL
+
+
+class RetryPolicy:
+    """When and after what delay a failed task is resubmitted.
+
+    Args:
+        max_attempts: maximum number of times a task is submitted (the first
+            submission included).
+        base_delay_s: delay before the first retry; doubled for each
+            further retry.
+        max_delay_s: upper bound of the delay (before jitter).
+        jitter: the delay is scaled by a random factor in
+            [1 - jitter, 1 + jitter] so that retries of tasks that failed
+            together are spread out.
+        random_uniform: callable returning a random number in [0, 1).
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 3,
+        base_delay_s: float = 60.0,
+        max_delay_s: float = 900.0,
+        jitter: float = 0.5,
+        random_uniform: Callable[[], float] = random.random,
+    ):
+        self.max_attempts = max_attempts
+        self.base_delay_s = base_delay_s
+        self.max_delay_s = max_delay_s
+        self.jitter = jitter
+        self.random_uniform = random_uniform
+
+    def should_retry(self, attempt: int, error_message: str) -> bool:
+        """Whether a task that failed on its attempt-th submission is
+        submitted again"""
+        return attempt < self.max_attempts and classify_error(error_message) == RETRYABLE
+
+    def delay(self, attempt: int) -> float:
+        """Seconds to wait before resubmitting a task that failed on its
+        attempt-th submission"""
+        delay_s = min(self.base_delay_s * 2 ** (attempt - 1), self.max_delay_s)
+        return delay_s * (1 - self.jitter + 2 * self.jitter * self.random_uniform())
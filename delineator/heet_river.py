@@ -1049,11 +1049,10 @@ def batch_delineate_rivers(c_dam_ids):
         # print ("[DEBUG] Processing", c_dam_id)
         c_dam_id_str = str(c_dam_id)
 
-        reservoirAssetName = cfg.ps_heet_folder + "/" + "R_" + c_dam_id_str
-        res_ftc = ee.FeatureCollection(reservoirAssetName)
+        # The dam's own asset or its rows of a batch table
+        res_ftc = heet_export.dam_output_ftc("R_", c_dam_id_str)
 
-        snappedAssetName = cfg.ps_heet_folder + "/" + "PS_" + c_dam_id_str
-        damFeat = ee.FeatureCollection(snappedAssetName)
+        damFeat = heet_export.dam_output_ftc("PS_", c_dam_id_str)
 
         riverVector, mainRiverVector = delineate_river(damFeat, res_ftc, c_dam_id_str)
 
@@ -1071,7 +1070,7 @@ def batch_delineate_rivers(c_dam_ids):
 
             except Exception as error:
                 logger.exception(f"{msg} {c_dam_id_str}")
-                mtr.active_analyses.remove(int(c_dam_id_str))
+                mtr.pipeline.fail(int(c_dam_id_str))
                 continue
 
         # ==========================================================================
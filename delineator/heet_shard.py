@@ -0,0 +1,247 @@
+""" Sharded execution of an analysis across several Earth Engine projects or
+    service accounts.
+
+    The number of batch tasks that can run at the same time is capped per EE
+    project. In sharding mode the input file is partitioned across the shards
+    listed in a shard configuration file, one heet_cli.py process is run per
+    shard and the results of all shards are merged into one output folder.
+
+    Shard configuration (toml):
+
+        [[shard]]
+        project = "ee-project-a"
+
+        [[shard]]
+        project = "ee-project-b"
+        service_account = "heet@ee-project-b.iam.gserviceaccount.com"
+        key_file = "keys/ee-project-b.json"
+"""
+import os
+import sys
+import json
+import logging
+import subprocess
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+import toml
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+
+# =============================================================================
+#  Configuration and partitioning
+# =============================================================================
+def load_shard_config(file_path: Path) -> List[dict]:
+    """Read the list of shards (EE project and optional service account
+    credentials) from a toml file"""
+    shards = toml.load(file_path).get("shard", [])
+    if len(shards) == 0:
+        raise ValueError(f"No [[shard]] entries found in {file_path}")
+    for shard in shards:
+        if "project" not in shard:
+            raise ValueError(f"Shard {shard} has no project")
+        if ("service_account" in shard) != ("key_file" in shard):
+            raise ValueError(
+                f"Shard {shard['project']} needs both a service_account and a key_file"
+            )
+    return shards
+
+
+def partition_inputs(df: pd.DataFrame, n_shards: int) -> List[pd.DataFrame]:
+    """Split the input table into at most n_shards contiguous parts whose
+    sizes differ by at most one row. No part is empty."""
+    n_parts = max(1, min(n_shards, df.shape[0]))
+    size, remainder = divmod(df.shape[0], n_parts)
+    parts = []
+    start = 0
+    for i in range(n_parts):
+        end = start + size + (1 if i < remainder else 0)
+        parts.append(df.iloc[start:end])
+        start = end
+    return parts
+
+
+def write_shard_inputs(
+    input_file_path: Path, n_shards: int, shard_inputs_path: Path
+) -> List[Path]:
+    """Partition the input file across shards and write an input file for
+    every shard. Values are copied verbatim (read as text)."""
+    df = pd.read_csv(input_file_path, dtype=str, keep_default_na=False)
+    shard_inputs_path.mkdir(parents=True, exist_ok=True)
+    input_paths = []
+    for index, part in enumerate(partition_inputs(df, n_shards), start=1):
+        shard_input_path = Path(shard_inputs_path, f"shard_{index}.csv")
+        part.to_csv(shard_input_path, index=False)
+        input_paths.append(shard_input_path)
+    return input_paths
+
+
+def shard_jobs(
+    shards: List[dict],
+    input_paths: List[Path],
+    jobname: str,
+    outputs: str,
+    output_folder_path: Path,
+) -> List[dict]:
+    """Describe the heet_cli.py job run for every shard with inputs. Each job
+    writes into its own sub folder of the output folder and works in its
+    own EE namespace (<jobname>-S<index>)"""
+    jobs = []
+    for index, (shard, input_path) in enumerate(zip(shards, input_paths), start=1):
+        output_dir = Path(output_folder_path, f"{output_folder_path.name}-S{index}")
+        env = {"HEET_LOG_FILE": str(Path(output_folder_path, f"heet-S{index}.log"))}
+        if "service_account" in shard:
+            env["HEET_SERVICE_ACCOUNT"] = shard["service_account"]
+            env["HEET_KEY_FILE"] = shard["key_file"]
+        jobs.append(
+            {
+                "index": index,
+                "project": shard["project"],
+                "input_path": input_path,
+                "jobname": jobname,
+                "outputs": outputs,
+                "output_dir": output_dir,
+                "env": env,
+            }
+        )
+    return jobs
+
+
+# =============================================================================
+#  Running shards
+# =============================================================================
+class SubprocessRunner:
+    """Runs every shard job as a separate heet_cli.py process. The runner
+    interface (start a job, wait for it and return its exit code) lets
+    the shards be driven by a local fake in tests."""
+
+    def __init__(self, cli_path: Optional[Path] = None, python: str = sys.executable):
+        if cli_path is None:
+            cli_path = Path(__file__).resolve().parents[1] / "heet_cli.py"
+        self.cli_path = cli_path
+        self.python = python
+
+    def command(self, job: dict) -> List[str]:
+        return [
+            self.python,
+            str(self.cli_path),
+            str(job["input_path"]),
+            job["project"],
+            job["jobname"],
+            job["outputs"],
+            "--output-dir",
+            str(job["output_dir"]),
+            "--shard",
+            str(job["index"]),
+        ]
+
+    def start(self, job: dict) -> subprocess.Popen:
+        # Shards run unattended; progress is reported in each shard's log
+        log_file = open(Path(job["output_dir"].parent, f"shard-S{job['index']}.out"), "w")
+        process = subprocess.Popen(
+            self.command(job),
+            env={**os.environ, **job["env"]},
+            stdin=subprocess.DEVNULL,
+            stdout=log_file,
+            stderr=subprocess.STDOUT,
+        )
+        process.log_file = log_file
+        return process
+
+    def wait(self, process: subprocess.Popen) -> int:
+        exit_code = process.wait()
+        process.log_file.close()
+        return exit_code
+
+
+def run_shards(jobs: List[dict], runner) -> Dict[int, int]:
+    """Start every shard job, then wait for all of them. Returns the exit
+    code of every shard"""
+    handles = {}
+    for job in jobs:
+        logger.info(
+            f"[run_shards] Starting shard {job['index']} ({job['project']}): {job['input_path']}"
+        )
+        handles[job["index"]] = runner.start(job)
+
+    exit_codes = {}
+    for index, handle in handles.items():
+        exit_codes[index] = runner.wait(handle)
+        logger.info(f"[run_shards] Shard {index} finished (exit code {exit_codes[index]})")
+    return exit_codes
+
+
+# =============================================================================
+#  Merging results
+# =============================================================================
+def merge_results(shard_folders: List[Path], output_folder_path: Path) -> List[str]:
+    """Merge output_parameters.csv, output_parameters.json and tasks.csv of
+    the shards into output_folder_path. Shards missing a file are skipped
+    (and logged). Returns the names of the files written"""
+    written = []
+
+    csv_parts = []
+    task_parts = []
+    json_output = {}
+    for index, shard_folder in enumerate(shard_folders, start=1):
+        csv_path = Path(shard_folder, "output_parameters.csv")
+        json_path = Path(shard_folder, "output_parameters.json")
+        tasks_path = Path(shard_folder, "tasks.csv")
+
+        if csv_path.exists():
+            csv_parts.append(pd.read_csv(csv_path, dtype=str, keep_default_na=False))
+        else:
+            logger.warning(f"[merge_results] {csv_path} not found")
+
+        if json_path.exists():
+            with json_path.open("r", encoding="utf-8") as infile:
+                json_output.update(json.load(infile))
+        else:
+            logger.warning(f"[merge_results] {json_path} not found")
+
+        if tasks_path.exists():
+            df_tasks = pd.read_csv(tasks_path, dtype=str, keep_default_na=False)
+            df_tasks["shard"] = index
+            task_parts.append(df_tasks)
+        else:
+            logger.warning(f"[merge_results] {tasks_path} not found")
+
+    if len(csv_parts) > 0:
+        df = pd.concat(csv_parts, ignore_index=True)
+        # Values are copied verbatim (read as text), ids are sorted as numbers
+        if "id" in df.columns:
+            df = df.sort_values("id", kind="stable", key=lambda ids: pd.to_numeric(ids))
+        df.to_csv(Path(output_folder_path, "output_parameters.csv"), index=False)
+        written.append("output_parameters.csv")
+
+    if len(json_output) > 0:
+        output_file_path = Path(output_folder_path, "output_parameters.json")
+        with output_file_path.open("w", encoding="utf-8") as outfile:
+            outfile.write(json.dumps(json_output, indent=4))
+        written.append("output_parameters.json")
+
+    if len(task_parts) > 0:
+        df_tasks = pd.concat(task_parts, ignore_index=True)
+        df_tasks.to_csv(Path(output_folder_path, "tasks.csv"), index=False)
+        written.append("tasks.csv")
+
+    return written
@@ -1,6 +1,7 @@
 """ Functions for snapping dams (point features) to the nearest river
     segment """
 import ee
+import math
 import logging
 
 
@@ -82,14 +83,8 @@ def snap_pt_to_line(P, A, B):
     # Vector from point A to point P
     AP = ee.Array(P).subtract(A)
 
-    # Generic implementations of point to line
-    # projection will check that
-    # the start and end points of the line are not
-    # equal (omitted we never expect to see this in
-    # HydroBASINS data)
-
     # Squared distance from point A to point B
-    AB_squared = ee.Array(AB).dotProduct(AB)
+    AB_squared = ee.Number(ee.Array(AB).dotProduct(AB))
 
     t = ee.Array(AP).dotProduct(AB).divide(AB_squared)
 
@@ -97,7 +92,18 @@ def snap_pt_to_line(P, A, B):
 
     s = ee.Algorithms.If(t.gte(0).And(t.lte(1)), q, ee.Algorithms.If(t.lt(0), A, B))
 
-    return s
+    # A and B are equal for the repeated vertices found in HydroRIVERS
+    # reaches; the segment is then the point A (t, a division by zero, is
+    # not evaluated)
+    return ee.Algorithms.If(AB_squared.eq(0), A, s)
+
+
+def reaches_in_search_area(pt: ee.Geometry.Point) -> ee.FeatureCollection:
+    """HYDRORIVERS river reaches within the search radius of a point"""
+    # Define search area
+    pt_ftc = ee.FeatureCollection([ee.Feature(pt)])
+    search_area = pt_ftc.map(buffer_points_bounds).geometry()
+    return dta.HYDRORIVERS.filterBounds(search_area)
 
 
 def jensen_snap_hydroriver(dam_feature: ee.Feature) -> ee.Feature:
@@ -107,43 +113,46 @@ def jensen_snap_hydroriver(dam_feature: ee.Feature) -> ee.Feature:
     dam_feature = ee.Feature(dam_feature)
     # Define EE Point geometry with long and latitude values
     pt = dam_feature.geometry()
-    # Define search area
-    pt_ftc = ee.FeatureCollection([ee.Feature(pt)])
-    search_area = pt_ftc.map(buffer_points_bounds).geometry()
     # Identify all river reaches within search area
     # Measure their distance to unsnapped pt
-    r_ftc = dta.HYDRORIVERS.filterBounds(search_area).map(
+    r_ftc = reaches_in_search_area(pt).map(
         lambda feat: feat.set("dist", feat.distance(pt, 1))
     )
     # Identify closet river reach within search radius
     # Keyword arguments don't work with limit in python
     r_closest = r_ftc.limit(1, "dist", True)
 
-    # Get length of closest river segment
-    section_length = r_closest.geometry().length()
-    section_length_10 = ee.Number(section_length).divide(10).floor().multiply(10)
+    # Project the dam onto each segment of the closest river reach. Longitudes
+    # are scaled by the cosine of the dam's latitude so that the projection
+    # is made in (approximately) equal distance units
+    river_geometry = ee.Feature(r_closest.first()).geometry()
+    lon_scale = ee.Number(pt.coordinates().get(1)).multiply(math.pi / 180).cos()
 
-    # Break the closet river segment into a set of points at approx 5m intervals
-    step = ee.Number(5)
-    distances = ee.List.sequence(0, section_length_10, step)
-    river_line_string = r_closest.geometry().cutLines(
-        **{"distances": distances, "maxError": 1}
-    )
+    def to_scaled(coords):
+        coords = ee.List(coords)
+        return ee.List([ee.Number(coords.get(0)).multiply(lon_scale), coords.get(1)])
 
-    def line_to_pts(line):
-        return ee.List(line).map(
-            lambda e: ee.Feature(
-                ee.Geometry.Point(
-                    ee.Number(ee.List(e).get(0)), ee.Number(ee.List(e).get(1))
-                )
-            )
-        )
+    def from_scaled(coords):
+        coords = ee.Array(coords).toList()
+        return ee.List([ee.Number(coords.get(0)).divide(lon_scale), coords.get(1)])
 
-    river_vertices = ee.List(river_line_string.coordinates())
-    point_features = river_vertices.map(line_to_pts).flatten()
+    P = to_scaled(pt.coordinates())
 
-    # Identify closest candidate point to dam
-    candidate_points = ee.FeatureCollection(point_features).map(
+    def line_to_segments(line, segments):
+        vertices = ee.Geometry(line).coordinates().map(to_scaled)
+        return ee.List(segments).cat(vertices.slice(0, -1).zip(vertices.slice(1)))
+
+    segments = ee.List(
+        river_geometry.geometries().iterate(line_to_segments, ee.List([]))
+    )
+
+    def segment_to_pt(segment):
+        A = ee.List(segment).get(0)
+        B = ee.List(segment).get(1)
+        return ee.Feature(ee.Geometry.Point(from_scaled(snap_pt_to_line(P, A, B))))
+
+    # Identify closest candidate point to dam (one per segment)
+    candidate_points = ee.FeatureCollection(segments.map(segment_to_pt)).map(
         lambda feat: feat.set("tdist", feat.distance(pt, 1))
     )
 
@@ -168,6 +177,28 @@ def jensen_snap_hydroriver(dam_feature: ee.Feature) -> ee.Feature:
     return feature
 
 
+def batch_snap_hydroriver(dams_ftc: ee.FeatureCollection) -> ee.FeatureCollection:
+    """Snaps all the dams of a collection to the nearest river segment in
+    HYDRORIVERS in one server-side pass (see jensen_snap_hydroriver).
+
+    A dam with no river reach within the search radius cannot be snapped;
+    it is kept at its raw location with snap_failed set to 1 (snap_failed is
+    0 for snapped dams) so that it does not fail the whole collection"""
+
+    def snap_dam(dam_feature):
+        dam_feature = ee.Feature(dam_feature)
+        n_reaches = reaches_in_search_area(dam_feature.geometry()).size()
+        return ee.Feature(
+            ee.Algorithms.If(
+                n_reaches.gt(0),
+                jensen_snap_hydroriver(dam_feature).set("snap_failed", 0),
+                dam_feature.set("snap_failed", 1),
+            )
+        )
+
+    return ee.FeatureCollection(dams_ftc).map(snap_dam)
+
+
 if __name__ == "__main__":
 
     # Development
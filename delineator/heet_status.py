@@ -0,0 +1,112 @@
+""" Bulk look-up of Earth Engine task statuses. A single (paginated) listing
+    of operations is made per poll cycle and every status query made during
+    that cycle is answered from the resulting snapshot """
+import re
+import logging
+from typing import Callable, Dict, List, Optional
+
+import ee
+from ee import _cloud_api_utils
+
+try:
+    from delineator import heet_log as lg
+except ModuleNotFoundError:
+    import heet_log as lg
+
+# =============================================================================
+#  Set up logger
+# =============================================================================
+# Gets or creates a logger
+logger = logging.getLogger(__name__)
+# set log level
+logger.setLevel(logging.DEBUG)
+# define file handler and set formatter
+file_handler = logging.FileHandler(lg.log_file_name)
+formatter = logging.Formatter("%(asctime)s : %(levelname)s : %(name)s : %(message)s")
+file_handler.setFormatter(formatter)
+# add file handler to logger
+logger.addHandler(file_handler)
+
+# Task states (as reported by ee.batch.Task.status()) of finished tasks
+FINISHED_STATES = ["COMPLETED", "CANCELLED", "FAILED"]
+
+
+# =============================================================================
+#  Snapshots
+# =============================================================================
+
+
+class TaskStatusSnapshot:
+    """Statuses of all tasks returned by one listing of EE operations,
+    indexed by task id.
+
+    Statuses are stored in the format returned by ee.batch.Task.status() so
+    that lookups can be used as a drop-in replacement for per-task calls.
+    """
+
+    def __init__(self, operations: List[dict]):
+        self.statuses: Dict[str, dict] = {}
+        for operation in operations:
+            task_status = _cloud_api_utils.convert_operation_to_task(operation)
+            self.statuses[task_status["id"]] = task_status
+
+    def __len__(self) -> int:
+        return len(self.statuses)
+
+    def status(self, task) -> dict:
+        """Status of a task (ee.batch.Task or task id) in the snapshot.
+        Tasks not (yet) listed by EE are reported with state UNKNOWN"""
+        task_id = task if isinstance(task, str) else getattr(task, "id", None)
+        if task_id is None:
+            return {"state": "UNSUBMITTED"}
+        return self.statuses.get(task_id, {"state": "UNKNOWN"})
+
+    def state(self, task) -> str:
+        """State of a task (ee.batch.Task or task id) in the snapshot"""
+        return self.status(task)["state"]
+
+    def active(self, description_pattern: Optional[str] = None) -> List[dict]:
+        """Statuses of unfinished tasks, optionally restricted to tasks with
+        a description matching description_pattern"""
+        return [
+            s
+            for s in self.statuses.values()
+            if (s["state"] not in FINISHED_STATES)
+            and (
+                description_pattern is None
+                or re.match(description_pattern, s.get("description", ""))
+            )
+        ]
+
+
+def description_pattern(task_prefix: str) -> str:
+    """Regular expression matching the descriptions of the tasks submitted
+    with task_prefix (e.g. XHEET-JOB01-X002-12 Snapped dam locations ...)"""
+    return "^" + re.escape(task_prefix) + r"\d\d\d-\d+"
+
+
+class TaskStatusMonitor:
+    """Takes task status snapshots; one operations listing per refresh.
+
+    Args:
+        list_operations: callable returning a list of EE operations. Defaults
+            to ee.data.listOperations (which pages through all operations).
+    """
+
+    def __init__(self, list_operations: Optional[Callable[[], List[dict]]] = None):
+        self.list_operations = list_operations
+        self.snapshot = TaskStatusSnapshot([])
+        self.refresh_count = 0
+
+    def refresh(self) -> TaskStatusSnapshot:
+        """List operations once and replace the current snapshot"""
+        if self.list_operations is None:
+            operations = ee.data.listOperations()
+        else:
+            operations = self.list_operations()
+        self.refresh_count = self.refresh_count + 1
+        self.snapshot = TaskStatusSnapshot(operations)
+        logger.debug(
+            f"[TaskStatusMonitor] Snapshot {self.refresh_count}: {len(self.snapshot)} operations"
+        )
+        return self.snapshot
@@ -3,7 +3,11 @@ import ee
 from typing import Optional
 import re
 import sys
+import time
+import asyncio
+import queue
 import logging
+import functools
 import pandas as pd
 from pathlib import Path
 
@@ -20,6 +24,13 @@ try:
     from delineator import heet_reservoir as heet_res
     from delineator import heet_params
     from delineator import heet_river
+    from delineator import heet_pipeline
+    from delineator import heet_status
+    from delineator import heet_assets
+    from delineator import heet_asset_ops
+    from delineator import heet_journal
+    from delineator import heet_retry
+    from delineator import heet_orchestrator
     from delineator import heet_log as lg
 
 except ModuleNotFoundError:
@@ -35,6 +46,13 @@ except ModuleNotFoundError:
     import heet_reservoir as heet_res
     import heet_params
     import heet_river
+    import heet_pipeline
+    import heet_status
+    import heet_assets
+    import heet_asset_ops
+    import heet_journal
+    import heet_retry
+    import heet_orchestrator
     import heet_log as lg
 
 # Gets or creates a logger
@@ -55,13 +73,116 @@ logger.addHandler(file_handler)
 # Polling functions
 # ==============================================================================
 
+# Intervals between polls adapt to the observed task durations (see heet_poll)
+mtr.poll_schedule.min_step_s = cfg.poll_min_step_s
+mtr.poll_schedule.max_step_s = cfg.poll_max_step_s
+
+# Asset calls run on a bounded pool of worker threads (see heet_asset_ops)
+mtr.asset_ops.max_workers = cfg.max_asset_workers
+
+
+def adaptive_poll(timeout, loop_name):
+    """Like polling2.poll_decorator, but waits the interval chosen by the
+    poll schedule after each poll. Raises polling2.TimeoutException after
+    timeout seconds"""
+
+    def decorator(target):
+        @functools.wraps(target)
+        def wrapper(*args, **kwargs):
+            end_time = time.time() + timeout
+            values = queue.Queue()
+            while True:
+                mtr.poll_schedule.record_poll(loop_name)
+                value = target(*args, **kwargs)
+                if value:
+                    return value
+                values.put(value)
+
+                step = mtr.poll_schedule.next_step(mtr.submission_queue.next_ready_in())
+                if time.time() >= end_time:
+                    raise polling2.TimeoutException(values, value)
+                time.sleep(min(step, max(end_time - time.time(), 0)))
+
+        return wrapper
+
+    return decorator
+
+
 # Wait a maximum of 30 minutes (1800)
-@poll_decorator(step=5, timeout=1800)
+@adaptive_poll(timeout=1800, loop_name="upload")
+def wait_until_uploads(upload_tasks):
+    # Wait until all chunks of the user inputs are uploaded
+    statuses = []
+    for upload_task in upload_tasks:
+        try:
+            statuses.append(upload_task.status())
+        except Exception:
+            return False
+    mtr.poll_schedule.update([("user_inputs", status) for status in statuses])
+    return all(s["state"] in ["COMPLETED", "FAILED", "CANCELLED"] for s in statuses)
+
+
+def upload_user_inputs(inputs_ftcs):
+    """Upload the user inputs (a list of FeatureCollections, see
+    heet_export.df_to_ee_chunks) to the user_inputs table. Chunks are
+    uploaded side by side and merged on the server, after which the chunks
+    are deleted. Raises RuntimeError if an upload or the merge fails. Returns the task writing the user_inputs table"""
+    if len(inputs_ftcs) == 1:
+        return heet_export.upload_user_inputs(inputs_ftcs[0])
+
+    part_tasks = [
+        heet_export.upload_user_inputs(inputs_ftc, part)
+        for part, inputs_ftc in enumerate(inputs_ftcs, start=1)
+    ]
+    wait_until_uploads(part_tasks)
+    failed_parts = [
+        part for part, task in enumerate(part_tasks, start=1)
+        if task.status()["state"] != "COMPLETED"
+    ]
+    if len(failed_parts) > 0:
+        raise RuntimeError(f"Upload of user inputs parts {failed_parts} failed")
+
+    upload_task = heet_export.merge_user_inputs(len(part_tasks))
+    wait_until_upload(upload_task)
+    # The parts are kept (for a new attempt) unless the merge completed
+    merge_state = upload_task.status()["state"]
+    if merge_state != "COMPLETED":
+        raise RuntimeError(f"Merge of user inputs parts ended {merge_state}")
+
+    heet_asset_ops.raise_failures(
+        mtr.asset_ops.delete(
+            [
+                cfg.ps_heet_folder + "/" + heet_export.user_inputs_part_name(part)
+                for part in range(1, len(part_tasks) + 1)
+            ]
+        )
+    )
+    return upload_task
+
+
+def observe_tasks(snapshot, task_codes=None):
+    # Pass the statuses of the job's tasks to the poll schedule
+    # (only unfinished tasks of task_codes are waited for)
+    # (a snapshot of the logs: stage actions add tasks from worker threads)
+    task_logs = dict(mtr.all_tasks_log)
+    task_logs["drive_export"] = mtr.all_export_tasks_log
+    statuses = [
+        (task_code, snapshot.status(task))
+        for task_code, task in mtr.logged_tasks(task_logs)
+        if getattr(task, "id", None) is not None
+    ]
+    mtr.poll_schedule.update(statuses, task_codes)
+
+
+# Wait a maximum of 30 minutes (1800)
+@adaptive_poll(timeout=1800, loop_name="upload")
 def wait_until_upload(upload_task):
 
     keep_waiting = True
     try:
-        status = upload_task.status()["state"] in ["COMPLETED", "FAILED", "CANCELLED"]
+        task_status = upload_task.status()
+        status = task_status["state"] in ["COMPLETED", "FAILED", "CANCELLED"]
+        mtr.poll_schedule.update([("user_inputs", task_status)])
     except:
         pass
     else:
@@ -72,37 +193,26 @@ def wait_until_upload(upload_task):
 
 
 # Wait a maximum of 90 minutes (5400)
-@poll_decorator(step=5, timeout=5400)
+@adaptive_poll(timeout=5400, loop_name="jobs_finish")
 def wait_until_jobs_finish():
 
     try:
-        status = existing_tasks_running()
+        snapshot = mtr.status_monitor.refresh()
+        running_heet_jobs = snapshot.active(
+            heet_status.description_pattern(cfg.task_prefix)
+        )
+        # Queued tasks have not finished either
+        status = (len(running_heet_jobs) > 0) or (len(mtr.submission_queue) > 0)
+        observe_tasks(snapshot)
+        submit_queued_tasks(snapshot)
     except:
         status = True
 
     return status == False
 
 
-# Wait a maximum of 90 minutes (5400)
-@poll_decorator(step=5, timeout=5400)
-def wait_until_new_results():
-
-    keep_waiting = True
-
-    new_results_count = log_new_results()
-    active_analysis_count = len(mtr.active_analyses)
-
-    if new_results_count != 0:
-        keep_waiting = False
-
-    if active_analysis_count == 0:
-        keep_waiting = False
-
-    return keep_waiting == False
-
-
 # Wait a maximum of 30 minutes (1800)
-@poll_decorator(step=5, timeout=1800)
+@adaptive_poll(timeout=1800, loop_name="exports")
 def wait_until_exports():
 
     try:
@@ -136,229 +246,196 @@ def robust_task_start(task):
 # ==============================================================================
 
 
-def find_child_assets(search_list: list) -> list:
-    """Find assets on Earth Engine"""
-    search_list = [a for a in search_list if a["type"] in ["FOLDER", "IMAGECOLLECTION"]]
-
-    new_asset_collection = []
-    search_next = []
-
-    for target_asset in search_list:
-        found = ee.data.listAssets({"parent": target_asset["name"]})
-        if "assets" in found:
-            new_asset_collection.extend(found["assets"])
-            search_next.extend(found["assets"])
-    return search_next, new_asset_collection
-
-
-def find_assets(search_list: list, asset_collection: list) -> list:
-    """Find assets on Earth Engine"""
-    search_next, new_asset_collection = find_child_assets(search_list)
-    asset_collection.extend(new_asset_collection)
-
-    while len(search_next) > 0:
-        search_next, new_asset_collection = find_child_assets(search_next)
-        asset_collection.extend(new_asset_collection)
+def clear_tmp_folder(remove_folder=False):
+    # Delete the temporary assets of the job (and, if remove_folder,
+    # the job's folder itself)
+    # (children before their parents, concurrently; see heet_asset_ops)
+    n_deleted = mtr.asset_ops.delete_tree(cfg.ps_heet_folder, remove_folder=remove_folder)
+    logger.info(f"[clear_tmp_folder] Deleted {n_deleted} items in {cfg.ps_heet_folder}")
+
+
+# Input fields not copied to the output parameters
+output_drop_fields = [
+    "t_fsl_masl",
+    "t_dam_height",
+    "t_turbine_efficiency",
+    "t_power_capacity",
+    "t_plant_depth",
+    "outlet_subcatch_id",
+    "CATCH_SKM",
+    "DIST_DN_KM",
+    "DIST_UP_KM",
+    "DIS_AV_CMS",
+    "ENDORHEIC",
+    "HYBAS_L12",
+    "HYRIV_ID",
+    "LENGTH_KM",
+    "MAIN_RIV",
+    "NEXT_DOWN",
+    "ORD_CLAS",
+    "ORD_FLOW",
+    "ORD_STRA",
+    "UPLAND_SKM",
+    "iolet",
+    "is_sink",
+    "is_source",
+]
+
+
+def dam_output_feature(dams_ftc, asset_index, c_dam_id):
+    """Output parameters of a dam (ee.Feature) from its inputs and the
+    profiled outputs in asset_index (see heet_assets.index_assets)"""
+
+    # Empty profiles of the outputs in heet_assets.profiled_output_prefixes
+    empty_profiles = [
+        heet_params.profile_empty_point,
+        heet_params.profile_empty_catchment,
+        heet_params.profile_empty_reservoir,
+        heet_params.profile_empty_nicatchment,
+        heet_params.profile_empty_river,
+    ]
 
-    return asset_collection
+    dam_feat = dams_ftc.filter(ee.Filter.inList("id", ee.List([c_dam_id])))
+    input_feat = dam_feat.first()
 
+    # Properties from feature (inputted parameters)
+    output_feat = input_feat.copyProperties(input_feat, None, output_drop_fields)
 
-def clear_tmp_folder():
-    heet_assets = ee.data.listAssets({"parent": cfg.ps_heet_folder})
-    asset_collection = heet_assets["assets"]
-    logger.info(
-        f"[clear_tmp_folder] Found {str(len(asset_collection))} items in {cfg.ps_heet_folder}"
-    )
+    status = heet_assets.dam_error_code(asset_index, c_dam_id)
+    n_profiled = len(heet_assets.profiled_output_prefixes) if status == 0 else status - 1
 
-    if len(asset_collection) > 0:
-        assets_to_delete = find_assets(heet_assets["assets"], asset_collection)
-        assets_to_delete.reverse()
+    if n_profiled > 0:
+        snapped_ftc = heet_export.indexed_ftc(asset_index["PS_"][c_dam_id], c_dam_id)
+        input_geom = snapped_ftc.geometry()
+    else:
+        # Use raw dam location if snap failed
+        input_geom = input_feat.geometry()
+
+    # Copy properties from the profiled outputs.
+    # We use first to access collection level properties that have been
+    # duplicated over all features.
+    for fileprefix in heet_assets.profiled_output_prefixes[:n_profiled]:
+        output_ftc = heet_export.indexed_ftc(asset_index[fileprefix][c_dam_id], c_dam_id)
+        output_feat = output_feat.copyProperties(output_ftc.first())
+
+    # Empty profiles of the missing outputs
+    for profile_empty in empty_profiles[n_profiled:]:
+        output_feat = output_feat.set(profile_empty())
+
+    output_feat = ee.Feature(output_feat).setGeometry(input_geom)
+    output_feat = output_feat.set("error_code", ee.Number(status))
+    return output_feat
+
+
+def stream_results(output_feats):
+    # Download the properties of output parameters features and append
+    # them to the job's result stream (if any). Returns the number of rows
+    if mtr.results is None or len(output_feats) == 0:
+        return 0
+    n_rows = 0
+    for rows in heet_export.iter_ftc_pages(ee.FeatureCollection(output_feats)):
+        n_rows = n_rows + mtr.results.append(rows)
+    return n_rows
+
+
+def stream_completed_dams(c_dam_ids):
+    """Append the output parameters of dams that have completed the critical
+    path to the result stream. Their profiled outputs all exist, so their
+    asset names are known without listing the job's folder"""
+    if mtr.results is None:
+        return
+    asset_index = {
+        fileprefix: {
+            c_dam_id: mtr.batch_outputs.get(fileprefix, {}).get(
+                int(c_dam_id), {"id": cfg.ps_heet_folder + "/" + fileprefix + str(c_dam_id)}
+            )
+            for c_dam_id in c_dam_ids
+        }
+        for fileprefix in heet_assets.profiled_output_prefixes
+    }
+    dams_ftc = ee.FeatureCollection(cfg.dams_table_path)
+    try:
+        stream_results(
+            [dam_output_feature(dams_ftc, asset_index, c_dam_id) for c_dam_id in c_dam_ids]
+        )
+    except Exception:
+        # The rows are appended when the analysis ends instead
+        logger.exception(f"[stream_completed_dams] Problem streaming results of dams {c_dam_ids}")
+
+
+def index_job_assets():
+    """Index the assets of the job's folder by file prefix and dam id (see
+    heet_assets.index_assets). The dams of each batch table are read from
+    its rows; batch tables are also recorded in mtr.batch_outputs"""
+    found_assets = ee.data.listAssets({"parent": cfg.ps_heet_folder})["assets"]
+    asset_index = heet_assets.index_assets(found_assets)
+
+    for asset in found_assets:
+        parsed = heet_assets.parse_batch_asset_name(asset.get("name", asset.get("id", "")))
+        if parsed is None:
+            continue
+        fileprefix = parsed[0]
+        dam_ids = (
+            ee.FeatureCollection(heet_assets.asset_id(asset))
+            .aggregate_array("id")
+            .distinct()
+            .getInfo()
+        )
+        heet_assets.add_batch_asset(asset_index, fileprefix, asset, dam_ids)
+        heet_assets.add_batch_asset(mtr.batch_outputs, fileprefix, asset, dam_ids)
 
-        for target_asset in assets_to_delete:
-            ee.data.deleteAsset(target_asset["name"])
-            logger.info(f"[clear_tmp_folder] Deleting {target_asset['name']}")
+    return asset_index
 
 
 def assets_to_ftc():
 
-    heet_assets = ee.data.listAssets({"parent": cfg.ps_heet_folder})
-    asset_collection = heet_assets["assets"]
+    # The job's assets are listed once and indexed by file prefix and dam
+    # id; the error code and empty profiles of each dam are decided locally
+    asset_index = index_job_assets()
 
     dams_ftc = ee.FeatureCollection(cfg.dams_table_path)
 
     c_dam_ids = dams_ftc.aggregate_array("id").getInfo()
 
-    output_list = ee.List([])
-    for c_dam_id in c_dam_ids:
-
-        dam_feat = ee.FeatureCollection(cfg.dams_table_path).filter(
-            ee.Filter.inList("id", ee.List([c_dam_id]))
-        )
-
-        c_dam_id_str = str(c_dam_id)
-
-        c_search_term = ".*/C_" + c_dam_id_str + "$"
-        p_search_term = ".*/PS_" + c_dam_id_str + "$"
-        r_search_term = ".*/R_" + c_dam_id_str + "$"
-        n_search_term = ".*/N_" + c_dam_id_str + "$"
-        s_search_term = ".*/MS_" + c_dam_id_str + "$"
-
-        snapped_assets_list = ee.List(
-            [
-                ee.FeatureCollection(x["id"])
-                for x in asset_collection
-                if re.search(p_search_term, x["name"])
-            ]
-        )
-
-        catchment_assets_list = ee.List(
-            [
-                ee.FeatureCollection(x["id"])
-                for x in asset_collection
-                if re.search(c_search_term, x["name"])
-            ]
-        )
-
-        reservoir_assets_list = ee.List(
-            [
-                ee.FeatureCollection(x["id"])
-                for x in asset_collection
-                if re.search(r_search_term, x["name"])
-            ]
-        )
-
-        nicatchment_assets_list = ee.List(
-            [
-                ee.FeatureCollection(x["id"])
-                for x in asset_collection
-                if re.search(n_search_term, x["name"])
-            ]
-        )
-
-        river_assets_list = ee.List(
-            [
-                ee.FeatureCollection(x["id"])
-                for x in asset_collection
-                if re.search(s_search_term, x["name"])
-            ]
-        )
+    output_feats = [
+        dam_output_feature(dams_ftc, asset_index, c_dam_id) for c_dam_id in c_dam_ids
+    ]
 
-        input_feat = dam_feat.first()
-        output_feat = ee.Feature(None)
-
-        drop_fields = [
-            "t_fsl_masl",
-            "t_dam_height",
-            "t_turbine_efficiency",
-            "t_power_capacity",
-            "t_plant_depth",
-            "outlet_subcatch_id",
-            "CATCH_SKM",
-            "DIST_DN_KM",
-            "DIST_UP_KM",
-            "DIS_AV_CMS",
-            "ENDORHEIC",
-            "HYBAS_L12",
-            "HYRIV_ID",
-            "LENGTH_KM",
-            "MAIN_RIV",
-            "NEXT_DOWN",
-            "ORD_CLAS",
-            "ORD_FLOW",
-            "ORD_STRA",
-            "UPLAND_SKM",
-            "iolet",
-            "is_sink",
-            "is_source",
-        ]
-
-        # Properties from feature (inputted parameters)
-        output_feat = input_feat.copyProperties(input_feat, None, drop_fields)
-
-        status = 0
-        if snapped_assets_list.length().getInfo() > 0:
-            input_geom = ee.FeatureCollection(snapped_assets_list.get(0)).geometry()
-            output_feat = output_feat.copyProperties(
-                ee.FeatureCollection(snapped_assets_list.get(0)).first()
+    # Rows of the dams not streamed as they completed (failed dams, or
+    # dams whose row could not be streamed)
+    if mtr.results is not None:
+        streamed_dam_ids = mtr.results.dam_ids()
+        try:
+            stream_results(
+                [
+                    output_feat
+                    for c_dam_id, output_feat in zip(c_dam_ids, output_feats)
+                    if int(c_dam_id) not in streamed_dam_ids
+                ]
             )
-            # Copy properties from feature collections
-            # We use first to access collection level properties that have been duplicated over
-            # all features.
-            if catchment_assets_list.length().getInfo() > 0:
-                output_feat = output_feat.copyProperties(
-                    ee.FeatureCollection(catchment_assets_list.get(0)).first()
-                )
-
-                if reservoir_assets_list.length().getInfo() > 0:
-                    output_feat = output_feat.copyProperties(
-                        ee.FeatureCollection(reservoir_assets_list.get(0)).first()
-                    )
-
-                    if nicatchment_assets_list.length().getInfo() > 0:
-                        output_feat = output_feat.copyProperties(
-                            ee.FeatureCollection(nicatchment_assets_list.get(0)).first()
-                        )
-
-                        if river_assets_list.length().getInfo() > 0:
-                            output_feat = output_feat.copyProperties(
-                                ee.FeatureCollection(river_assets_list.get(0)).first()
-                            )
-                        else:
-                            output_feat = output_feat.set(
-                                heet_params.profile_empty_river()
-                            )
-                            status = 5
-                    else:
-                        output_feat = output_feat.set(
-                            heet_params.profile_empty_nicatchment()
-                        )
-                        output_feat = output_feat.set(heet_params.profile_empty_river())
-                        status = 4
-                else:
-                    output_feat = output_feat.set(heet_params.profile_empty_reservoir())
-                    output_feat = output_feat.set(
-                        heet_params.profile_empty_nicatchment()
-                    )
-                    output_feat = output_feat.set(heet_params.profile_empty_river())
-                    status = 3
-            else:
-                output_feat = output_feat.set(heet_params.profile_empty_catchment())
-                output_feat = output_feat.set(heet_params.profile_empty_reservoir())
-                output_feat = output_feat.set(heet_params.profile_empty_nicatchment())
-                output_feat = output_feat.set(heet_params.profile_empty_river())
-                status = 2
-
-        else:
-            # Use raw dam location if snap failed
-            input_geom = dam_feat.first().geometry()
-            output_feat = output_feat.set(heet_params.profile_empty_point())
-            output_feat = output_feat.set(heet_params.profile_empty_catchment())
-            output_feat = output_feat.set(heet_params.profile_empty_reservoir())
-            output_feat = output_feat.set(heet_params.profile_empty_nicatchment())
-            output_feat = output_feat.set(heet_params.profile_empty_river())
-            status = 1
-
-        output_feat = ee.Feature(output_feat).setGeometry(input_geom)
-        output_feat = output_feat.set("error_code", ee.Number(status))
-        output_list = ee.List(output_list).add(output_feat)
+        except Exception:
+            logger.exception("[assets_to_ftc] Problem streaming results of remaining dams")
 
-    output_assets_ftc = ee.FeatureCollection(output_list)
+    # A flat list of features (rather than a chain of ee.List.add calls)
+    # keeps the depth of the computation graph constant
+    output_assets_ftc = ee.FeatureCollection(output_feats)
 
     heet_export.export_ftc(output_assets_ftc, "0", "output_parameters")
 
 
-def export_to_drive(export_from_path: str=cfg.ps_heet_folder) -> Optional[bool]:
-    """ """
+def export_to_drive(export_from_path: Optional[str] = None) -> Optional[bool]:
+    """Export the assets of export_from_path (by default the job's folder of
+    temporary assets) to Google Drive"""
+    if export_from_path is None:
+        export_from_path = cfg.ps_heet_folder
     try:
-        heet_assets = ee.data.listAssets(export_from_path)
-        asset_collection = heet_assets["assets"]
+        assets_to_export = mtr.asset_ops.list_tree(export_from_path)
         # TODO: Add information if export_from_path is not correct and no assets can be found
         logger.info(
-            f"[export_to_drive] Found {str(len(asset_collection))} items in {export_from_path}"
+            f"[export_to_drive] Found {str(len(assets_to_export))} items in {export_from_path}"
         )
 
-        if len(asset_collection) > 0:
-            assets_to_export = find_assets(heet_assets["assets"], asset_collection)
+        if len(assets_to_export) > 0:
             assets_to_export.reverse()
 
             for target_asset in assets_to_export:
@@ -387,20 +464,16 @@ def export_to_assets():
         return False
 
     try:
-        heet_assets = ee.data.listAssets({"parent": cfg.ps_heet_folder})
-        asset_collection = heet_assets["assets"]
-
-        if len(asset_collection) > 0:
-            assets_to_rename = find_assets(heet_assets["assets"], asset_collection)
-            assets_to_rename.reverse()
-
-            for target_asset in assets_to_rename:
-                asset_name = target_asset["name"]
-                new_asset_name = re.sub(
-                    cfg.ps_heet_folder, target_asset_folder, asset_name
-                )
+        # Assets are renamed concurrently, children before their parents
+        renames = []
+        for target_asset in mtr.asset_ops.list_tree(cfg.ps_heet_folder):
+            asset_name = target_asset["name"]
+            new_asset_name = asset_name.replace(
+                cfg.ps_heet_folder, target_asset_folder, 1
+            )
+            renames.append((asset_name, new_asset_name))
 
-                ee.data.renameAsset(asset_name, new_asset_name)
+        heet_asset_ops.raise_failures(mtr.asset_ops.rename(renames))
         return True
 
     except Exception as error:
@@ -427,17 +500,16 @@ def prepare_gee_assets_folder():
 
 def kill_all_heet_tasks():
 
-    # Finished operations can be SUCCEEDED, CANCELLED, FAILED
-    task_list = ee.data.listOperations()
+    # Tasks waiting to be submitted are dropped
+    n_dropped = mtr.submission_queue.clear()
+    logger.info(f"[kill_all_heet_tasks] Dropped {n_dropped} queued tasks")
 
-    running_heet_jobs = [
-        t
-        for t in task_list
-        if (
-            (t["metadata"]["state"] not in ["SUCCEEDED", "CANCELLED", "FAILED"])
-            and (re.match("^XHEET-X\d\d\d-\d+", t["metadata"]["description"]))
-        )
-    ]
+    # Finished tasks can be COMPLETED, CANCELLED, FAILED
+    snapshot = mtr.status_monitor.refresh()
+
+    running_heet_jobs = snapshot.active(
+        heet_status.description_pattern(cfg.task_prefix)
+    )
 
     for heet_job in running_heet_jobs:
         ee.data.cancelOperation(heet_job["name"])
@@ -445,16 +517,11 @@ def kill_all_heet_tasks():
 
 def existing_tasks_running():
 
-    task_list = ee.data.listOperations()
+    snapshot = mtr.status_monitor.refresh()
 
-    running_heet_jobs = [
-        t
-        for t in task_list
-        if (
-            (t["metadata"]["state"] not in ["SUCCEEDED", "CANCELLED", "FAILED"])
-            and (re.match("^XHEET-X\d\d\d-\d+", t["metadata"]["description"]))
-        )
-    ]
+    running_heet_jobs = snapshot.active(
+        heet_status.description_pattern(cfg.task_prefix)
+    )
 
     if len(running_heet_jobs) > 0:
         return True
@@ -476,6 +543,21 @@ def existing_job_files():
         return False
 
 
+def submit_queued_tasks(snapshot):
+    # Start queued tasks while fewer than cfg.max_tasks_in_flight HEET
+    # tasks are unfinished
+    return mtr.submission_queue.submit(cfg.max_tasks_in_flight - running_heet_task_count(snapshot))
+
+
+def existing_user_inputs():
+    # Check that the user inputs of a job were uploaded
+    try:
+        ee.data.getAsset(cfg.dams_table_path)
+    except ee.EEException:
+        return False
+    return True
+
+
 def task_audit(output_folder_path):
 
     target_dict = mtr.all_tasks_log
@@ -485,6 +567,13 @@ def task_audit(output_folder_path):
     # in this dict
     task_log_names = list(target_dict.keys())
 
+    # Fetch the status of all tasks with a single listing
+    try:
+        snapshot = mtr.status_monitor.refresh()
+    except Exception:
+        logger.exception("[task_audit] There was a problem fetching task statuses")
+        snapshot = heet_status.TaskStatusSnapshot([])
+
     # Record task status in a dataframe
     task_log = []
     for task_log_name in task_log_names:
@@ -494,33 +583,47 @@ def task_audit(output_folder_path):
         for k, v in list(task_dict.items()):
 
             task_key = k
-            task = v
 
-            # Get task status
-            try:
-                task_status = task.status()
+            # Retried tasks have a row for every submission
+            attempts = mtr.task_attempts.get((task_log_name, task_key), [v])
 
-                if task_log_name != "drive_export":
-                    task_status["asset_name"] = task.config["assetExportOptions"][
-                        "earthEngineDestination"
-                    ]["name"]
+            # Queue waits of the submissions of this run (attempts resumed
+            # from the journal of an interrupted run come first)
+            queue_waits = mtr.submission_queue.waits.get((task_log_name, task_key), [])
+            first_queued = len(attempts) - len(queue_waits)
+            for attempt, task in enumerate(attempts, start=1):
 
-            except:
-                logger.debug(
-                    f"[task_audit] There was a problem fetching task status for: {task_key}"
-                )
-                task_status = {"state": "UNKNOWN"}
+                # Get task status
+                try:
+                    task_status = dict(snapshot.status(task))
 
-            task_status["key"] = task_key
-            task_status["task_code"] = task_log_name
+                    if task_log_name != "drive_export":
+                        task_status["asset_name"] = task.config["assetExportOptions"][
+                            "earthEngineDestination"
+                        ]["name"]
 
-            c_dam_id_str_list = re.findall(".*_(\d+)", task_key)
-            if len(c_dam_id_str_list) > 0:
-                task_status["dam_id"] = c_dam_id_str_list[0]
-            else:
-                task_status["dam_id"] = 0
+                except:
+                    logger.debug(
+                        f"[task_audit] There was a problem fetching task status for: {task_key}"
+                    )
+                    task_status = {"state": "UNKNOWN"}
+
+                task_status["key"] = task_key
+                task_status["task_code"] = task_log_name
+                # Submission number of retried tasks
+                task_status["heet_attempt"] = attempt
+                # Time spent in the local submission queue
+                task_status["queue_wait_s"] = None
+                if attempt > first_queued:
+                    task_status["queue_wait_s"] = queue_waits[attempt - first_queued - 1]
+
+                c_dam_id_str_list = re.findall(".*_(\d+)", task_key)
+                if len(c_dam_id_str_list) > 0:
+                    task_status["dam_id"] = c_dam_id_str_list[0]
+                else:
+                    task_status["dam_id"] = 0
 
-            task_log.append(task_status)
+                task_log.append(task_status)
 
     df_tasks = pd.DataFrame.from_dict(task_log, orient="columns")
     df_tasks.to_csv(Path(output_folder_path, "tasks.csv"), index=False)
@@ -534,6 +637,15 @@ def log_new_exports():
     new_exports_count = 0
     new_exports = []
 
+    # Statuses of all tasks are fetched once per poll
+    try:
+        snapshot = mtr.status_monitor.refresh()
+        refreshed = True
+    except Exception:
+        logger.exception("[log_new_exports] Problem fetching task statuses")
+        snapshot = heet_status.TaskStatusSnapshot([])
+        refreshed = False
+
     task_dict = mtr.active_export_tasks_log
     for k, v in list(task_dict.items()):
 
@@ -541,10 +653,7 @@ def log_new_exports():
         task = v
 
         # Get task status
-        try:
-            task_status = task.status()["state"]
-        except:
-            task_status = "UNKNOWN"
+        task_status = snapshot.state(task)
 
         # If completed,
         if task_status == "COMPLETED":
@@ -560,10 +669,17 @@ def log_new_exports():
 
         new_exports_count = new_exports_count + len(new_exports)
 
+    if refreshed:
+        observe_tasks(snapshot, ["drive_export"])
+        submit_queued_tasks(snapshot)
+
     return new_exports_count
 
 
-def log_new_results():
+def process_new_results(snapshot):
+    """Check critical path tasks in a task status snapshot and advance each
+    dam along the pipeline as soon as its task completes. Returns the number
+    of completed tasks"""
 
     # Get an up-to-date list of active tasks
     # that are on the critical path
@@ -574,43 +690,133 @@ def log_new_results():
     for task_log_name in task_log_names:
 
         task_dict = mtr.active_tasks_log[task_log_name]
-        new_results = []
 
-        for k, v in list(task_dict.items()):
+        # Dams completing a stage whose next stage is batched
+        batched_dam_ids = []
+        # Failed tasks (shared by the dams of a batch) and whether they
+        # were resubmitted
+        failed_tasks = {}
+
+        for k, v in mtr.task_log_items(task_dict):
 
             c_dam_id_str = k
             task = v
 
             # Get task status
-            try:
-                task_status = task.status()["state"]
-            except:
-                task_status = "UNKNOWN"
+            task_status = snapshot.state(task)
 
-            # If task has completed, log new result
-            # remove from active tasks
+            # If task has completed, remove from active tasks and
+            # trigger the next step for this dam straight away
+            # (or for all dams of this poll, if the next step is batched)
             if task_status == "COMPLETED":
-                new_results.append(int(c_dam_id_str))
-                del task_dict[c_dam_id_str]
+                mtr.drop_active_task(task_log_name, c_dam_id_str, task)
+                if batched_stage(task_log_name):
+                    batched_dam_ids.append(int(c_dam_id_str))
+                else:
+                    mtr.pipeline.complete(int(c_dam_id_str), task_log_name)
+                new_results_count = new_results_count + 1
 
             # If task has failed, remove from active tasks,
-            # Remove dam from active analysis list
+            # End the analysis of the dam
             # (as we only monitor tasks on the critical path
             # a failed job ends the analysis)
+            # (unless the failure is transient and the task is resubmitted;
+            # a batch task is resubmitted once for all its dams, and its
+            # dams are exported one by one if it fails for good)
             if task_status == "FAILED":
-                del task_dict[c_dam_id_str]
-                mtr.active_analyses.remove(int(c_dam_id_str))
+                error_message = snapshot.status(task).get("error_message", "")
+                if id(task) not in failed_tasks:
+                    mtr.drop_active_task(task_log_name, c_dam_id_str, task)
+                    failed_tasks[id(task)] = retry_failed_task(
+                        task_log_name, c_dam_id_str, task, error_message
+                    ) or split_failed_batch(task_log_name, task, error_message)
+                elif not failed_tasks[id(task)]:
+                    mtr.drop_active_task(task_log_name, c_dam_id_str, task)
+                if not failed_tasks[id(task)]:
+                    mtr.pipeline.fail(int(c_dam_id_str), error_message)
+
+        if len(batched_dam_ids) > 0:
+            mtr.pipeline.complete_all(batched_dam_ids, task_log_name)
+
+    observe_tasks(snapshot, mtr.critical_path)
+
+    return new_results_count
 
-        mtr.new_results_log[task_log_name] = new_results
-        new_results_count = new_results_count + len(new_results)
 
-        # Post new result count to mtr namespace
-        mtr.new_results_count = new_results_count
+def running_heet_task_count(snapshot):
+    # Number of unfinished HEET tasks in the EE queue
+    return len(snapshot.active(heet_status.description_pattern(cfg.task_prefix)))
 
-    return new_results_count
+
+def retry_failed_task(task_log_name, c_dam_id_str, task, error_message):
+    """Resubmit a failed task, after a backoff delay, if its error is
+    transient and it has not used up its attempts (see heet_retry).
+    Returns True if the task was resubmitted"""
+
+    attempts = mtr.task_attempts.setdefault((task_log_name, c_dam_id_str), [task])
+    attempt = len(attempts)
+    dam_id_strs = heet_export.task_dam_ids(heet_export.task_asset_id(task), c_dam_id_str)
+
+    if not mtr.retry_policy.should_retry(attempt, error_message):
+        return False
+
+    delay_s = mtr.retry_policy.delay(attempt)
+    logger.info(
+        f"[retry_failed_task] {task_log_name} {c_dam_id_str} failed on attempt {attempt} "
+        + f"({error_message}). Resubmitting in {delay_s:.0f}s"
+    )
+    try:
+        new_task = heet_export.resubmit_task(
+            task, task_log_name, c_dam_id_str, delay_s, attempt + 1
+        )
+    except Exception:
+        logger.exception(f"[retry_failed_task] Problem resubmitting {task_log_name} {c_dam_id_str}")
+        return False
+
+    for dam_id_str in dam_id_strs:
+        mtr.task_attempts.setdefault((task_log_name, dam_id_str), [task]).append(new_task)
+    return True
+
+
+def split_failed_batch(task_log_name, task, error_message):
+    """Export the dams of a batch task that failed for good one task per dam
+    (see heet_export.split_batch), so that only the dams at fault fail.
+    Returns True if the dams were exported again"""
+
+    asset_id = heet_export.task_asset_id(task)
+    try:
+        dam_tasks = heet_export.split_batch(asset_id)
+    except Exception:
+        logger.exception(f"[split_failed_batch] Problem splitting {asset_id}")
+        return False
+    if len(dam_tasks) == 0:
+        return False
+
+    logger.info(
+        f"[split_failed_batch] {asset_id} failed ({error_message}). "
+        + f"Exporting its {len(dam_tasks)} dams one by one"
+    )
+    for dam_id_str, dam_task in dam_tasks.items():
+        mtr.task_attempts.setdefault((task_log_name, dam_id_str), [task]).append(dam_task)
+    return True
+
+
+# Stages whose completion starts profiling. With cfg.batch_profiling, the
+# dams completing one of them in a poll cycle are profiled in one batch
+batch_profiling_stages = ["catch_vec", "res_vec", "nic_vec"]
 
 
-def trigger_next_step():
+def batched_stage(task_log_name):
+    """Whether the dams completing a stage in a poll cycle are advanced
+    together (their next stage is triggered once for all of them)"""
+    if cfg.batch_profiling and task_log_name in batch_profiling_stages:
+        return True
+    # Snapped points exported to one table arrive together
+    return cfg.batch_snapping and task_log_name == "subbasin_pts"
+
+
+def next_step_actions():
+    """Actions triggered when a dam completes a critical path stage
 
     # ==============================================================================
     # [2]  Delineate catchment
@@ -622,75 +828,175 @@ def trigger_next_step():
     # [9]  Delineate river
     # [10] Calculate river properties
     # ==============================================================================
+    """
 
-    # Final step in calculation terminates analysis prior to export
-    if len(mtr.new_results_log["mriv_vec_params"]) > 0:
-        new_priver_ids = mtr.new_results_log["mriv_vec_params"]
-        heet_params.batch_delete_shapes(new_priver_ids, "main_river_vector")
-
-        for c_dam_id in new_priver_ids:
-            mtr.active_analyses.remove(c_dam_id)
+    # When snapped points arrive, delineate catchments.
+    def snapped_points_ready(c_dam_ids):
+        logger.info("Delineating catchments")
+        heet_catchment.batch_delineate_catchments(c_dam_ids)
 
-    # When delineated rivers arrive,
-    # - calculate parameters.
-    if len(mtr.new_results_log["mriv_vec"]) > 0:
-        new_river_ids = mtr.new_results_log["mriv_vec"]
-        heet_params.batch_profile_rivers(new_river_ids)
+    # When delineated catchments arrive, add params
+    def catchments_ready(c_dam_ids):
+        logger.info("Calculating Catchment Params")
+        heet_params.batch_profile_catchments(c_dam_ids)
 
-    # When nics with params arrive,
-    # - delineate rivers
-    if len(mtr.new_results_log["nic_vec_params"]) > 0:
-        logger.info("Delineating inundated rivers")
-        new_pnic_ids = mtr.new_results_log["nic_vec_params"]
-        heet_river.batch_delineate_rivers(new_pnic_ids)
-        heet_params.batch_delete_shapes(new_pnic_ids, "ni_catchment_vector")
+    # When catchments with params arrive
+    # - delineate reservoirs
+    # - clean up catchments without params
+    def profiled_catchments_ready(c_dam_ids):
+        logger.info("Delineating reservoirs")
+        heet_res.batch_delineate_reservoirs(c_dam_ids)
+        heet_params.batch_delete_shapes(c_dam_ids, "catchment_vector")
 
-    # When nics without parameters arrive
-    # - add parameters
-    if len(mtr.new_results_log["nic_vec"]) > 0:
-        logger.info("Calculating NIC params")
-        new_nic_ids = mtr.new_results_log["nic_vec"]
-        heet_params.batch_profile_nicatchments(new_nic_ids)
+    # When res without parameters arrive:
+    # - Add parameters
+    def reservoirs_ready(c_dam_ids):
+        logger.info("Calculating Reservoir Params")
+        heet_params.batch_profile_reservoirs(c_dam_ids)
 
     # When res with parameters arrive
     # - delineate NICS
     # - clean up
-    if len(mtr.new_results_log["res_vec_params"]) > 0:
+    def profiled_reservoirs_ready(c_dam_ids):
         logger.info("Delineating non-inundated catchments")
-        new_preservoir_ids = mtr.new_results_log["res_vec_params"]
-        heet_catchment.batch_delineate_nicatchments(new_preservoir_ids)
-        heet_params.batch_delete_shapes(new_preservoir_ids, "reservoir_vector")
+        heet_catchment.batch_delineate_nicatchments(c_dam_ids)
+        heet_params.batch_delete_shapes(c_dam_ids, "reservoir_vector")
 
-    # When res without parameters arrive:
-    # - Add parameters
-    if len(mtr.new_results_log["res_vec"]) > 0:
-        logger.info("Calculating Reservoir Params")
-        new_reservoir_ids = mtr.new_results_log["res_vec"]
-        heet_params.batch_profile_reservoirs(new_reservoir_ids)
+    # When nics without parameters arrive
+    # - add parameters
+    def nicatchments_ready(c_dam_ids):
+        logger.info("Calculating NIC params")
+        heet_params.batch_profile_nicatchments(c_dam_ids)
 
-    # When catchments with params arrive
-    # - delineate reservoirs
-    # - clean up catchments without params
-    if len(mtr.new_results_log["catch_vec_params"]) > 0:
-        logger.info("Delineating reservoirs")
-        new_pcatchment_ids = mtr.new_results_log["catch_vec_params"]
-        heet_res.batch_delineate_reservoirs(new_pcatchment_ids)
-        heet_params.batch_delete_shapes(new_pcatchment_ids, "catchment_vector")
+    # When nics with params arrive,
+    # - delineate rivers
+    def profiled_nicatchments_ready(c_dam_ids):
+        logger.info("Delineating inundated rivers")
+        heet_river.batch_delineate_rivers(c_dam_ids)
+        heet_params.batch_delete_shapes(c_dam_ids, "ni_catchment_vector")
 
-    # When delineated catchments arrive, add params
-    if len(mtr.new_results_log["catch_vec"]) > 0:
-        logger.info("Calculating Catchment Params")
-        new_catchment_ids = mtr.new_results_log["catch_vec"]
-        heet_params.batch_profile_catchments(new_catchment_ids)
+    # When delineated rivers arrive,
+    # - calculate parameters.
+    def rivers_ready(c_dam_ids):
+        heet_params.batch_profile_rivers(c_dam_ids)
 
-    # When snapped points arrive, delineate catchments.
-    if len(mtr.new_results_log["subbasin_pts"]) > 0:
-        logger.info("Delineating catchments")
-        new_snapped_ids = mtr.new_results_log["subbasin_pts"]
-        heet_catchment.batch_delineate_catchments(new_snapped_ids)
+    # Final step in calculation terminates analysis prior to export
+    # - stream the output parameters of the dams
+    def profiled_rivers_ready(c_dam_ids):
+        heet_params.batch_delete_shapes(c_dam_ids, "main_river_vector")
+        stream_completed_dams(c_dam_ids)
+
+    return {
+        "subbasin_pts": snapped_points_ready,
+        "catch_vec": catchments_ready,
+        "catch_vec_params": profiled_catchments_ready,
+        "res_vec": reservoirs_ready,
+        "res_vec_params": profiled_reservoirs_ready,
+        "nic_vec": nicatchments_ready,
+        "nic_vec_params": profiled_nicatchments_ready,
+        "mriv_vec": rivers_ready,
+        "mriv_vec_params": profiled_rivers_ready,
+    }
+
+
+def record_dam_stage(c_dam_id, state):
+    # Record the critical path state of a dam in the run journal
+    if mtr.journal is not None:
+        mtr.journal.record_stage(c_dam_id, state)
+
+
+def resume_analysis(dams_ftc, c_dam_ids):
+    """Restore the pipeline of an interrupted run.
+
+    The furthest critical path stage completed by each dam is found from the
+    assets in the job's EE folder. Tasks recorded in the run journal that are
+    still running are monitored again rather than resubmitted, and only the
+    stages that are still missing are submitted.
+    """
+
+    asset_index = index_job_assets()
+
+    stage_prefixes = {
+        spec["taskcode"]: spec["fileprefix"]
+        for spec in heet_export.export_job_specs.values()
+    }
+    completed_stages = heet_journal.completed_stages_from_assets(
+        asset_index, mtr.critical_path, stage_prefixes
+    )
 
+    snapshot = mtr.status_monitor.refresh()
+    journal_tasks = mtr.journal.latest_tasks() if mtr.journal is not None else {}
 
-def run_analysis(pbar):
+    unsnapped_dam_ids = []
+    resumed_dam_ids = {}
+    n_reattached = 0
+    # Running tasks by task id (a batch task is shared by its dams)
+    reattached_tasks = {}
+    for c_dam_id in c_dam_ids:
+        completed_stage = completed_stages.get(c_dam_id)
+        state = mtr.pipeline.restore(c_dam_id, completed_stage)
+        if state == heet_pipeline.DONE:
+            continue
+
+        # Monitor the task of the current stage if it is still running
+        journal_task = journal_tasks.get((state, str(c_dam_id)))
+        if journal_task is not None:
+            task_state = snapshot.state(journal_task["task_id"])
+            if task_state in ["READY", "RUNNING"]:
+                task = reattached_tasks.get(journal_task["task_id"])
+                if task is None:
+                    task = ee.batch.Task(
+                        journal_task["task_id"],
+                        ee.batch.Task.Type.EXPORT_TABLE,
+                        task_state,
+                        config={
+                            "description": journal_task["description"],
+                            "assetExportOptions": {
+                                "earthEngineDestination": {"name": journal_task["asset_id"]}
+                            },
+                        },
+                    )
+                    reattached_tasks[journal_task["task_id"]] = task
+                batch_asset = heet_assets.parse_batch_asset_name(journal_task["asset_id"])
+                if batch_asset is not None:
+                    mtr.batch_tasks.setdefault(journal_task["asset_id"], []).append(
+                        str(c_dam_id)
+                    )
+                    heet_assets.add_batch_asset(
+                        mtr.batch_outputs,
+                        batch_asset[0],
+                        {"id": journal_task["asset_id"]},
+                        [c_dam_id],
+                    )
+                mtr.log_task(state, str(c_dam_id), task)
+                n_reattached = n_reattached + 1
+                continue
+
+        if completed_stage is None:
+            unsnapped_dam_ids.append(c_dam_id)
+        else:
+            resumed_dam_ids.setdefault(completed_stage, []).append(c_dam_id)
+
+    logger.info(
+        f"[resume_analysis] {len(mtr.pipeline.done)} dams complete, "
+        + f"{n_reattached} running tasks monitored, "
+        + f"{len(unsnapped_dam_ids)} dams restarted, "
+        + f"{sum(len(ids) for ids in resumed_dam_ids.values())} dams resumed"
+    )
+
+    # Submit the missing stages
+    if len(unsnapped_dam_ids) > 0:
+        heet_basins.batch_find_upstream_basins(dams_ftc, unsnapped_dam_ids)
+    for completed_stage, stage_dam_ids in resumed_dam_ids.items():
+        mtr.pipeline.trigger(completed_stage, stage_dam_ids)
+
+    # Steps completed before the run was interrupted
+    return sum(
+        mtr.critical_path.index(stage) + 1 for stage in completed_stages.values()
+    )
+
+
+def run_analysis(pbar, resume=False):
 
     dams_ftc = ee.FeatureCollection(cfg.dams_table_path)
     c_dam_ids = dams_ftc.aggregate_array("id").getInfo()
@@ -725,51 +1031,66 @@ def run_analysis(pbar):
     mtr.id_landcover_analysis_file_lookup = id_landcover_analysis_file_dict
     mtr.id_landcover_delineation_file_lookup = id_landcover_delineation_file_dict
 
+    # Failed tasks are resubmitted according to the configured policy
+    mtr.retry_policy = heet_retry.RetryPolicy(
+        max_attempts=cfg.max_task_attempts,
+        base_delay_s=cfg.retry_base_delay_s,
+        max_delay_s=cfg.retry_max_delay_s,
+    )
+
     # Define active analyses
-    mtr.active_analyses = c_dam_ids
+    mtr.pipeline = heet_pipeline.DamPipeline(
+        mtr.critical_path, next_step_actions(), on_change=record_dam_stage
+    )
 
-    new_results_count = mtr.new_results_count
+    if resume:
+        # Pick up an interrupted run where it stopped
+        pbar.update(resume_analysis(dams_ftc, c_dam_ids))
+    else:
+        # Every dam starts at the first critical path stage
+        mtr.pipeline.start(c_dam_ids)
 
-    # Initiate analysis by snapping dams to hydrorivers & finding upstream basins
-    # for all dams in batch
-    heet_basins.batch_find_upstream_basins(dams_ftc, c_dam_ids)
+        # Initiate analysis by snapping dams to hydrorivers & finding upstream basins
+        # for all dams in batch
+        heet_basins.batch_find_upstream_basins(dams_ftc, c_dam_ids)
 
     # Monitor the EE task queue for complete or failed jobs
-    # until the active analysis list is empty
-    # (a dam is removed from the active list if any task on the
-    # critcal path fails or the final task on the critcal path completes successfully)
-
-    keep_going = 1
-    while (len(mtr.active_analyses) > 0) and (keep_going == 1):
-
-        if new_results_count == 0:
-            logger.info("Waiting for new results to arrive...")
-            try:
-                wait_until_new_results()
-            except polling2.TimeoutException:
-                current_active_analyses = ",".join(
-                    [str(i) for i in mtr.active_analyses]
-                )
-                emsg = f"Analysis wait time limit exceeded. Cancelling all unfinished HEET tasks (active: {current_active_analyses}."
-                logger.info(emsg)
-                kill_all_heet_tasks()
-                keep_going = 0
-            except:
-                logger.debug("HEET encountered an error and will exit")
-                sys.exit("HEET encountered an error and will exit")
-
-            pbar.update(mtr.new_results_count)
-
-            logger.info("Triggering Next Analysis Step (after wait)")
-            trigger_next_step()
-
-        else:
-            logger.info("Triggering Next Analysis Step (No wait)")
-            trigger_next_step()
+    # until no dam is active. Dams are advanced to their next stage as
+    # soon as their task completes (a dam leaves the pipeline if any task on
+    # the critcal path fails or the final task on the critcal path completes
+    # successfully). Stage actions, task starts and polling run concurrently
+    # (see heet_orchestrator)
+    reported_steps = 0
+
+    def report_progress(completed_steps):
+        nonlocal reported_steps
+        pbar.update(completed_steps - reported_steps)
+        reported_steps = completed_steps
+
+    orchestrator = heet_orchestrator.Orchestrator(
+        mtr.pipeline,
+        mtr.submission_queue,
+        mtr.status_monitor,
+        process_new_results,
+        running_heet_task_count,
+        cfg.max_tasks_in_flight,
+        mtr.poll_schedule,
+        max_workers=cfg.max_ee_workers,
+        timeout_s=5400,
+        on_progress=report_progress,
+    )
 
-        new_results_count = heet_task.log_new_results()
+    logger.info("Waiting for new results to arrive...")
+    try:
+        status = asyncio.run(orchestrator.run())
+    except Exception:
+        logger.exception("HEET encountered an error and will exit")
+        sys.exit("HEET encountered an error and will exit")
 
-        pbar.update(mtr.new_results_count)
+    if status == 1:
+        current_active_analyses = ",".join([str(i) for i in mtr.pipeline.active])
+        emsg = f"Analysis wait time limit exceeded. Cancelling all unfinished HEET tasks (active: {current_active_analyses}."
+        logger.info(emsg)
+        kill_all_heet_tasks()
 
-    status = abs(keep_going - 1)
     return status
@@ -2,47 +2,18 @@
 import argparse
 import ee
 
-ee.Initialize()
-
-
-def find_child_assets(search_list: list) -> list:
-    """Find assets on Earth Engine"""
-    search_list = [a for a in search_list if a["type"] in ["FOLDER", "IMAGECOLLECTION"]]
-
-    new_asset_collection = []
-    search_next = []
-
-    for target_asset in search_list:
-        found = ee.data.listAssets({"parent": target_asset["name"]})
-        if "assets" in found:
-            new_asset_collection.extend(found["assets"])
-            search_next.extend(found["assets"])
-    return search_next, new_asset_collection
+try:
+    from delineator import heet_asset_ops
+except ModuleNotFoundError:
+    import heet_asset_ops
 
-
-def find_assets(search_list: list, asset_collection: list) -> list:
-    """Find assets on Earth Engine"""
-    search_next, new_asset_collection = find_child_assets(search_list)
-    asset_collection.extend(new_asset_collection)
-
-    while len(search_next) > 0:
-        search_next, new_asset_collection = find_child_assets(search_next)
-        asset_collection.extend(new_asset_collection)
-
-    return asset_collection
+ee.Initialize()
 
 
 def delete_folder(target_folder: str) -> None:
-    """Delete assets in target folder in Earth Engine"""
-    heet_assets = ee.data.listAssets({"parent": target_folder})
-    asset_collection = heet_assets["assets"]
-    if len(asset_collection) > 0:
-        assets_to_delete = find_assets(heet_assets["assets"], asset_collection)
-        # print(assets_to_delete)
-        assets_to_delete.reverse()
-        for target_asset in assets_to_delete:
-            ee.data.deleteAsset(target_asset["name"])
-    ee.data.deleteAsset(target_folder)
+    """Delete assets in target folder in Earth Engine (concurrently,
+    children before their parents)"""
+    heet_asset_ops.AssetOps().delete_tree(target_folder, remove_folder=True)
 
 
 parser = argparse.ArgumentParser(
@@ -0,0 +1,235 @@
+""" Benchmark of the task scheduling core of an analysis against a
+    simulated EE.
+
+    Runs the orchestrator (heet_orchestrator) with the critical path,
+    submission queue, retry policy, adaptive poll schedule and task status
+    snapshots of a real run, for a batch of synthetic dams. Tasks are logged
+    in the shared task logs of heet_monitor from the stage actions (on the
+    orchestrator's worker threads) and read back by the poll loop, as in
+    heet_export and heet_task. At the end, the job's assets are deleted with
+    heet_asset_ops, as the asset housekeeping of a run does.
+
+    EE is simulated in-process (tests/fake_ee.py SimulatedOperationsService):
+    task queue waits, run times and EECU usage are drawn from the recorded
+    task logs in dev/profiling/data/*/tasks.csv, and simulated time runs
+    --speedup times faster than real time.
+
+    This is not an end to end test of heet_task.run_analysis: the stage
+    actions do not build EE computations (heet_task and heet_export cannot be
+    imported without an initialised EE client), so the export, results and
+    asset index code of a run is not covered.
+
+    Reports, for every batch size, the wall time, the client CPU time, the
+    simulated EE time and the number of calls to each fake EE API.
+
+    Usage (from the repository root):
+        python dev/benchmark/benchmark_orchestrator.py --dams 1000 10000 50000
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from pathlib import Path
+
+root_path = Path(__file__).resolve().parents[2]
+sys.path.insert(0, str(root_path))
+# Fakes of the EE services shared with the tests
+sys.path.insert(0, str(root_path / "tests"))
+
+from delineator import heet_monitor as mtr  # noqa: E402
+from delineator import heet_asset_ops  # noqa: E402
+from delineator import heet_orchestrator  # noqa: E402
+from delineator import heet_pipeline  # noqa: E402
+from delineator import heet_poll  # noqa: E402
+from delineator import heet_queue  # noqa: E402
+from delineator import heet_retry  # noqa: E402
+from delineator import heet_status  # noqa: E402
+import fake_ee  # noqa: E402
+
+task_prefix = "XHEET-BENCH-X"
+folder = "projects/earthengine-legacy/assets/users/heet/XHEET-BENCH/tmp"
+
+# File prefixes of the critical path outputs (see heet_export.export_job_specs)
+stage_prefixes = {
+    "subbasin_pts": "PS_",
+    "catch_vec": "c_",
+    "catch_vec_params": "C_",
+    "res_vec": "r_",
+    "res_vec_params": "R_",
+    "nic_vec": "n_",
+    "nic_vec_params": "N_",
+    "mriv_vec": "ms_",
+    "mriv_vec_params": "MS_",
+}
+
+
+class ScaledPollSchedule(heet_poll.PollSchedule):
+    """Poll schedule reading simulated time; intervals are returned in real
+    seconds"""
+
+    def __init__(self, speedup, **kwargs):
+        super().__init__(**kwargs)
+        self.speedup = speedup
+
+    def next_step(self, wake_in_s=None):
+        if wake_in_s is not None:
+            wake_in_s = wake_in_s * self.speedup
+        return super().next_step(wake_in_s) / self.speedup
+
+
+class SyntheticAnalysis:
+    """Critical path of n_dams synthetic dams on a simulated EE"""
+
+    def __init__(self, n_dams, args, profile):
+        real_start = time.monotonic()
+        sim_start = time.time()
+        self.sim_start = sim_start
+        self.clock = lambda: sim_start + (time.monotonic() - real_start) * args.speedup
+
+        self.service = fake_ee.SimulatedOperationsService(
+            profile,
+            lambda config: config["description"].split()[-1],
+            self.clock,
+            latency_scale=args.latency_scale,
+            failure_rate=args.failure_rate,
+            seed=args.seed,
+        )
+        self.queue = heet_queue.SubmissionQueue(mtr.critical_path)
+        self.pipeline = heet_pipeline.DamPipeline(
+            mtr.critical_path, {stage: self.submit_next_stage for stage in mtr.critical_path}
+        )
+        self.retry_policy = heet_retry.RetryPolicy(
+            base_delay_s=60 / args.speedup, max_delay_s=900 / args.speedup
+        )
+        self.poll_schedule = ScaledPollSchedule(args.speedup, clock=self.clock)
+        self.pattern = heet_status.description_pattern(task_prefix)
+        self.attempts = {}
+        self.asset_ops = heet_asset_ops.AssetOps(
+            self.service,
+            max_workers=args.workers,
+            retry_policy=heet_retry.RetryPolicy(
+                max_attempts=5, base_delay_s=1 / args.speedup, max_delay_s=30 / args.speedup
+            ),
+        )
+
+        self.orchestrator = heet_orchestrator.Orchestrator(
+            self.pipeline,
+            self.queue,
+            heet_status.TaskStatusMonitor(self.service.listOperations),
+            self.process,
+            lambda snapshot: len(snapshot.active(self.pattern)),
+            args.max_tasks_in_flight,
+            self.poll_schedule,
+            max_workers=args.workers,
+            timeout_s=5400 / args.speedup,
+        )
+
+        dam_ids = list(range(1, n_dams + 1))
+        self.pipeline.start(dam_ids)
+        for dam_id in dam_ids:
+            self.submit(mtr.critical_path[0], dam_id)
+
+    def submit(self, stage, dam_id, delay_s=0.0):
+        stage_id = str(mtr.critical_path.index(stage) + 1).zfill(3)
+        task = self.service.new_task(
+            {
+                "description": f"{task_prefix}{stage_id}-{dam_id} {stage}",
+                "assetId": f"{folder}/{stage_prefixes[stage]}{dam_id}",
+            }
+        )
+        mtr.log_task(stage, str(dam_id), task)
+        self.queue.put(stage, str(dam_id), task.start, delay_s)
+
+    def submit_next_stage(self, dam_ids):
+        for dam_id in dam_ids:
+            if self.pipeline.is_active(dam_id):
+                self.submit(self.pipeline.state(dam_id), dam_id)
+
+    def process(self, snapshot):
+        # As heet_task.process_new_results and observe_tasks
+        n_completed = 0
+        for stage in mtr.critical_path:
+            for key, task in mtr.task_log_items(mtr.active_tasks_log[stage]):
+                dam_id = int(key)
+                status = snapshot.status(task)
+                if status["state"] == "COMPLETED":
+                    mtr.drop_active_task(stage, key, task)
+                    self.pipeline.complete(dam_id, stage)
+                    n_completed = n_completed + 1
+                elif status["state"] == "FAILED":
+                    mtr.drop_active_task(stage, key, task)
+                    attempt = self.attempts.get((stage, dam_id), 1)
+                    error_message = status.get("error_message", "")
+                    if self.retry_policy.should_retry(attempt, error_message):
+                        self.attempts[(stage, dam_id)] = attempt + 1
+                        self.submit(stage, dam_id, self.retry_policy.delay(attempt))
+                    else:
+                        self.pipeline.fail(dam_id, error_message)
+        self.poll_schedule.update(
+            [
+                (stage, snapshot.status(task))
+                for stage, task in mtr.logged_tasks(mtr.all_tasks_log)
+                if getattr(task, "id", None) is not None
+            ],
+            mtr.critical_path,
+        )
+        return n_completed
+
+    def run(self):
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        status = asyncio.run(self.orchestrator.run())
+        housekeeping_start = time.perf_counter()
+        n_deleted = self.asset_ops.delete_tree(folder)
+        return {
+            "dams": len(self.pipeline.states),
+            "done": len(self.pipeline.done),
+            "failed": len(self.pipeline.failed),
+            "timed_out": status == 1,
+            "wall_s": round(time.perf_counter() - wall_start, 3),
+            "client_cpu_s": round(time.process_time() - cpu_start, 3),
+            "assets_deleted": n_deleted,
+            "housekeeping_wall_s": round(time.perf_counter() - housekeeping_start, 3),
+            "simulated_ee_h": round((self.clock() - self.sim_start) / 3600, 2),
+            "polls": self.poll_schedule.total_polls,
+            "api_calls": dict(self.service.calls),
+            "list_pages": self.service.page_requests,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dams", type=int, nargs="+", default=[1000], help="batch sizes to run")
+    parser.add_argument(
+        "--tasks-csv",
+        nargs="+",
+        default=sorted(str(p) for p in root_path.glob("dev/profiling/data/*/tasks.csv")),
+        help="recorded task logs the task behaviour is drawn from",
+    )
+    parser.add_argument("--speedup", type=float, default=1000, help="simulated seconds per real second")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="factor on recorded task times")
+    parser.add_argument("--failure-rate", type=float, default=None, help="override recorded failure rates")
+    parser.add_argument("--max-tasks-in-flight", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    profile = fake_ee.TaskProfile.from_tasks_csv(args.tasks_csv)
+
+    for n_dams in args.dams:
+        # Each batch starts with empty task logs
+        for task_log in list(mtr.all_tasks_log.values()) + list(mtr.active_tasks_log.values()):
+            task_log.clear()
+        result = SyntheticAnalysis(n_dams, args, profile).run()
+        if args.json:
+            print(json.dumps(result))
+            continue
+        print(f"{n_dams} dams")
+        for key, value in result.items():
+            print(f"  {key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
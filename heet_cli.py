@@ -21,6 +21,9 @@ from termcolor import colored
 import polling2
 
 from delineator import heet_validate  # Does not import ee
+from delineator import heet_journal  # Does not import ee
+from delineator import heet_results  # Does not import ee
+from delineator import heet_shard  # Does not import ee
 from delineator import heet_log as lg
 from delineator import heet_monitor as mtr
 
@@ -98,6 +101,40 @@ parser.add_argument(
     help="The set of output files to export",
 )
 
+parser.add_argument(
+    "--shard-config",
+    type=str,
+    default=None,
+    help="Path to a toml file listing Earth Engine projects (and optionally \
+        service accounts) to share the analysis between. The input file is \
+        partitioned across the projects, which run concurrently, and their \
+        results are merged.",
+)
+
+parser.add_argument(
+    "--output-dir",
+    type=str,
+    default=None,
+    help=argparse.SUPPRESS,
+)
+
+parser.add_argument(
+    "--shard",
+    type=int,
+    default=None,
+    help=argparse.SUPPRESS,
+)
+
+parser.add_argument(
+    "--resume",
+    type=str,
+    metavar="OUTPUT_FOLDER",
+    default=None,
+    help="Resume an interrupted job from its local output folder (e.g. \
+        outputs/JOBNAME_20230101-1200). Stages already completed are not \
+        recomputed.",
+)
+
 # ==============================================================================
 # Functions
 # ==============================================================================
@@ -125,6 +162,16 @@ def is_authenticated(project):
 
     if "CI_ROBOT_USER" in os.environ:
         return False
+    elif "HEET_SERVICE_ACCOUNT" in os.environ:
+        # Shards of a sharded run may use service account credentials
+        try:
+            credentials = ee.ServiceAccountCredentials(
+                os.environ["HEET_SERVICE_ACCOUNT"], os.environ["HEET_KEY_FILE"]
+            )
+            ee.Initialize(credentials, project=project)
+            return True
+        except Exception as error:
+            return False
     else:
         try:
             ee.Initialize(project=project)
@@ -213,6 +260,17 @@ def update_sp_err_folder(sp, folder_path):
     return sp
 
 
+def update_sp_err_resume(sp, folder_path):
+    sp.write("")
+    sp.write("  [ERROR] HEET encountered an error and will exit")
+    sp.write(
+        f"  [ERROR] Folder {folder_path} does not contain the journal of an interrupted job"
+    )
+    sp.write("")
+    sp.write("Thank you for using HEET!")
+    return sp
+
+
 def update_sp_err_fnf(sp):
     sp.write("")
     sp.write("  [ERROR] HEET encountered an error and will exit")
@@ -257,21 +315,21 @@ def update_sp_inv_file(sp, issues):
     return sp
 
 
-def update_sp_err_running(sp):
+def update_sp_err_running(sp, heet_folder, task_prefix):
     # sp.write("123456789|123456789|123456789|123456789|123456789|123456789|123456789|123456789|")
     sp.write("")
     sp.write(
         "  Oops! Your Google Earth Engine Asset Task List already contains HEET tasks"
     )
-    sp.write("        It looks like another HEET analysis is already running")
+    sp.write("        It looks like an analysis with this job name is already running")
     sp.write("")
     sp.write(
         "        If you choose to continue, any existing HEET tasks (with a description"
     )
     sp.write(
-        "        starting 'XHEET-X') will be cancelled and the contents of Asset Folder"
+        f"        starting '{task_prefix}') will be cancelled and the contents of Asset"
     )
-    sp.write("        XHEET/tmp will be deleted")
+    sp.write(f"        Folder {heet_folder} will be deleted")
     sp.write("")
     sp.write(
         "        You will be asked to confirm that you understand this msg and then"
@@ -281,23 +339,28 @@ def update_sp_err_running(sp):
     return sp
 
 
-def update_sp_err_interrupted(sp):
+def update_sp_err_interrupted(sp, heet_folder, task_prefix):
     sp.write("")
     sp.write(
-        "  Oops! Your Google Earth Engine Asset Folder XHEET/tmp already contains some"
+        f"  Oops! Your Google Earth Engine Asset Folder {heet_folder} already contains"
     )
     sp.write(
-        "        files. It looks like a previous HEET analysis was interrupted and did"
+        "        some files. It looks like a previous analysis with this job name was"
     )
-    sp.write("        not complete")
+    sp.write("        interrupted and did not complete")
     sp.write("")
     sp.write(
         "        If you choose to continue, any existing HEET tasks (with a description"
     )
     sp.write(
-        "        starting 'XHEET-X') will be cancelled and the contents of Asset Folder"
+        f"        starting '{task_prefix}') will be cancelled and the contents of Asset"
+    )
+    sp.write(f"        Folder {heet_folder} will be deleted")
+    sp.write("")
+    sp.write(
+        "        To resume the interrupted analysis instead, exit and run HEET again"
     )
-    sp.write("        XHEET/tmp will be deleted")
+    sp.write("        with --resume outputs/<job output folder>")
     sp.write("")
     sp.write(
         "        You will be asked to confirm that you understand this msg and then"
@@ -351,7 +414,7 @@ def update_sp_inv_output(sp, issues):
 
 
 def update_sp_err_time(sp):
-    current_active_analyses = ",".join([str(i) for i in mtr.active_analyses])
+    current_active_analyses = ",".join([str(i) for i in mtr.pipeline.active])
     sp.write(
         "  [WARNING] Analysis wait time limit exceeded. Cancelling all unfinished HEET"
     )
@@ -372,6 +435,69 @@ def update_sp_inf_service(sp):
     return sp
 
 
+def update_sp_err_shards(sp, exit_codes):
+    sp.write("")
+    sp.write("  [WARNING] Some shards did not complete successfully:")
+    for index, exit_code in exit_codes.items():
+        if exit_code != 0:
+            sp.write(f"  [WARNING] Shard {index} (exit code {exit_code})")
+    sp.write("  [WARNING] See the shard-S*.out and heet-S*.log files for details.")
+    sp.write("")
+    return sp
+
+
+def run_sharded(args, jobname, input_file_path, output_folder_path):
+    """Partition the analysis across the EE projects of the shard
+    configuration, run the shards concurrently and merge their results"""
+
+    step_desc = "Partitioning input file across shards"
+    with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+        try:
+            shards = heet_shard.load_shard_config(Path(args.shard_config))
+            input_paths = heet_shard.write_shard_inputs(
+                input_file_path, len(shards), Path(output_folder_path, "shard_inputs")
+            )
+            jobs = heet_shard.shard_jobs(
+                shards, input_paths, jobname, args.outputs, output_folder_path
+            )
+        except Exception:
+            sp = update_sp_fail(sp)
+            sp = update_sp_err_fatal(sp)
+            logger.exception("[heet_cli] There was a problem partitioning the input file")
+            sys.exit()
+        else:
+            sp = update_sp_success(sp)
+
+    step_desc = f"Running {len(jobs)} shards (projects: {', '.join(j['project'] for j in jobs)})"
+    with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+        try:
+            exit_codes = heet_shard.run_shards(jobs, heet_shard.SubprocessRunner())
+        except Exception:
+            sp = update_sp_fail(sp)
+            sp = update_sp_err_fatal(sp)
+            logger.exception("[heet_cli] There was a problem running the shards")
+            sys.exit()
+        if all(exit_code == 0 for exit_code in exit_codes.values()):
+            sp = update_sp_success(sp)
+        else:
+            sp = update_sp_fail(sp)
+            sp = update_sp_err_shards(sp, exit_codes)
+
+    step_desc = f"Merging shard results into {output_folder_path}"
+    with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+        try:
+            heet_shard.merge_results([j["output_dir"] for j in jobs], output_folder_path)
+        except Exception:
+            sp = update_sp_fail(sp)
+            sp = update_sp_err_fatal(sp)
+            logger.exception("[heet_cli] There was a problem merging shard results")
+            sys.exit()
+        else:
+            sp = update_sp_success(sp)
+            sp.write("")
+            sp.write("Thank you for using HEET!")
+
+
 # ==============================================================================
 # Main
 # ==============================================================================
@@ -397,9 +523,17 @@ def main():
               [ERROR] Job name {jobname} must be 3-10 characters long and only contain: A-Z, 0-9 or - "
         )
 
-    # Define an output folder name
-    output_folder_name = output_asset_folder(jobname)
-    output_folder_path = Path("outputs", output_folder_name)
+    # Define an output folder name (an interrupted job keeps its folder)
+    resume = args.resume is not None
+    if resume:
+        output_folder_path = Path(args.resume)
+        output_folder_name = output_folder_path.name
+    elif args.output_dir is not None:
+        output_folder_path = Path(args.output_dir)
+        output_folder_name = output_folder_path.name
+    else:
+        output_folder_name = output_asset_folder(jobname)
+        output_folder_path = Path("outputs", output_folder_name)
 
     # Tasks on critical path
     ntasks = len(mtr.critical_path)
@@ -437,14 +571,30 @@ def main():
     # ==========================================================================
     step_desc = f"Preparing local output folder outputs/{output_folder_name}"
     with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
-        try:
-            output_folder_path.mkdir(parents=True, exist_ok=False)
-        except FileExistsError:
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_folder(sp, output_folder_path)
-            sys.exit()
+        journal_file_path = Path(output_folder_path, heet_journal.journal_file_name)
+        if resume:
+            if not journal_file_path.exists():
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_resume(sp, output_folder_path)
+                sys.exit()
         else:
-            sp = update_sp_success(sp)
+            try:
+                output_folder_path.mkdir(parents=True, exist_ok=False)
+            except FileExistsError:
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_folder(sp, output_folder_path)
+                sys.exit()
+
+        # Tasks and dam stages are recorded in the run journal
+        mtr.journal = heet_journal.RunJournal(journal_file_path)
+        if not resume:
+            mtr.journal.set_meta("jobname", jobname)
+
+        # Output parameters are written as each dam completes
+        mtr.results = heet_results.ResultStream(
+            Path(output_folder_path, heet_results.results_file_name)
+        )
+        sp = update_sp_success(sp)
 
     # ==========================================================================
     # Checking local input file
@@ -495,6 +645,14 @@ def main():
                 sys.exit()
             else:
                 sp = update_sp_success(sp)
+
+    # ==========================================================================
+    # Sharded analysis
+    # ==========================================================================
+    if args.shard_config is not None:
+        run_sharded(args, jobname, input_file_path, output_folder_path)
+        sys.exit()
+
     # ==========================================================================
     # Authentication
     # ==========================================================================
@@ -528,6 +686,33 @@ def main():
     from delineator import heet_export
     from delineator import heet_config as cfg
 
+    # Every job works in its own EE folder and task namespace
+    if args.shard is None:
+        cfg.set_job_namespace(jobname)
+    else:
+        cfg.set_job_namespace(jobname + "-S" + str(args.shard))
+    job_namespace = {
+        "jobname": jobname,
+        "ps_heet_folder": cfg.ps_heet_folder,
+        "task_prefix": cfg.task_prefix,
+    }
+    if resume:
+        # The job is resumed in the EE folder and task namespace it ran in;
+        # any other namespace would clean up the assets of another job
+        mismatches = mtr.journal.meta_mismatches(job_namespace)
+        if mismatches:
+            details = ", ".join(
+                f"{key} {stored} (given {given})"
+                for key, (stored, given) in mismatches.items()
+            )
+            logger.info(f"[heet_cli] Cannot resume, journal records {details}")
+            sys.exit(
+                f"[ERROR] HEET encountered an error and could not start \n \
+              [ERROR] Folder {output_folder_path} holds the journal of another job: {details}"
+            )
+    for key, value in job_namespace.items():
+        mtr.journal.set_meta(key, value)
+
     cfg.output_asset_folder_name = output_folder_name
     cfg.output_drive_folder = "XHEET_" + cfg.output_asset_folder_name
 
@@ -577,170 +762,197 @@ def main():
         cfg.exportSimplifiedReservoir = True
 
     # ==========================================================================
-    # Check asset folder
+    # Resume interrupted job
     # ==========================================================================
+    if resume:
+        step_desc = "Resuming interrupted analysis (HEET tasks and files are kept)"
+        with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+            try:
+                inputs_uploaded = heet_task.existing_user_inputs()
+            except Exception:
+                # Handles any issue, including connectivity
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_fatal(sp)
+                sys.exit()
+            if inputs_uploaded == False:
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_resume(sp, output_folder_path)
+                logger.info(
+                    f"[heet_cli] Cannot resume, {cfg.dams_table_path} was not found"
+                )
+                sys.exit()
+            sp = update_sp_success(sp)
 
-    # Setting pyinquirer styles
-    style = style_from_dict(
-        {
-            Token.Separator: "#000080",
-            Token.QuestionMark: "#008080 bold",
-            Token.Selected: "#000080",  # default
-            Token.Pointer: "#000080 bold",
-            Token.Instruction: "",  # default
-            Token.Answer: "#000080 bold",
-            Token.Question: "",
-        }
-    )
+    # Asset folder is only checked, wiped and uploaded to for a new job
+    if not resume:
 
-    questions = [
-        {
-            "type": "confirm",
-            "message": "I understand what will happen if I continue",
-            "name": "understand",
-        },
-        {
-            "type": "confirm",
-            "message": "Would you like to continue?",
-            "name": "continue",
-        },
-    ]
-
-    step_desc = "Checking Google Earth Engine Asset Folder:"
-    with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+        # ==========================================================================
+        # Check asset folder
+        # ==========================================================================
 
-        try:
-            existing_tasks = heet_task.existing_tasks_running()
-            existing_files = heet_task.existing_job_files()
-        except Exception:
-            # Handles any issue, including connectivity
-            sp = update_sp_err_fatal(sp)
-            sys.exit()
-        else:
-            if (existing_tasks == True) or (existing_files == True):
-                sp = update_sp_fail(sp)
+        # Setting pyinquirer styles
+        style = style_from_dict(
+            {
+                Token.Separator: "#000080",
+                Token.QuestionMark: "#008080 bold",
+                Token.Selected: "#000080",  # default
+                Token.Pointer: "#000080 bold",
+                Token.Instruction: "",  # default
+                Token.Answer: "#000080 bold",
+                Token.Question: "",
+            }
+        )
 
-                if existing_tasks == True:
-                    sp = update_sp_err_running(sp)
-                elif existing_files == True:
-                    sp = update_sp_err_interrupted(sp)
+        questions = [
+            {
+                "type": "confirm",
+                "message": "I understand what will happen if I continue",
+                "name": "understand",
+            },
+            {
+                "type": "confirm",
+                "message": "Would you like to continue?",
+                "name": "continue",
+            },
+        ]
+
+        step_desc = "Checking Google Earth Engine Asset Folder:"
+        with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
 
-                if "CI_ROBOT_USER" in os.environ:
-                    # If robot, don't trigger interactive questions
-                    sp = update_sp_inf_service(sp)
-                else:
-                    # Followup questions
-                    answer1 = prompt(
-                        [questions[0]], style=style, raise_keyboard_interrupt=False
-                    )
-                    if answer1 == {}:
-                        sys.exit("Exiting (Keyboard Interrupt)")
-                    if answer1["understand"] == False:
-                        sys.exit("Exiting (Did not understand)")
-                    answer2 = prompt(
-                        [questions[1]], style=style, raise_keyboard_interrupt=False
-                    )
-                    if answer2 == {}:
-                        sys.exit("Exiting (Keyboard Interrupt)")
-                    if answer2["continue"] == False:
-                        sys.exit("Exiting (No continue)")
-                    sp.write("")
+            try:
+                existing_tasks = heet_task.existing_tasks_running()
+                existing_files = heet_task.existing_job_files()
+            except Exception:
+                # Handles any issue, including connectivity
+                sp = update_sp_err_fatal(sp)
+                sys.exit()
             else:
-                sp = update_sp_success(sp)
+                if (existing_tasks == True) or (existing_files == True):
+                    sp = update_sp_fail(sp)
 
-    # ==========================================================================
-    # Prepare asset folder
-    # ==========================================================================
-    step_desc = "Preparing Google Earth Engine Asset Folder"
-    with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+                    if existing_tasks == True:
+                        sp = update_sp_err_running(sp, cfg.heet_folder, cfg.task_prefix)
+                    elif existing_files == True:
+                        sp = update_sp_err_interrupted(
+                            sp, cfg.heet_folder, cfg.task_prefix
+                        )
+
+                    if "CI_ROBOT_USER" in os.environ:
+                        # If robot, don't trigger interactive questions
+                        sp = update_sp_inf_service(sp)
+                    else:
+                        # Followup questions
+                        answer1 = prompt(
+                            [questions[0]], style=style, raise_keyboard_interrupt=False
+                        )
+                        if answer1 == {}:
+                            sys.exit("Exiting (Keyboard Interrupt)")
+                        if answer1["understand"] == False:
+                            sys.exit("Exiting (Did not understand)")
+                        answer2 = prompt(
+                            [questions[1]], style=style, raise_keyboard_interrupt=False
+                        )
+                        if answer2 == {}:
+                            sys.exit("Exiting (Keyboard Interrupt)")
+                        if answer2["continue"] == False:
+                            sys.exit("Exiting (No continue)")
+                        sp.write("")
+                else:
+                    sp = update_sp_success(sp)
+
+        # ==========================================================================
+        # Prepare asset folder
+        # ==========================================================================
+        step_desc = "Preparing Google Earth Engine Asset Folder"
+        with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+
+            if existing_tasks == True:
+                try:
+                    heet_task.kill_all_heet_tasks()
+                    heet_task.wait_until_jobs_finish()
+                except Exception:
+                    # Handles any issue, including connectivity
+                    sp = update_sp_fail(sp)
+                    sp = update_sp_err_fatal(sp)
+                    sys.exit()
 
-        if existing_tasks == True:
             try:
-                heet_task.kill_all_heet_tasks()
-                heet_task.wait_until_jobs_finish()
+                heet_task.prepare_gee_assets_folder()
             except Exception:
                 # Handles any issue, including connectivity
                 sp = update_sp_fail(sp)
                 sp = update_sp_err_fatal(sp)
                 sys.exit()
+            else:
+                sp = update_sp_success(sp)
 
-        try:
-            heet_task.prepare_gee_assets_folder()
-        except Exception:
-            # Handles any issue, including connectivity
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_fatal(sp)
-            sys.exit()
-        else:
-            sp = update_sp_success(sp)
-
-    # ==========================================================================
-    # Upload input file
-    # ==========================================================================
-    step_desc = "Uploading input file to Google Earth Engine"
-    with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
+        # ==========================================================================
+        # Upload input file
+        # ==========================================================================
+        step_desc = "Uploading input file to Google Earth Engine"
+        with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
 
-        try:
-            df = heet_validate.prepare_input_table(df_inputs)
-        except Exception:
-            # Handles any issue, including connectivity
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_fatal(sp)
-            logger.exception(
-                "[heet_cli] There was a problem preparing input file.  Exiting..."
-            )
-            sys.exit()
+            try:
+                df = heet_validate.prepare_input_table(df_inputs)
+            except Exception:
+                # Handles any issue, including connectivity
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_fatal(sp)
+                logger.exception(
+                    "[heet_cli] There was a problem preparing input file.  Exiting..."
+                )
+                sys.exit()
 
-        try:
-            inputs_ftc = heet_export.df_to_ee(df)
-        except Exception:
-            # Handles any issue, including connectivity
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_fatal(sp)
-            logger.exception(
-                "[heet_cli] There was a problem converting input file from df to ftc.  Exiting..."
-            )
-            sys.exit()
+            try:
+                inputs_ftcs = heet_export.df_to_ee_chunks(df)
+            except Exception:
+                # Handles any issue, including connectivity
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_fatal(sp)
+                logger.exception(
+                    "[heet_cli] There was a problem converting input file from df to ftc.  Exiting..."
+                )
+                sys.exit()
 
-        try:
-            upload_task = heet_export.upload_user_inputs(inputs_ftc)
-        except Exception:
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_upload(sp)
-            logger.exception(
-                "[heet_cli] There was a problem uploading user inputs to Google Earth Engine. Exiting..."
-            )
-            sys.exit()
+            try:
+                upload_task = heet_task.upload_user_inputs(inputs_ftcs)
+            except Exception:
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_upload(sp)
+                logger.exception(
+                    "[heet_cli] There was a problem uploading user inputs to Google Earth Engine. Exiting..."
+                )
+                sys.exit()
 
-        try:
-            heet_task.wait_until_upload(upload_task)
-        except polling2.TimeoutException:
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_upload(sp)
-            logger.info(
-                "[heet_cli] Uploading user inputs to Google Earth Engine timed out. Exiting..."
-            )
-            sys.exit()
-        except Exception:
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_upload(sp)
-            logger.exception(
-                "[heet_cli] There was a problem uploading user inputs to Google Earth Engine. Exiting..."
-            )
+            try:
+                heet_task.wait_until_upload(upload_task)
+            except polling2.TimeoutException:
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_upload(sp)
+                logger.info(
+                    "[heet_cli] Uploading user inputs to Google Earth Engine timed out. Exiting..."
+                )
+                sys.exit()
+            except Exception:
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_upload(sp)
+                logger.exception(
+                    "[heet_cli] There was a problem uploading user inputs to Google Earth Engine. Exiting..."
+                )
 
-        try:
-            upload_success = upload_task.status()["state"] in ["COMPLETED"]
-        except Exception:
-            sp = update_sp_fail(sp)
-            sp = update_sp_err_upload(sp)
-            logger.debug(
-                "[heet_cli] There was a problem uploading user inputs to Google Earth Engine. Exiting..."
-            )
+            try:
+                upload_success = upload_task.status()["state"] in ["COMPLETED"]
+            except Exception:
+                sp = update_sp_fail(sp)
+                sp = update_sp_err_upload(sp)
+                logger.debug(
+                    "[heet_cli] There was a problem uploading user inputs to Google Earth Engine. Exiting..."
+                )
 
-        if upload_success == True:
-            sp = update_sp_success(sp)
-        else:
-            sp = update_sp_fail(sp)
+            if upload_success == True:
+                sp = update_sp_success(sp)
+            else:
+                sp = update_sp_fail(sp)
 
     # ==========================================================================
     # Run Analysis
@@ -755,7 +967,7 @@ def main():
         try:
             sp = update_sp_success(sp)
             pbar = tqdm(total=n_calcs, ncols=80)
-            status = heet_task.run_analysis(pbar)
+            status = heet_task.run_analysis(pbar, resume=resume)
         except Exception:
             # Handles any issue, including connectivity
             sp = update_sp_fail(sp)
@@ -895,35 +1107,36 @@ def main():
         else:
             sp = update_sp_chose_skip(sp)
     # ==========================================================================
-    # Exporting Results (Json, local Folder)
+    # Exporting CSV Results
     # ==========================================================================
-    step_desc = "Downloading json results to local results folder"
+    step_desc = "Downloading csv results to local results folder"
     with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
 
         try:
-            heet_export.batch_export_to_json(output_folder_path)
+            heet_export.download_output_parameters(output_folder_path)
         except Exception:
             # Handles any issue, including connectivity
             sp = update_sp_fail(sp)
             sp = update_sp_warn_skip(sp)
-            logger.exception(
-                "[batch_export_to_json] Problem exporting output parameters to json"
-            )
         else:
             sp = update_sp_success(sp)
 
     # ==========================================================================
-    # Exporting CSV Results
+    # Exporting Results (Json, local Folder)
     # ==========================================================================
-    step_desc = "Downloading csv results to local results folder"
+    step_desc = "Downloading json results to local results folder"
     with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
 
+        # The json results are built from the downloaded csv results
         try:
-            heet_export.download_output_parameters(output_folder_path)
+            heet_export.batch_export_to_json(output_folder_path)
         except Exception:
             # Handles any issue, including connectivity
             sp = update_sp_fail(sp)
             sp = update_sp_warn_skip(sp)
+            logger.exception(
+                "[batch_export_to_json] Problem exporting output parameters to json"
+            )
         else:
             sp = update_sp_success(sp)
 
@@ -1032,7 +1245,7 @@ def main():
     with yaspin(Spinners.line, text=step_desc, color="yellow") as sp:
 
         try:
-            heet_task.clear_tmp_folder()
+            heet_task.clear_tmp_folder(remove_folder=True)
         except Exception:
             # Handles any issue, including connectivity
             sp = update_sp_fail(sp)
@@ -1076,6 +1289,12 @@ def main():
                 f"  https://code.earthengine.google.com/1edb73329689c90315aa8307336208cb?noload=true"
             )
         sp.write("")
+        poll_counts = ", ".join(
+            f"{loop_name}: {n_polls}" for loop_name, n_polls in mtr.poll_schedule.polls.items()
+        )
+        sp.write(f"Task queue polls: {mtr.poll_schedule.total_polls} ({poll_counts})")
+        logger.info(f"[heet_cli] Task queue polls: {mtr.poll_schedule.total_polls} ({poll_counts})")
+        sp.write("")
         sp.write("Thank you for using HEET!")
 
 
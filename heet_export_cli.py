@@ -111,7 +111,7 @@ def update_sp_warn_skip(sp):
 
 
 def update_sp_err_time(sp):
-    current_active_analyses = ",".join([str(i) for i in mtr.active_analyses])
+    current_active_analyses = ",".join([str(i) for i in mtr.pipeline.active])
     sp.write(
         "  [WARNING] Analysis wait time limit exceeded. Cancelling all unfinished HEET EXPORTER"
     )
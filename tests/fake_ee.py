@@ -0,0 +1,392 @@
+""" In-process fakes of the Earth Engine task services used for testing task
+    monitoring and orchestration offline (without Earth Engine quota).
+
+    FakeOperationsService moves tasks between states when told to by a test.
+    SimulatedOperationsService runs tasks on its own, with queue waits, run
+    times, EECU usage and failures sampled from the task logs of recorded
+    runs (tasks.csv), and keeps the assets written by completed exports
+    (listAssets, getAsset, deleteAsset, renameAsset) """
+import csv
+import heapq
+import random
+import threading
+import datetime
+import itertools
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+# Operation states (as reported by ee.data.listOperations())
+OPERATION_DONE_STATES = ["SUCCEEDED", "CANCELLED", "FAILED"]
+
+
+def timestamp(epoch_ms: int) -> str:
+    """Format epoch milliseconds as a google.protobuf.Timestamp string"""
+    time = datetime.datetime.utcfromtimestamp(epoch_ms / 1000)
+    return time.strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+
+class FakeTask:
+    """Stand-in for ee.batch.Task backed by a FakeOperationsService"""
+
+    def __init__(self, service, config: dict, task_type: str = "EXPORT_FEATURES"):
+        self.service = service
+        self.config = config
+        self.task_type = task_type
+        self.id = None
+        self.name = None
+
+    def start(self) -> None:
+        self.service.start(self)
+
+    def status(self) -> dict:
+        self.service.status_calls = self.service.status_calls + 1
+        if self.id is None:
+            return {"state": "UNSUBMITTED"}
+        return self.service.task_status(self.id)
+
+    def cancel(self) -> None:
+        self.service.cancel_operation(self.name)
+
+
+class FakeOperationsService:
+    """Fake of the EE operations service.
+
+    Tasks are started with start() (or FakeTask.start()) and are moved
+    between states by the test with set_state(). listOperations() mimics
+    ee.data.listOperations(), paging through operations page_size at a time;
+    list_calls counts listings and page_requests counts the pages served.
+    """
+
+    def __init__(
+        self,
+        page_size: int = 500,
+        project: str = "projects/earthengine-legacy",
+        clock_ms: int = 1667407197000,
+    ):
+        self.page_size = page_size
+        self.project = project
+        self.clock_ms = clock_ms
+        self.operations: Dict[str, dict] = {}
+        self.list_calls = 0
+        self.page_requests = 0
+        self.status_calls = 0
+        self._ids = itertools.count(1)
+
+    def new_task(self, config: dict, task_type: str = "EXPORT_FEATURES") -> FakeTask:
+        """Create an unsubmitted task"""
+        return FakeTask(self, config, task_type)
+
+    def submit(self, description: str, task_type: str = "EXPORT_FEATURES") -> FakeTask:
+        """Create and start a task"""
+        task = self.new_task({"description": description}, task_type)
+        task.start()
+        return task
+
+    def start(self, task: FakeTask) -> None:
+        task_id = "FAKE" + str(next(self._ids)).zfill(20)
+        task.id = task_id
+        task.name = self.project + "/operations/" + task_id
+        now = timestamp(self.clock_ms)
+        self.operations[task_id] = {
+            "name": task.name,
+            "metadata": {
+                "@type": "type.googleapis.com/google.earthengine.v1alpha.OperationMetadata",
+                "state": "PENDING",
+                "description": task.config.get("description", ""),
+                "createTime": now,
+                "updateTime": now,
+                "type": task.task_type,
+                "attempt": 1,
+            },
+        }
+
+    def set_state(
+        self, task_id: str, state: str, error_message: Optional[str] = None
+    ) -> None:
+        """Move a task to a new operation state (PENDING, RUNNING, SUCCEEDED,
+        FAILED, CANCELLED)"""
+        operation = self.operations[task_id]
+        metadata = operation["metadata"]
+        metadata["state"] = state
+        metadata["updateTime"] = timestamp(self.clock_ms)
+        if state == "RUNNING" and "startTime" not in metadata:
+            metadata["startTime"] = timestamp(self.clock_ms)
+        if state in OPERATION_DONE_STATES:
+            operation["done"] = True
+            if state == "FAILED":
+                operation["error"] = {"message": error_message or "Unknown error"}
+
+    def task_status(self, task_id: str) -> dict:
+        operation = self.operations.get(task_id)
+        if operation is None:
+            return {"id": task_id, "state": "UNKNOWN"}
+        # Import here; status conversion is only needed when tasks are polled
+        from ee import _cloud_api_utils
+
+        return _cloud_api_utils.convert_operation_to_task(operation)
+
+    def cancel_operation(self, name: str) -> None:
+        task_id = name.split("/")[-1]
+        if self.operations[task_id]["metadata"]["state"] not in OPERATION_DONE_STATES:
+            self.set_state(task_id, "CANCELLED")
+
+    def listOperations(self, project: Optional[str] = None) -> List[dict]:
+        """Paginated listing of all operations (newest first, as EE does)"""
+        self.list_calls = self.list_calls + 1
+        all_operations = list(reversed(list(self.operations.values())))
+        operations = []
+        for start in range(0, max(len(all_operations), 1), self.page_size):
+            self.page_requests = self.page_requests + 1
+            operations += all_operations[start : start + self.page_size]
+        return operations
+
+
+# =============================================================================
+#  Simulation
+# =============================================================================
+
+
+class FakeEEException(Exception):
+    """Raised where the EE client raises ee.EEException"""
+
+
+class TaskProfile:
+    """Behaviour of EE tasks, by task code, sampled from recorded runs.
+
+    Args:
+        queue_waits: seconds between submission and start of recorded tasks.
+        run_times: seconds between start and completion of recorded tasks.
+        eecu_usage: EECU seconds used by recorded tasks.
+        failure_rates: fraction of tasks that fail.
+        error_messages: error messages of failed tasks (one is drawn at
+            random for each simulated failure).
+
+    Task codes without recorded tasks behave like the pooled recorded tasks.
+    """
+
+    def __init__(
+        self,
+        queue_waits: Dict[str, List[float]],
+        run_times: Dict[str, List[float]],
+        eecu_usage: Dict[str, List[float]],
+        failure_rates: Optional[Dict[str, float]] = None,
+        error_messages: Optional[List[str]] = None,
+    ):
+        self.queue_waits = queue_waits
+        self.run_times = run_times
+        self.eecu_usage = eecu_usage
+        self.failure_rates = failure_rates if failure_rates is not None else {}
+        self.error_messages = error_messages or ["Computation timed out."]
+
+    @classmethod
+    def from_tasks_csv(cls, paths: Iterable[Union[str, Path]]) -> "TaskProfile":
+        """Profile of the tasks in task logs (tasks.csv) of recorded runs"""
+        queue_waits: Dict[str, List[float]] = {}
+        run_times: Dict[str, List[float]] = {}
+        eecu_usage: Dict[str, List[float]] = {}
+        n_tasks: Dict[str, int] = {}
+        n_failed: Dict[str, int] = {}
+        error_messages = []
+        for path in paths:
+            with open(path, newline="") as tasks_file:
+                for row in csv.DictReader(tasks_file):
+                    task_code = row.get("task_code") or "unknown"
+                    n_tasks[task_code] = n_tasks.get(task_code, 0) + 1
+                    if row.get("state") == "FAILED":
+                        n_failed[task_code] = n_failed.get(task_code, 0) + 1
+                        if row.get("error_message"):
+                            error_messages.append(row["error_message"])
+                    if row.get("state") != "COMPLETED":
+                        continue
+                    try:
+                        created_ms = float(row["creation_timestamp_ms"])
+                        started_ms = float(row["start_timestamp_ms"])
+                        finished_ms = float(row["update_timestamp_ms"])
+                    except (KeyError, TypeError, ValueError):
+                        continue
+                    queue_waits.setdefault(task_code, []).append(max(started_ms - created_ms, 0) / 1000)
+                    run_times.setdefault(task_code, []).append(max(finished_ms - started_ms, 0) / 1000)
+                    if row.get("batch_eecu_usage_seconds"):
+                        eecu_usage.setdefault(task_code, []).append(
+                            float(row["batch_eecu_usage_seconds"])
+                        )
+        failure_rates = {
+            task_code: n_failed.get(task_code, 0) / n for task_code, n in n_tasks.items()
+        }
+        return cls(queue_waits, run_times, eecu_usage, failure_rates, error_messages)
+
+    def _samples(self, samples: Dict[str, List[float]], task_code: str) -> List[float]:
+        if task_code in samples:
+            return samples[task_code]
+        pooled = [value for values in samples.values() for value in values]
+        return pooled if len(pooled) > 0 else [0.0]
+
+    def sample(
+        self, task_code: str, rng: random.Random
+    ) -> Tuple[float, float, float, Optional[str]]:
+        """Draw (queue wait s, run time s, EECU s, error message or None)
+        for a task"""
+        queue_wait_s = rng.choice(self._samples(self.queue_waits, task_code))
+        run_time_s = rng.choice(self._samples(self.run_times, task_code))
+        eecu_s = rng.choice(self._samples(self.eecu_usage, task_code))
+        error_message = None
+        if rng.random() < self.failure_rates.get(task_code, 0.0):
+            error_message = rng.choice(self.error_messages)
+        return queue_wait_s, run_time_s, eecu_s, error_message
+
+
+class SimulatedOperationsService(FakeOperationsService):
+    """Fake of the EE operations and asset services where started tasks
+    run by themselves.
+
+    Each started task waits in the EE queue, runs and completes (or fails)
+    after times drawn from a TaskProfile, read against clock. A task that
+    completes writes its destination asset. Calls to the fake EE API are
+    counted by name in calls. Tasks can be started from several threads.
+
+    Args:
+        profile: behaviour of tasks by task code.
+        task_code: callable taking a task config, returning its task code.
+        clock: callable returning the (simulated) time in seconds since the
+            epoch. The clock can run faster than real time.
+        latency_scale: factor applied to sampled queue waits and run times.
+        failure_rate: if given, the failure rate of every task code.
+        seed: seed of the random number generator.
+    """
+
+    def __init__(
+        self,
+        profile: TaskProfile,
+        task_code: Callable[[dict], str],
+        clock: Callable[[], float],
+        latency_scale: float = 1.0,
+        failure_rate: Optional[float] = None,
+        seed: Optional[int] = None,
+        page_size: int = 500,
+        project: str = "projects/earthengine-legacy",
+    ):
+        self.clock = clock
+        super().__init__(page_size, project, int(clock() * 1000))
+        self.profile = profile
+        self.task_code = task_code
+        self.latency_scale = latency_scale
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.assets: Dict[str, dict] = {}
+        self.calls: Dict[str, int] = {}
+        # (time in ms, sequence, task id, new state) of scheduled state changes
+        self._events: List[tuple] = []
+        self._sequence = itertools.count()
+        self._outcomes: Dict[str, dict] = {}
+        self._lock = threading.RLock()
+
+    def _count(self, api_name: str) -> None:
+        self.calls[api_name] = self.calls.get(api_name, 0) + 1
+
+    def _schedule(self, at_ms: int, task_id: str, state: str) -> None:
+        heapq.heappush(self._events, (at_ms, next(self._sequence), task_id, state))
+
+    def start(self, task: FakeTask) -> None:
+        with self._lock:
+            self._count("start")
+            self.clock_ms = int(self.clock() * 1000)
+            super().start(task)
+
+            task_code = self.task_code(task.config)
+            queue_wait_s, run_time_s, eecu_s, error_message = self.profile.sample(task_code, self.rng)
+            if self.failure_rate is not None:
+                error_message = None
+                if self.rng.random() < self.failure_rate:
+                    error_message = self.rng.choice(self.profile.error_messages)
+            started_ms = self.clock_ms + int(queue_wait_s * self.latency_scale * 1000)
+            finished_ms = started_ms + int(run_time_s * self.latency_scale * 1000)
+            self._outcomes[task.id] = {
+                "eecu_s": eecu_s,
+                "error_message": error_message,
+                "asset_id": destination_asset(task.config),
+            }
+            self._schedule(started_ms, task.id, "RUNNING")
+            self._schedule(finished_ms, task.id, "FAILED" if error_message else "SUCCEEDED")
+
+    def advance(self) -> None:
+        """Apply the state changes due by the current (simulated) time"""
+        with self._lock:
+            now_ms = int(self.clock() * 1000)
+            while len(self._events) > 0 and self._events[0][0] <= now_ms:
+                at_ms, _, task_id, state = heapq.heappop(self._events)
+                metadata = self.operations[task_id]["metadata"]
+                if metadata["state"] in OPERATION_DONE_STATES:
+                    continue
+                self.clock_ms = at_ms
+                outcome = self._outcomes[task_id]
+                if state in OPERATION_DONE_STATES:
+                    metadata["batchEecuUsageSeconds"] = outcome["eecu_s"]
+                self.set_state(task_id, state, outcome["error_message"])
+                if state == "SUCCEEDED" and outcome["asset_id"] is not None:
+                    self.assets[outcome["asset_id"]] = {
+                        "type": "TABLE",
+                        "name": outcome["asset_id"],
+                        "id": outcome["asset_id"],
+                    }
+            self.clock_ms = now_ms
+
+    def listOperations(self, project: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            self._count("listOperations")
+            self.advance()
+            return super().listOperations(project)
+
+    def task_status(self, task_id: str) -> dict:
+        with self._lock:
+            self._count("status")
+            self.advance()
+            return super().task_status(task_id)
+
+    def cancel_operation(self, name: str) -> None:
+        with self._lock:
+            self._count("cancelOperation")
+            super().cancel_operation(name)
+
+    # Assets
+
+    def listAssets(self, params: dict) -> dict:
+        """Assets in params["parent"] (all in a single page)"""
+        with self._lock:
+            self._count("listAssets")
+            self.advance()
+            parent = params["parent"].rstrip("/") + "/"
+            return {"assets": [a for name, a in self.assets.items() if name.startswith(parent)]}
+
+    def getAsset(self, asset_id: str) -> dict:
+        with self._lock:
+            self._count("getAsset")
+            self.advance()
+            if asset_id not in self.assets:
+                raise FakeEEException(f"Asset '{asset_id}' not found.")
+            return self.assets[asset_id]
+
+    def deleteAsset(self, asset_id: str) -> None:
+        with self._lock:
+            self._count("deleteAsset")
+            if self.assets.pop(asset_id, None) is None:
+                raise FakeEEException(f"Asset '{asset_id}' not found.")
+
+    def renameAsset(self, source_id: str, destination_id: str) -> None:
+        with self._lock:
+            self._count("renameAsset")
+            if source_id not in self.assets:
+                raise FakeEEException(f"Asset '{source_id}' not found.")
+            if destination_id in self.assets:
+                raise FakeEEException(f"Asset '{destination_id}' already exists.")
+            asset = self.assets.pop(source_id)
+            self.assets[destination_id] = dict(asset, name=destination_id, id=destination_id)
+
+
+def destination_asset(config: dict) -> Optional[str]:
+    """Destination asset of an export task config (None for other tasks)"""
+    if "assetId" in config:
+        return config["assetId"]
+    try:
+        return config["assetExportOptions"]["earthEngineDestination"]["name"]
+    except KeyError:
+        return None
@@ -0,0 +1,122 @@
+import threading
+
+import pytest
+
+from heet_asset_ops import AssetOps, raise_failures
+from heet_retry import RetryPolicy
+
+root = "projects/earthengine-legacy/assets/users/heet/XHEET/tmp"
+
+
+class FakeAssetApi:
+    """Folder tree of assets. Deleting a folder that is not empty fails, and
+    the first call for each asset in rate_limited fails with a rate limit
+    error"""
+
+    def __init__(self, names, rate_limited=()):
+        self.types = {name: "TABLE" for name in names}
+        for name in names:
+            parent = name.rsplit("/", 1)[0]
+            while parent.startswith(root):
+                self.types[parent] = "FOLDER"
+                parent = parent.rsplit("/", 1)[0]
+        self.rate_limited = set(rate_limited)
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def _check_rate(self, name):
+        with self.lock:
+            self.calls = self.calls + 1
+            if name in self.rate_limited:
+                self.rate_limited.discard(name)
+                raise Exception(
+                    "Too Many Requests: Request was rejected because the request "
+                    + "rate or concurrency limit was exceeded."
+                )
+
+    def listAssets(self, params):
+        self._check_rate(params["parent"])
+        with self.lock:
+            return {
+                "assets": [
+                    {"name": name, "type": asset_type}
+                    for name, asset_type in sorted(self.types.items())
+                    if name.rsplit("/", 1)[0] == params["parent"]
+                ]
+            }
+
+    def deleteAsset(self, name):
+        self._check_rate(name)
+        with self.lock:
+            if name not in self.types:
+                raise Exception(f"Asset '{name}' not found.")
+            if any(other.startswith(name + "/") for other in self.types):
+                raise Exception(f"Folder '{name}' is not empty.")
+            del self.types[name]
+
+    def renameAsset(self, source, destination):
+        self._check_rate(source)
+        with self.lock:
+            if any(other.startswith(source + "/") for other in self.types):
+                raise Exception(f"Folder '{source}' is not empty.")
+            self.types[destination] = self.types.pop(source)
+
+
+def asset_ops(api):
+    return AssetOps(
+        api, max_workers=4, retry_policy=RetryPolicy(max_attempts=3, jitter=0), sleep=lambda s: None
+    )
+
+
+names = [f"{root}/C_{i}" for i in range(20)] + [
+    f"{root}/sub/R_1",
+    f"{root}/sub/deep/N_1",
+    f"{root}/sub/deep/N_2",
+]
+
+
+def test_list_tree_finds_nested_assets_parents_first():
+    """Check that every asset below the folder is listed, with folders
+    before their contents"""
+    api = FakeAssetApi(names)
+    listed = [asset["name"] for asset in asset_ops(api).list_tree(root)]
+
+    assert sorted(listed) == sorted(set(api.types) - {root})
+    assert listed.index(f"{root}/sub") < listed.index(f"{root}/sub/deep")
+    assert listed.index(f"{root}/sub/deep") < listed.index(f"{root}/sub/deep/N_1")
+
+
+def test_delete_tree_deletes_children_first_and_retries_rate_limits():
+    """Check that a folder tree is removed although folders can only be
+    deleted when empty and some calls hit a rate limit"""
+    api = FakeAssetApi(names, rate_limited=[f"{root}/C_3", f"{root}/sub/deep", f"{root}/sub"])
+
+    assert asset_ops(api).delete_tree(root, remove_folder=True) == len(names) + 3
+    assert api.types == {}
+
+
+def test_failed_deletions_are_reported():
+    """Check that deleting a missing asset is reported without stopping the
+    other deletions, and that non-transient errors are not retried"""
+    api = FakeAssetApi(names[:3])
+    ops = asset_ops(api)
+    missing = f"{root}/C_99"
+
+    failures = ops.delete([names[0], missing, names[1]])
+
+    assert [args for args, error in failures] == [(missing,)]
+    assert sorted(api.types) == [root, names[2]]
+    assert api.calls == 3
+    with pytest.raises(Exception, match="not found"):
+        raise_failures(failures)
+
+
+def test_rename_moves_children_before_parents():
+    """Check that folders are renamed after their contents"""
+    api = FakeAssetApi([f"{root}/sub/R_1", f"{root}/sub/deep/N_1"])
+    renames = [(name, name.replace("/tmp", "/out", 1)) for name in api.types if name != root]
+
+    assert asset_ops(api).rename(renames) == []
+    assert sorted(api.types) == sorted(
+        [root] + [name.replace("/tmp", "/out", 1) for name, _ in renames]
+    )
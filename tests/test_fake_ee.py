@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+from fake_ee import FakeEEException, SimulatedOperationsService, TaskProfile
+from heet_status import TaskStatusSnapshot
+
+folder = "projects/earthengine-legacy/assets/users/heet/XHEET/tmp"
+
+tasks_csv = """state,description,creation_timestamp_ms,update_timestamp_ms,start_timestamp_ms,batch_eecu_usage_seconds,task_code
+COMPLETED,XHEET-X002-1 Snapped dam locations,1000,131000,11000,60.0,subbasin_pts
+COMPLETED,XHEET-X006-1 Catchment vector,2000,44000,4000,6.5,catch_vec
+FAILED,XHEET-X006-2 Catchment vector,2000,44000,4000,,catch_vec
+"""
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1667407197.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def profile(tmp_path):
+    path = tmp_path / "tasks.csv"
+    path.write_text(tasks_csv)
+    return TaskProfile.from_tasks_csv([path])
+
+
+def test_profile_from_recorded_tasks(profile):
+    """Check that queue waits, run times, EECU usage and failure rates are
+    read from a task log"""
+    assert profile.queue_waits == {"subbasin_pts": [10.0], "catch_vec": [2.0]}
+    assert profile.run_times == {"subbasin_pts": [120.0], "catch_vec": [40.0]}
+    assert profile.eecu_usage == {"subbasin_pts": [60.0], "catch_vec": [6.5]}
+    assert profile.failure_rates == {"subbasin_pts": 0.0, "catch_vec": 0.5}
+    # Unrecorded task codes behave like the pooled recorded tasks
+    assert profile.sample("res_vec", random.Random(0))[1] in [120.0, 40.0]
+
+
+def test_simulated_tasks_run_and_write_assets(profile):
+    """Check that a started task is queued, runs and completes after the
+    recorded times and that its asset is written"""
+    clock = Clock()
+    service = SimulatedOperationsService(
+        profile, lambda config: "subbasin_pts", clock, failure_rate=0.0
+    )
+    task = service.new_task({"description": "XHEET-X002-1 Snapped", "assetId": folder + "/PS_1"})
+    task.start()
+
+    states = []
+    for elapsed_s in [5, 10, 129, 130]:
+        clock.now = 1667407197.0 + elapsed_s
+        states.append(TaskStatusSnapshot(service.listOperations()).state(task))
+    assert states == ["READY", "RUNNING", "RUNNING", "COMPLETED"]
+
+    status = TaskStatusSnapshot(service.listOperations()).status(task)
+    assert status["batch_eecu_usage_seconds"] == 60.0
+    assert service.listAssets({"parent": folder})["assets"][0]["name"] == folder + "/PS_1"
+    assert service.calls == {"start": 1, "listOperations": 5, "listAssets": 1}
+
+
+def test_simulated_failures(profile):
+    """Check that failing tasks report an error message and write no asset"""
+    clock = Clock()
+    service = SimulatedOperationsService(
+        profile, lambda config: "catch_vec", clock, failure_rate=1.0
+    )
+    task = service.new_task({"description": "XHEET-X006-1 Catchment", "assetId": folder + "/c_1"})
+    task.start()
+    clock.now = clock.now + 60
+
+    status = TaskStatusSnapshot(service.listOperations()).status(task)
+    assert status["state"] == "FAILED"
+    assert status["error_message"] == "Computation timed out."
+    assert service.listAssets({"parent": folder})["assets"] == []
+
+
+def test_asset_housekeeping(profile):
+    """Check renaming, deleting and getting simulated assets"""
+    service = SimulatedOperationsService(profile, lambda config: "catch_vec", Clock())
+    service.assets[folder + "/c_1"] = {"type": "TABLE", "name": folder + "/c_1"}
+
+    service.renameAsset(folder + "/c_1", folder + "/C_1")
+    assert service.getAsset(folder + "/C_1")["name"] == folder + "/C_1"
+    with pytest.raises(FakeEEException):
+        service.getAsset(folder + "/c_1")
+
+    service.deleteAsset(folder + "/C_1")
+    with pytest.raises(FakeEEException):
+        service.deleteAsset(folder + "/C_1")
+    assert service.calls["deleteAsset"] == 2
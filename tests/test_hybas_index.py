@@ -0,0 +1,141 @@
+import pytest
+
+from heet_hybas_index import HybasIndex, UpstreamCascade, basin_level, read_basin_tables
+
+# Extract of three HydroBASINS-like levels: one level 1 basin, its nine
+# Pfafstetter sub-basins (11-19) and their sub-basins at level 3 (basins 11
+# and 13 subdivided, the others kept whole with a trailing 0)
+extract_path = "tests/data/hybas_extract.csv"
+
+
+def hybas_id(pfaf_id):
+    return 1000000000 * basin_level(pfaf_id) + pfaf_id
+
+
+def test_read_basin_tables():
+    """Check that basins are grouped by level from their Pfafstetter code"""
+    levels = read_basin_tables([extract_path])
+
+    assert sorted(levels) == [1, 2, 3]
+    assert len(levels[2]) == 9
+    assert (hybas_id(113), hybas_id(111), 113) in levels[3]
+
+
+def test_ancestors_follow_next_down():
+    """Check that the upstream basins of a basin are all the basins that
+    drain into it, directly or through other basins"""
+    index = HybasIndex.from_rows(read_basin_tables([extract_path]))
+
+    assert sorted(index.ancestors(hybas_id(13), level=2)) == [
+        hybas_id(p) for p in [14, 15, 16, 17, 18, 19]
+    ]
+    assert sorted(index.ancestors(hybas_id(135), level=3)) == [
+        hybas_id(p) for p in [136, 137, 138, 139, 140, 150, 160, 170, 180, 190]
+    ]
+    # Nearest first
+    assert index.ancestors(hybas_id(170), level=3)[:2] in (
+        [hybas_id(180), hybas_id(190)],
+        [hybas_id(190), hybas_id(180)],
+    )
+    assert index.ancestors(hybas_id(190), level=3) == []
+    assert len(index.ancestors(hybas_id(111), level=3)) == 24
+
+
+def test_parents():
+    """Check that basins point to the basin containing them at the level above"""
+    index = HybasIndex.from_rows(read_basin_tables([extract_path]))
+
+    assert index.parent(hybas_id(135), level=3) == hybas_id(13)
+    assert index.parent(hybas_id(120), level=3) == hybas_id(12)
+    assert index.parent(hybas_id(12), level=2) == hybas_id(1)
+    assert index.parent(hybas_id(1), level=1) is None
+
+
+def test_index_survives_saving(tmp_path):
+    """Check that a saved index is read back with the same topology"""
+    index = HybasIndex.from_rows(read_basin_tables([extract_path]))
+    index.save(tmp_path / "hybas_index.sqlite")
+
+    loaded = HybasIndex.load(tmp_path / "hybas_index.sqlite")
+
+    assert sorted(loaded.levels) == [1, 2, 3]
+    for pfaf_id in [111, 113, 131, 150]:
+        assert loaded.ancestors(hybas_id(pfaf_id), level=3) == index.ancestors(
+            hybas_id(pfaf_id), level=3
+        )
+    assert loaded.parent(hybas_id(135), level=3) == hybas_id(13)
+
+
+def scan_bounding_level(level_rows, pfaf_id):
+    """Bounding level as found by heet_basins.find_hybas_bounding_level: the
+    basin containing the dam is looked up at every level, and the level is
+    kept if no basin has it as NEXT_DOWN"""
+    bounding_level = 1
+    for level in sorted(level_rows):
+        code = int(str(pfaf_id)[:level])
+        containing = [row[0] for row in level_rows[level] if row[2] == code]
+        parents = [row for row in level_rows[level] if row[1] in containing]
+        if len(parents) == 0:
+            bounding_level = level
+    return bounding_level
+
+
+def test_bounding_levels_match_level_scan():
+    """Check that bounding levels resolved from Pfafstetter codes are those
+    of the level by level search, for every basin of the extract"""
+    level_rows = read_basin_tables([extract_path])
+    index = HybasIndex.from_rows(level_rows)
+    pfaf_ids = [row[2] for row in level_rows[3]]
+
+    resolved = index.bounding_levels(pfaf_ids)
+
+    assert len(resolved) == len(pfaf_ids)
+    for pfaf_id, (level, code) in zip(pfaf_ids, resolved):
+        assert level == scan_bounding_level(level_rows, pfaf_id)
+        assert code == str(pfaf_id)[:level]
+
+    # Recorded cases: a headwater basin, a tributary and a main stem basin
+    assert index.bounding_levels([190, 112, 135]) == [(3, "190"), (3, "112"), (1, "1")]
+
+
+def test_cascade_reuses_upstream_dams():
+    """Check that dams ordered upstream to downstream get the same upstream
+    basins, built from the results of the dams above them"""
+    index = HybasIndex.from_rows(read_basin_tables([extract_path]))
+    # A cascade on the main stem and a dam on a tributary
+    dam_basins = {
+        1: hybas_id(111),
+        2: hybas_id(190),
+        3: hybas_id(150),
+        4: hybas_id(135),
+        5: hybas_id(116),
+    }
+    cascade = UpstreamCascade(index, level=3)
+
+    order = cascade.order(dam_basins.keys(), dam_basins)
+
+    assert order.index(2) < order.index(3) < order.index(4) < order.index(1)
+    for dam_id in order:
+        assert sorted(cascade.ancestors(dam_basins[dam_id])) == sorted(
+            index.ancestors(dam_basins[dam_id], level=3)
+        )
+    # 150 reuses 190 (a headwater), 135 reuses 150 and 111 reuses 135 and
+    # 116 (a headwater)
+    assert cascade.reused_searches == 3
+    assert cascade.reused_basins == 0 + 4 + 10
+
+
+def test_cascade_basin_not_in_index():
+    """Check that a basin missing from the index raises a KeyError (the
+    dam is then failed; see heet_basins.batch_find_upstream_basins) and does
+    not affect the other searches"""
+    index = HybasIndex.from_rows(read_basin_tables([extract_path]))
+    cascade = UpstreamCascade(index, level=3)
+
+    with pytest.raises(KeyError):
+        cascade.ancestors(hybas_id(999))
+
+    assert sorted(cascade.ancestors(hybas_id(150))) == sorted(
+        index.ancestors(hybas_id(150), level=3)
+    )
+    assert cascade.order([1, 2], {1: hybas_id(999), 2: hybas_id(150)}) == [2, 1]
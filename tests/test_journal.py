@@ -0,0 +1,182 @@
+import pytest
+
+from heet_assets import (
+    add_batch_asset,
+    dam_error_code,
+    index_assets,
+    parse_asset_name,
+    parse_batch_asset_name,
+)
+from heet_journal import RunJournal, completed_stages_from_assets
+from heet_pipeline import DamPipeline, DONE
+
+critical_path = [
+    "subbasin_pts",
+    "catch_vec",
+    "catch_vec_params",
+    "res_vec",
+    "res_vec_params",
+    "nic_vec",
+    "nic_vec_params",
+    "mriv_vec",
+    "mriv_vec_params",
+]
+
+stage_prefixes = {
+    "subbasin_pts": "PS_",
+    "catch_vec": "c_",
+    "catch_vec_params": "C_",
+    "res_vec": "r_",
+    "res_vec_params": "R_",
+    "nic_vec": "n_",
+    "nic_vec_params": "N_",
+    "mriv_vec": "ms_",
+    "mriv_vec_params": "MS_",
+}
+
+folder = "projects/earthengine-legacy/assets/users/heet/XHEET/tmp"
+
+
+def asset(name):
+    return {"type": "TABLE", "name": folder + "/" + name}
+
+
+def test_journal_survives_reopening(tmp_path):
+    """Check that tasks, dam stages and metadata are persisted"""
+    journal_path = tmp_path / "journal.sqlite"
+    journal = RunJournal(journal_path)
+    journal.set_meta("jobname", "TEST")
+    journal.record_task("subbasin_pts", "1", "TASK1", folder + "/PS_1", "XHEET-X002-1")
+    journal.record_task("subbasin_pts", "1", "TASK2", folder + "/PS_1", "XHEET-X002-1")
+    journal.record_task("catch_vec", "2", "TASK3", folder + "/c_2", "XHEET-X006-2")
+    journal.record_stage(1, "catch_vec")
+    journal.record_stage(1, "catch_vec_params")
+    journal.close()
+
+    journal = RunJournal(journal_path)
+
+    assert journal.get_meta("jobname") == "TEST"
+    assert journal.get_meta("missing", "default") == "default"
+    assert journal.dam_stages() == {1: "catch_vec_params"}
+    assert [t["task_id"] for t in journal.tasks()] == ["TASK1", "TASK2", "TASK3"]
+    assert [t["task_id"] for t in journal.tasks("catch_vec")] == ["TASK3"]
+    # A resubmitted task replaces the earlier one
+    assert journal.latest_tasks()[("subbasin_pts", "1")]["task_id"] == "TASK2"
+    journal.close()
+
+
+def test_parse_asset_name():
+    """Check that per-dam task outputs are recognised from the asset name"""
+    assert parse_asset_name(folder + "/C_12") == ("C_", 12)
+    assert parse_asset_name(folder + "/ms_3") == ("ms_", 3)
+    assert parse_asset_name("PS_7") == ("PS_", 7)
+    assert parse_asset_name(folder + "/user_inputs") is None
+    assert parse_asset_name(folder + "/output_parameters") is None
+
+
+def test_completed_stages_from_assets():
+    """Check that the furthest completed stage of each dam is found from the
+    assets of an interrupted run"""
+    assets = [
+        asset("user_inputs"),
+        # Dam 1 finished
+        asset("PS_1"),
+        asset("C_1"),
+        asset("R_1"),
+        asset("N_1"),
+        asset("MS_1"),
+        # Dam 2 waiting for reservoir parameters
+        asset("PS_2"),
+        asset("C_2"),
+        asset("r_2"),
+        # Dam 3 snapped only
+        asset("PS_3"),
+    ]
+    index = index_assets(assets)
+
+    assert sorted(index["PS_"]) == [1, 2, 3]
+    assert completed_stages_from_assets(index, critical_path, stage_prefixes) == {
+        1: "mriv_vec_params",
+        2: "res_vec",
+        3: "subbasin_pts",
+    }
+
+
+def test_dam_error_codes_from_assets():
+    """Check that each dam's error code follows from the first missing
+    profiled output"""
+    assets = [asset("PS_1"), asset("C_1"), asset("R_1"), asset("N_1"), asset("MS_1")]
+    assets += [asset("PS_2"), asset("C_2"), asset("R_2"), asset("N_2")]
+    assets += [asset("PS_3"), asset("C_3"), asset("r_3")]
+    assets += [asset("PS_4"), asset("c_4")]
+    # An output after a missing one is ignored
+    assets += [asset("C_5")]
+    index = index_assets(assets)
+
+    assert [dam_error_code(index, dam_id) for dam_id in range(1, 6)] == [0, 5, 3, 2, 1]
+
+
+def test_batch_tables_in_asset_index():
+    """Check that a batch table is recognised from its name and indexed under
+    each of its dams, without replacing a dam's own asset"""
+    assert parse_batch_asset_name(folder + "/C_batch_12") == ("C_", 12)
+    assert parse_batch_asset_name(folder + "/C_12") is None
+    assert parse_asset_name(folder + "/C_batch_12") is None
+
+    assets = [asset("PS_1"), asset("PS_2"), asset("C_2"), asset("C_batch_1")]
+    index = index_assets(assets)
+    add_batch_asset(index, "C_", assets[-1], [1, 2])
+
+    assert index["C_"][1]["batch"] is True
+    assert index["C_"][1]["name"] == folder + "/C_batch_1"
+    assert "batch" not in index["C_"][2]
+    assert [dam_error_code(index, dam_id) for dam_id in [1, 2]] == [3, 3]
+
+
+def test_snapped_points_batch_table():
+    """Check that the dams of a batch table of snapped points are no longer
+    reported as failing to snap"""
+    assets = [asset("PS_batch_3"), asset("C_4")]
+    index = index_assets(assets)
+    add_batch_asset(index, "PS_", assets[0], [3, 4, 5])
+
+    assert [dam_error_code(index, dam_id) for dam_id in [3, 4, 5, 6]] == [2, 3, 2, 1]
+
+
+def test_pipeline_restore_and_record(tmp_path):
+    """Check that a resumed pipeline restarts each dam after its last
+    completed stage and that state changes are recorded in the journal"""
+    journal = RunJournal(tmp_path / "journal.sqlite")
+    triggered = []
+    actions = {
+        stage: (lambda ids, stage=stage: triggered.append((stage, ids)))
+        for stage in critical_path
+    }
+    pipeline = DamPipeline(critical_path, actions, on_change=journal.record_stage)
+
+    assert pipeline.restore(1, "mriv_vec_params") == DONE
+    assert pipeline.restore(2, "res_vec") == "res_vec_params"
+    assert pipeline.restore(4, None) == "subbasin_pts"
+    assert triggered == []
+
+    pipeline.trigger("res_vec", [2])
+    pipeline.complete(2, "res_vec_params")
+
+    assert triggered == [("res_vec", [2]), ("res_vec_params", [2])]
+    assert journal.dam_stages() == {1: DONE, 2: "nic_vec", 4: "subbasin_pts"}
+    journal.close()
+
+
+def test_meta_mismatches(tmp_path):
+    """Check that a resume in another job namespace is detected"""
+    journal = RunJournal(tmp_path / "journal.sqlite")
+    journal.set_meta("jobname", "TEST")
+    journal.set_meta("ps_heet_folder", folder)
+
+    assert journal.meta_mismatches(
+        {"jobname": "TEST", "ps_heet_folder": folder, "task_prefix": "XHEET-"}
+    ) == {}
+    assert journal.meta_mismatches(
+        {"jobname": "TEST", "ps_heet_folder": folder + "-S1"}
+    ) == {"ps_heet_folder": (folder, folder + "-S1")}
+    journal.close()
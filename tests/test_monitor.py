@@ -0,0 +1,60 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import heet_monitor as mtr
+
+task_code = "catch_pix"
+
+
+def test_tasks_logged_from_workers_during_poll():
+    """Check that the task logs can be read (as by heet_task.observe_tasks
+    and process_new_results) while stage actions log exports from worker
+    threads"""
+    n_workers = 4
+    n_tasks = 2000
+    started = threading.Barrier(n_workers + 1, timeout=5)
+
+    def export_tasks(worker):
+        started.wait()
+        for i in range(n_tasks):
+            mtr.log_task(task_code, f"{worker}-{i}", object())
+
+    try:
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            futures = [executor.submit(export_tasks, worker) for worker in range(n_workers)]
+            started.wait()
+            n_polls = 0
+            while True:
+                workers_done = all(future.done() for future in futures)
+                task_logs = dict(mtr.all_tasks_log)
+                task_logs["drive_export"] = mtr.all_export_tasks_log
+                mtr.logged_tasks(task_logs)
+                for key, task in mtr.task_log_items(mtr.active_tasks_log[task_code]):
+                    mtr.drop_active_task(task_code, key, task)
+                n_polls = n_polls + 1
+                if workers_done:
+                    break
+            for future in futures:
+                future.result()
+
+        assert n_polls > 1
+        assert len(mtr.all_tasks_log[task_code]) == n_workers * n_tasks
+        assert len(mtr.active_tasks_log[task_code]) == 0
+    finally:
+        mtr.all_tasks_log[task_code].clear()
+        mtr.active_tasks_log[task_code].clear()
+
+
+def test_replaced_task_stays_active():
+    """Check that a finished task is not removed from the active log once a
+    new task (e.g. a retry) has replaced it"""
+    first, retry = object(), object()
+    try:
+        mtr.log_task(task_code, "1", first)
+        mtr.log_task(task_code, "1", retry)
+        mtr.drop_active_task(task_code, "1", first)
+
+        assert mtr.active_tasks_log[task_code]["1"] is retry
+    finally:
+        mtr.all_tasks_log[task_code].clear()
+        mtr.active_tasks_log[task_code].clear()
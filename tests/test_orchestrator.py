@@ -0,0 +1,141 @@
+import asyncio
+import threading
+
+import pytest
+
+from fake_ee import FakeOperationsService, OPERATION_DONE_STATES
+from heet_orchestrator import Orchestrator
+from heet_pipeline import DamPipeline
+from heet_poll import PollSchedule
+from heet_queue import SubmissionQueue
+from heet_status import TaskStatusMonitor, description_pattern
+
+stages = ["subbasin_pts", "catch_vec", "catch_vec_params"]
+task_prefix = "XHEET-JOB-X"
+
+
+class FakeAnalysis:
+    """Critical path of a batch of dams run against a fake EE task service.
+    Every listing of operations completes the tasks that were running and
+    starts the tasks that were pending"""
+
+    def __init__(self, dam_ids, max_tasks_in_flight=4, max_workers=4, complete=True):
+        self.service = FakeOperationsService()
+        self.queue = SubmissionQueue(stages)
+        self.pipeline = DamPipeline(stages, {stage: self.submit_next_stage for stage in stages})
+        self.active_tasks = {}
+        self.complete = complete
+        self.max_seen_in_flight = 0
+        self.orchestrator = Orchestrator(
+            self.pipeline,
+            self.queue,
+            TaskStatusMonitor(self.list_operations),
+            self.process,
+            lambda snapshot: len(snapshot.active(description_pattern(task_prefix))),
+            max_tasks_in_flight,
+            PollSchedule(min_step_s=0.001, max_step_s=0.001),
+            max_workers=max_workers,
+            timeout_s=0.5,
+        )
+        self.pipeline.start(dam_ids)
+        for dam_id in dam_ids:
+            self.submit(stages[0], dam_id)
+
+    def submit(self, stage, dam_id):
+        task = self.service.new_task(
+            {"description": f"{task_prefix}00{stages.index(stage) + 1}-{dam_id} {stage}"}
+        )
+        self.active_tasks[(stage, dam_id)] = task
+        self.queue.put(stage, str(dam_id), task.start)
+
+    def submit_next_stage(self, dam_ids):
+        for dam_id in dam_ids:
+            if self.pipeline.is_active(dam_id):
+                self.submit(self.pipeline.state(dam_id), dam_id)
+
+    def list_operations(self):
+        unfinished = [
+            task_id
+            for task_id, operation in list(self.service.operations.items())
+            if operation["metadata"]["state"] not in OPERATION_DONE_STATES
+        ]
+        self.max_seen_in_flight = max(self.max_seen_in_flight, len(unfinished))
+        for task_id in unfinished:
+            state = self.service.operations[task_id]["metadata"]["state"]
+            if state == "PENDING":
+                self.service.set_state(task_id, "RUNNING")
+            elif self.complete:
+                self.service.set_state(task_id, "SUCCEEDED")
+        return self.service.listOperations()
+
+    def process(self, snapshot):
+        n_completed = 0
+        for (stage, dam_id), task in list(self.active_tasks.items()):
+            state = snapshot.state(task)
+            if state == "COMPLETED":
+                del self.active_tasks[(stage, dam_id)]
+                self.pipeline.complete(dam_id, stage)
+                n_completed = n_completed + 1
+            if state == "FAILED":
+                del self.active_tasks[(stage, dam_id)]
+                self.pipeline.fail(dam_id)
+        return n_completed
+
+    def run(self):
+        return asyncio.run(self.orchestrator.run())
+
+
+@pytest.mark.parametrize("max_tasks_in_flight", [1, 4])
+def test_every_dam_completes_within_in_flight_limit(max_tasks_in_flight):
+    """Check that all dams go through the critical path and that the number
+    of unfinished tasks stays within the limit"""
+    dam_ids = list(range(1, 11))
+    analysis = FakeAnalysis(dam_ids, max_tasks_in_flight=max_tasks_in_flight)
+
+    assert analysis.run() == 0
+    assert sorted(analysis.pipeline.done) == dam_ids
+    assert analysis.pipeline.completed_steps == len(dam_ids) * len(stages)
+    assert len(analysis.service.operations) == len(dam_ids) * len(stages)
+    assert analysis.max_seen_in_flight <= max_tasks_in_flight
+
+
+def test_stage_actions_run_concurrently():
+    """Check that the stage actions of different dams overlap (each action
+    waits until all four actions are running)"""
+    dam_ids = [1, 2, 3, 4]
+    analysis = FakeAnalysis(dam_ids, max_tasks_in_flight=4, max_workers=4)
+    barrier = threading.Barrier(len(dam_ids), timeout=5)
+
+    def wait_for_others(c_dam_ids):
+        barrier.wait()
+        analysis.submit_next_stage(c_dam_ids)
+
+    analysis.pipeline.actions["subbasin_pts"] = wait_for_others
+
+    assert analysis.run() == 0
+    assert sorted(analysis.pipeline.done) == dam_ids
+
+
+def test_failing_action_fails_its_dams_only():
+    """Check that a stage action that raises fails its dams and the rest of
+    the batch carries on"""
+    analysis = FakeAnalysis([1, 2, 3])
+
+    def broken_action(c_dam_ids):
+        if 2 in c_dam_ids:
+            raise RuntimeError("Problem building catchment")
+        analysis.submit_next_stage(c_dam_ids)
+
+    analysis.pipeline.actions["catch_vec"] = broken_action
+
+    assert analysis.run() == 0
+    assert sorted(analysis.pipeline.done) == [1, 3]
+    assert analysis.pipeline.failures == {2: "catch_vec_params"}
+
+
+def test_run_times_out_without_completions():
+    """Check that the run stops when no task completes before the timeout"""
+    analysis = FakeAnalysis([1, 2], complete=False)
+
+    assert analysis.run() == 1
+    assert sorted(analysis.pipeline.active) == [1, 2]
@@ -73,6 +73,49 @@ def test_predominant_biome():
     assert calc_result == test_result
 
 
+def test_profile_context_shares_metrics():
+    """Test that metrics of the same target are built once and shared,
+    and that targets do not share metrics"""
+    from heet_params import area, population, population_density
+
+    biome_poly_1090 = ee.FeatureCollection(
+        "projects/ee-future-dams/assets/XHEET_TEST_POLYS/biome_poly_1090"
+    )
+    other_poly = ee.FeatureCollection(
+        "projects/ee-future-dams/assets/XHEET_TEST_POLYS/biome_poly_1090"
+    )
+
+    assert area(biome_poly_1090) is area(target_ftc=biome_poly_1090)
+    assert population_density(biome_poly_1090) is population_density(biome_poly_1090)
+    assert area(other_poly) is not area(biome_poly_1090)
+
+    calc_result = population(biome_poly_1090).getInfo()
+    test_result = population(other_poly).getInfo()
+
+    assert calc_result == test_result
+
+
+def test_layer_means_one_reduction_per_group():
+    """Test that the soil metrics of a target are read from one shared
+    reduction of the stacked Soil Grids layers"""
+    from heet_params import layer_means, mean_soil_oc_content, mean_soil_bdod
+
+    biome_poly_1090 = ee.FeatureCollection(
+        "projects/ee-future-dams/assets/XHEET_TEST_POLYS/biome_poly_1090"
+    )
+
+    means = layer_means(biome_poly_1090, "soilgrids")
+    assert means is layer_means(biome_poly_1090, "soilgrids")
+
+    calc_result = means.getInfo()
+    for band in ["ocs_0-30cm_mean", "SOC_GPERKG", "PSOC", "N_GPERKG",
+                 "BDOD_KGPERDM3", "WMOLCKG", "WMOLNKG", "KGDOCHAYR"]:
+        assert band in calc_result
+
+    assert mean_soil_oc_content(biome_poly_1090).getInfo() == calc_result["SOC_GPERKG"]
+    assert mean_soil_bdod(biome_poly_1090).getInfo() == calc_result["BDOD_KGPERDM3"]
+
+
 # ==============================================================================
 #  Evapotranspiration (UDEL)
 # ==============================================================================
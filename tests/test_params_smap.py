@@ -89,3 +89,17 @@ def test_smap_crossref_soil():
     )
 
     assert 0.1 < rdiff < 10
+
+
+def test_smap_years_without_images():
+    """Test that years before the start of the SMAP record reduce to null
+    rather than failing the reduction of the other years"""
+    from heet_params import climate_statistics
+
+    target_ftc = dta.HYDROBASINS12.filter(ee.Filter.eq("HYBAS_ID", 4121051890))
+
+    calc_stats = climate_statistics(target_ftc, "smap", 2013, 2016, ["smp"]).getInfo()
+
+    assert calc_stats["smp_sum_2013"] is None
+    assert calc_stats["smp_mean_2014"] is None
+    assert calc_stats["smp_mean_2016"] is not None
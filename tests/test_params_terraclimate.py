@@ -489,3 +489,33 @@ def test_terraclim_crossref_soil():
 
     assert 0.1 < rdiff < 10
 
+
+
+def test_terraclim_shared_climate_statistics():
+    """Test that the annual and monthly means of the variables of a target
+    are read from one shared reduction of the yearly images"""
+    from heet_params import (
+        climate_statistics, climate_variables, terraclim_annual_mean, terraclim_monthly_mean
+    )
+
+    GRID = ee.FeatureCollection("projects/ee-future-dams/assets/XHEET_TEST_POLYS/terraclim_grid_22_01")
+    variables = climate_variables("terraclimate", "ro")
+
+    stats = climate_statistics(GRID, "terraclimate", 2000, 2019, variables)
+    assert stats is climate_statistics(GRID, "terraclimate", 2000, 2019, variables)
+
+    calc_stats = stats.getInfo()
+    assert "ro_sum_2000" in calc_stats
+    assert "pet_mean_2019" in calc_stats
+    # Reservoir variables are not reduced over catchments
+    assert "vs_mean_2000" not in calc_stats
+
+    ro_annual = [calc_stats[f"ro_sum_{year}"] for year in range(2000, 2020)]
+    ro_annual = [v for v in ro_annual if v is not None]
+
+    calc_result = terraclim_annual_mean(2000, 2019, "ro", 1, GRID).getInfo()
+    assert calc_result == pytest.approx(sum(ro_annual) / len(ro_annual))
+
+    # The monthly mean comes from the same reduction
+    terraclim_monthly_mean(2000, 2019, "ro", 1, GRID).getInfo()
+    assert climate_statistics(GRID, "terraclimate", 2000, 2019, variables) is stats
@@ -0,0 +1,107 @@
+import pytest
+
+from heet_pipeline import DamPipeline, DONE, FAILED
+
+critical_path = [
+    "subbasin_pts",
+    "catch_vec",
+    "catch_vec_params",
+    "res_vec",
+    "res_vec_params",
+    "nic_vec",
+    "nic_vec_params",
+    "mriv_vec",
+    "mriv_vec_params",
+]
+
+
+def test_dam_advances_through_all_stages():
+    """Check that a dam moves through every critical path stage in order and
+    that each stage's action is triggered for that dam only"""
+    triggered = []
+    actions = {
+        stage: (lambda ids, stage=stage: triggered.append((stage, ids)))
+        for stage in critical_path
+    }
+    pipeline = DamPipeline(critical_path, actions)
+    pipeline.start([1, 2])
+
+    for position, stage in enumerate(critical_path):
+        assert pipeline.state(1) == stage
+        pipeline.complete(1, stage)
+
+    assert pipeline.state(1) == DONE
+    assert pipeline.state(2) == "subbasin_pts"
+    assert pipeline.active == [2]
+    assert pipeline.done == [1]
+    assert pipeline.completed_steps == len(critical_path)
+    assert triggered == [(stage, [1]) for stage in critical_path]
+
+
+def test_dams_advance_independently():
+    """Check that a dam finishing a stage does not wait for other dams"""
+    pipeline = DamPipeline(critical_path)
+    pipeline.start([1, 2, 3])
+
+    pipeline.complete(2, "subbasin_pts")
+    pipeline.complete(2, "catch_vec")
+
+    assert pipeline.state(1) == "subbasin_pts"
+    assert pipeline.state(2) == "catch_vec_params"
+    assert pipeline.state(3) == "subbasin_pts"
+
+
+def test_unexpected_completion_is_ignored():
+    """Check that completions for a stage the dam is not waiting on are ignored"""
+    pipeline = DamPipeline(critical_path)
+    pipeline.start([1])
+
+    assert pipeline.complete(1, "res_vec") is None
+    assert pipeline.complete(99, "subbasin_pts") is None
+    assert pipeline.state(1) == "subbasin_pts"
+    assert pipeline.completed_steps == 0
+
+
+def test_failure_ends_analysis():
+    """Check that a failed stage removes the dam from the active dams"""
+    pipeline = DamPipeline(critical_path)
+    pipeline.start([1, 2])
+    pipeline.complete(1, "subbasin_pts")
+    pipeline.fail(1, "Computation timed out.")
+
+    assert pipeline.state(1) == FAILED
+    assert pipeline.failures == {1: "catch_vec"}
+    assert pipeline.active == [2]
+    assert pipeline.complete(1, "catch_vec") is None
+
+
+def test_failing_action_fails_dam():
+    """Check that an exception raised when triggering the next stage ends the
+    analysis of the dam"""
+
+    def broken_action(c_dam_ids):
+        raise RuntimeError("Problem submitting task")
+
+    pipeline = DamPipeline(critical_path, {"subbasin_pts": broken_action})
+    pipeline.start([1])
+    pipeline.complete(1, "subbasin_pts")
+
+    assert pipeline.state(1) == FAILED
+    assert pipeline.active == []
+
+
+def test_complete_all_triggers_once():
+    """Check that dams completing a stage together trigger the stage's action
+    once, with every dam that was waiting on the stage"""
+    triggered = []
+    pipeline = DamPipeline(
+        critical_path, {"catch_vec": lambda ids: triggered.append(list(ids))}
+    )
+    pipeline.start([1, 2, 3])
+    for dam_id in [1, 2, 3]:
+        pipeline.complete(dam_id, "subbasin_pts")
+
+    assert pipeline.complete_all([1, 2, 3, 99], "catch_vec") == [1, 2, 3]
+    assert triggered == [[1, 2, 3]]
+    assert pipeline.state(2) == "catch_vec_params"
+    assert pipeline.completed_steps == 6
@@ -0,0 +1,98 @@
+import pytest
+
+from heet_poll import PollSchedule
+
+start_ms = 1667407197000
+
+
+class Clock:
+    def __init__(self):
+        self.now = start_ms / 1000
+
+    def __call__(self):
+        return self.now
+
+
+def completed(task_id, duration_s, eecu_s=None):
+    status = {
+        "id": task_id,
+        "state": "COMPLETED",
+        "start_timestamp_ms": start_ms,
+        "update_timestamp_ms": start_ms + duration_s * 1000,
+    }
+    if eecu_s is not None:
+        status["batch_eecu_usage_seconds"] = eecu_s
+    return status
+
+
+def running(task_id, eecu_s=None):
+    status = {"id": task_id, "state": "RUNNING", "start_timestamp_ms": start_ms}
+    if eecu_s is not None:
+        status["batch_eecu_usage_seconds"] = eecu_s
+    return status
+
+
+def test_unknown_stages_are_polled_often():
+    """Check that stages without a completed task use the shortest interval"""
+    schedule = PollSchedule(min_step_s=5, max_step_s=60, clock=Clock())
+    schedule.update([("catch_vec", running("1"))])
+    assert schedule.next_step() == 5
+
+
+def test_poll_when_completion_is_expected():
+    """Check that the next poll is scheduled when the first unfinished task
+    is expected to complete"""
+    clock = Clock()
+    schedule = PollSchedule(min_step_s=5, max_step_s=600, clock=clock)
+    schedule.update([("catch_vec", completed("1", 300)), ("catch_vec", completed("2", 100))])
+    assert schedule.expected_duration("catch_vec") == 200
+
+    clock.now = clock.now + 50
+    schedule.update([("catch_vec", running("3"))])
+    assert schedule.next_step() == 150
+
+    clock.now = clock.now + 198
+    assert schedule.next_step() == 5
+
+
+def test_interval_is_bounded():
+    """Check that the interval stays below the longest interval and that
+    completions are recorded once"""
+    schedule = PollSchedule(min_step_s=5, max_step_s=60, clock=Clock())
+    status = completed("1", 900)
+    schedule.update([("catch_vec", status)])
+    schedule.update([("catch_vec", status), ("catch_vec", running("2"))])
+    assert schedule.durations == {"catch_vec": [900.0]}
+    assert schedule.next_step() == 60
+
+
+def test_eecu_usage_shortens_estimate():
+    """Check that a task using EECU faster than usual is expected to finish
+    sooner"""
+    clock = Clock()
+    schedule = PollSchedule(min_step_s=5, max_step_s=600, clock=clock)
+    schedule.update([("catch_vec", completed("1", 400, eecu_s=200))])
+
+    clock.now = clock.now + 100
+    schedule.update([("catch_vec", running("2", eecu_s=150))])
+    # 300 s by duration, 50 EECU s left at 1.5 EECU s per second
+    assert schedule.remaining("catch_vec", running("2", eecu_s=150)) == pytest.approx(100 / 3)
+
+
+def test_only_waited_task_codes_set_the_interval():
+    """Check that unfinished tasks outside task_codes are not waited for and
+    that delayed tasks wake the schedule up"""
+    schedule = PollSchedule(min_step_s=5, max_step_s=600, clock=Clock())
+    schedule.update([("catch_vec", completed("1", 300))])
+    schedule.update([("catch_vec", running("2")), ("wbs_vec", running("3"))], ["catch_vec"])
+    assert schedule.next_step() == 300
+    assert schedule.next_step(wake_in_s=20) == 20
+
+
+def test_polls_are_counted():
+    schedule = PollSchedule()
+    schedule.record_poll("new_results")
+    schedule.record_poll("new_results")
+    schedule.record_poll("exports")
+    assert schedule.polls == {"new_results": 2, "exports": 1}
+    assert schedule.total_polls == 3
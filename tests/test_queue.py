@@ -0,0 +1,180 @@
+import pytest
+
+from fake_ee import FakeOperationsService
+from heet_queue import SubmissionQueue
+from heet_status import TaskStatusSnapshot, description_pattern
+
+critical_path = [
+    "subbasin_pts",
+    "catch_vec",
+    "catch_vec_params",
+    "res_vec",
+    "res_vec_params",
+    "nic_vec",
+    "nic_vec_params",
+    "mriv_vec",
+    "mriv_vec_params",
+]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_critical_path_tasks_are_started_first():
+    """Check that diagnostic tasks wait for critical path tasks and that dams
+    with the most remaining stages are started first"""
+    started = []
+    queue = SubmissionQueue(critical_path)
+    for task_code, key in [
+        ("wbs_vec", "1"),
+        ("mriv_vec", "1"),
+        ("sink_vec", "2"),
+        ("catch_vec", "2"),
+        ("subbasin_pts", "3"),
+        ("catch_vec", "4"),
+    ]:
+        queue.put(task_code, key, lambda t=task_code, k=key: started.append((t, k)))
+
+    assert queue.submit(4) == 4
+    assert started == [
+        ("subbasin_pts", "3"),
+        ("catch_vec", "2"),
+        ("catch_vec", "4"),
+        ("mriv_vec", "1"),
+    ]
+    assert len(queue) == 2
+
+    queue.submit(10)
+    assert started[4:] == [("wbs_vec", "1"), ("sink_vec", "2")]
+    assert len(queue) == 0
+
+
+def test_queue_waits_are_recorded():
+    """Check that the time each task spent in the queue is recorded"""
+    clock = Clock()
+    queue = SubmissionQueue(critical_path, clock=clock)
+    queue.put("catch_vec", "1", lambda: None)
+    clock.now = 5.0
+    queue.put("catch_vec", "2", lambda: None)
+
+    clock.now = 12.0
+    queue.submit(1)
+    clock.now = 20.0
+    queue.submit(1)
+
+    assert queue.waits == {("catch_vec", "1"): [12.0], ("catch_vec", "2"): [15.0]}
+
+
+def test_queue_waits_of_retried_task():
+    """Check that each submission of a retried task keeps its own wait"""
+    clock = Clock()
+    queue = SubmissionQueue(critical_path, clock=clock)
+    queue.put("catch_vec", "1", lambda: None)
+    clock.now = 4.0
+    queue.submit(1)
+
+    # Retry, ready 30 s after it is queued
+    clock.now = 100.0
+    queue.put("catch_vec", "1", lambda: None, delay_s=30.0)
+    clock.now = 140.0
+    queue.submit(1)
+
+    assert queue.waits == {("catch_vec", "1"): [4.0, 10.0]}
+
+
+def test_failing_start_does_not_block_queue():
+    """Check that a task failing to start is dropped and the queue moves on"""
+    started = []
+
+    def broken_start():
+        raise RuntimeError("Problem starting task")
+
+    queue = SubmissionQueue(critical_path)
+    queue.put("catch_vec", "1", broken_start)
+    queue.put("catch_vec", "2", lambda: started.append("2"))
+
+    assert queue.submit(2) == 2
+    assert started == ["2"]
+    assert queue.clear() == 0
+
+
+@pytest.mark.parametrize("max_tasks_in_flight", [1, 5])
+def test_in_flight_tasks_stay_below_limit(max_tasks_in_flight):
+    """Check that, submitting once per poll cycle, the number of unfinished
+    tasks in the (fake) EE queue never exceeds the limit"""
+    service = FakeOperationsService()
+    queue = SubmissionQueue(critical_path)
+    pattern = description_pattern("XHEET-JOB-X")
+
+    for dam_id in range(1, 21):
+        task = service.new_task({"description": f"XHEET-JOB-X006-{dam_id} Catchment vector"})
+        queue.put("catch_vec", str(dam_id), lambda task=task: service.start(task))
+
+    max_seen = 0
+    n_cycles = 0
+    while len(queue) > 0 or len(TaskStatusSnapshot(service.listOperations()).active(pattern)) > 0:
+        snapshot = TaskStatusSnapshot(service.listOperations())
+        in_flight = snapshot.active(pattern)
+        # One task completes per poll cycle
+        if len(in_flight) > 0:
+            service.set_state(in_flight[-1]["id"], "SUCCEEDED")
+        snapshot = TaskStatusSnapshot(service.listOperations())
+        queue.submit(max_tasks_in_flight - len(snapshot.active(pattern)))
+
+        snapshot = TaskStatusSnapshot(service.listOperations())
+        max_seen = max(max_seen, len(snapshot.active(pattern)))
+        n_cycles = n_cycles + 1
+
+    assert max_seen == max_tasks_in_flight
+    assert len(service.operations) == 20
+    assert n_cycles == 21
+
+
+def test_delayed_tasks_wait_for_their_delay():
+    """Check that a delayed task (e.g. a retry) is not started before its
+    delay has passed and then takes its place by priority"""
+    started = []
+    clock = Clock()
+    queue = SubmissionQueue(critical_path, clock=clock)
+    queue.put("catch_vec", "1", lambda: started.append("1"), delay_s=60.0)
+    queue.put("wbs_vec", "2", lambda: started.append("2"))
+
+    assert len(queue) == 2
+    assert queue.submit(5) == 1
+    assert started == ["2"]
+
+    clock.now = 30.0
+    assert queue.submit(5) == 0
+
+    clock.now = 75.0
+    assert queue.submit(5) == 1
+    assert started == ["2", "1"]
+    assert queue.waits[("catch_vec", "1")] == [15.0]
+    assert len(queue) == 0
+
+
+def test_next_ready_in():
+    """Check the time until the next delayed task can be started"""
+    clock = Clock()
+    queue = SubmissionQueue(critical_path, clock=clock)
+    assert queue.next_ready_in() is None
+    queue.put("catch_vec", "1", lambda: None, delay_s=60.0)
+    queue.put("catch_vec", "2", lambda: None, delay_s=30.0)
+    clock.now = 10.0
+    assert queue.next_ready_in() == 20.0
+    clock.now = 45.0
+    assert queue.next_ready_in() == 0.0
+
+
+def test_clear_drops_delayed_tasks():
+    """Check that clearing the queue also drops delayed tasks"""
+    queue = SubmissionQueue(critical_path)
+    queue.put("catch_vec", "1", lambda: None, delay_s=60.0)
+    queue.put("catch_vec", "2", lambda: None)
+    assert queue.clear() == 2
+    assert len(queue) == 0
@@ -0,0 +1,48 @@
+import threading
+
+from heet_results import ResultStream
+
+
+def test_rows_are_last_row_of_each_dam_in_id_order(tmp_path):
+    """Check that a dam written twice (e.g. after resuming) keeps its last
+    row and that rows are read back in dam id order"""
+    stream = ResultStream(tmp_path / "output_parameters.jsonl")
+    stream.append([{"id": 3, "error_code": 0}, {"id": 1, "error_code": 5}])
+    stream.append([{"id": 2, "error_code": 0}])
+    stream.append([{"id": 1, "error_code": 0}])
+
+    assert stream.dam_ids() == {1, 2, 3}
+    assert list(stream.rows()) == [
+        {"id": 1, "error_code": 0},
+        {"id": 2, "error_code": 0},
+        {"id": 3, "error_code": 0},
+    ]
+    assert [[row["id"] for row in page] for page in stream.pages(2)] == [[1, 2], [3]]
+
+
+def test_partly_written_line_is_skipped(tmp_path):
+    """Check that a line cut short by an interrupted run is ignored"""
+    stream = ResultStream(tmp_path / "output_parameters.jsonl")
+    stream.append([{"id": 1, "c_area_km2": 2.5}])
+    with stream.file_path.open("a", encoding="utf-8") as outfile:
+        outfile.write('{"id": 2, "c_are')
+
+    assert stream.dam_ids() == {1}
+    assert list(stream.rows()) == [{"id": 1, "c_area_km2": 2.5}]
+
+
+def test_concurrent_appends_keep_whole_rows(tmp_path):
+    """Check that rows appended from several threads are not interleaved"""
+    stream = ResultStream(tmp_path / "output_parameters.jsonl")
+
+    def append_dams(first_id):
+        for dam_id in range(first_id, first_id + 50):
+            stream.append([{"id": dam_id, "name": "x" * 1000}])
+
+    threads = [threading.Thread(target=append_dams, args=(i * 50,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [row["id"] for row in stream.rows()] == list(range(200))
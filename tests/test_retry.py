@@ -0,0 +1,56 @@
+import pytest
+
+from heet_retry import RetryPolicy, classify_error, RETRYABLE, FATAL
+
+
+@pytest.mark.parametrize(
+    "error_message, expected",
+    [
+        ("Computation timed out.", RETRYABLE),
+        ("Too many concurrent aggregations.", RETRYABLE),
+        ("Internal error.", RETRYABLE),
+        ("Execution failed; out of resources.", RETRYABLE),
+        (
+            "Too Many Requests: Request was rejected because the request rate "
+            + "or concurrency limit was exceeded.",
+            RETRYABLE,
+        ),
+        ("<HttpError 429 \"Too Many Requests\">", RETRYABLE),
+        (
+            "Quota exceeded for quota metric 'Requests' and limit 'Requests per "
+            + "minute per user' of service 'earthengine.googleapis.com'",
+            RETRYABLE,
+        ),
+        ("Quota exceeded: Asset storage quota exceeded.", FATAL),
+        ("Collection.geometry: Unable to perform this geometry operation.", FATAL),
+        ("User memory limit exceeded.", FATAL),
+        ("", FATAL),
+        (None, FATAL),
+    ],
+)
+def test_classify_error(error_message, expected):
+    """Check that transient EE errors are classified as retryable"""
+    assert classify_error(error_message) == expected
+
+
+def test_retries_are_limited():
+    """Check that retryable failures are retried until the last attempt and
+    fatal failures are never retried"""
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(1, "Computation timed out.")
+    assert policy.should_retry(2, "Computation timed out.")
+    assert not policy.should_retry(3, "Computation timed out.")
+    assert not policy.should_retry(1, "Asset not found.")
+
+
+def test_delay_backs_off_exponentially():
+    """Check that the delay doubles with each attempt up to its maximum"""
+    policy = RetryPolicy(base_delay_s=60, max_delay_s=300, jitter=0)
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [60, 120, 240, 300, 300]
+
+
+@pytest.mark.parametrize("random_value, expected", [(0.0, 50.0), (0.5, 100.0), (0.999, 149.9)])
+def test_delay_jitter(random_value, expected):
+    """Check that the jitter scales the delay within [1 - jitter, 1 + jitter]"""
+    policy = RetryPolicy(base_delay_s=100, jitter=0.5, random_uniform=lambda: random_value)
+    assert policy.delay(1) == pytest.approx(expected)
@@ -0,0 +1,188 @@
+import json
+import pytest
+import pandas as pd
+from pathlib import Path
+
+from fake_ee import FakeOperationsService
+from heet_shard import (
+    load_shard_config,
+    merge_results,
+    partition_inputs,
+    run_shards,
+    shard_jobs,
+    write_shard_inputs,
+)
+
+
+class FakeShardRunner:
+    """Runs a shard job locally: every dam of the shard's input file is
+    'analysed' with a fake EE backend (one per project) and the shard's
+    output files are written like heet_cli.py would"""
+
+    def __init__(self, failing_shards=()):
+        self.services = {}
+        self.failing_shards = failing_shards
+
+    def start(self, job):
+        service = self.services.setdefault(job["project"], FakeOperationsService())
+        output_dir = job["output_dir"]
+        output_dir.mkdir(parents=True, exist_ok=False)
+        if job["index"] in self.failing_shards:
+            return 1
+
+        df_inputs = pd.read_csv(job["input_path"])
+        tasks = []
+        json_output = {}
+        for dam_id in df_inputs["id"]:
+            task = service.submit(f"XHEET-{job['jobname']}-S{job['index']}-X002-{dam_id}")
+            service.set_state(task.id, "SUCCEEDED")
+            tasks.append({"state": "COMPLETED", "id": task.id, "dam_id": dam_id})
+            json_output[f"reservoir_{dam_id}"] = {"id": int(dam_id)}
+
+        df_inputs[["id", "name"]].to_csv(Path(output_dir, "output_parameters.csv"), index=False)
+        pd.DataFrame(tasks).to_csv(Path(output_dir, "tasks.csv"), index=False)
+        with Path(output_dir, "output_parameters.json").open("w") as outfile:
+            json.dump(json_output, outfile)
+        return 0
+
+    def wait(self, exit_code):
+        return exit_code
+
+
+@pytest.fixture
+def input_file_path(tmp_path):
+    df = pd.DataFrame(
+        {
+            "id": range(1, 8),
+            "name": [f"Dam {i}" for i in range(1, 8)],
+            "dam_height": ["10", "", "12.5", "7", "", "3", "40"],
+        }
+    )
+    file_path = tmp_path / "dams.csv"
+    df.to_csv(file_path, index=False)
+    return file_path
+
+
+@pytest.fixture
+def shard_config_path(tmp_path):
+    file_path = tmp_path / "shards.toml"
+    file_path.write_text(
+        """
+[[shard]]
+project = "project-a"
+
+[[shard]]
+project = "project-b"
+service_account = "heet@project-b.iam.gserviceaccount.com"
+key_file = "project-b.json"
+
+[[shard]]
+project = "project-c"
+"""
+    )
+    return file_path
+
+
+@pytest.mark.parametrize(
+    "n_rows, n_shards, sizes",
+    [(7, 3, [3, 2, 2]), (6, 3, [2, 2, 2]), (2, 3, [1, 1]), (5, 1, [5])],
+)
+def test_partition_inputs(n_rows, n_shards, sizes):
+    """Check that inputs are split into balanced, contiguous, non-empty parts"""
+    df = pd.DataFrame({"id": range(n_rows)})
+    parts = partition_inputs(df, n_shards)
+
+    assert [p.shape[0] for p in parts] == sizes
+    assert list(pd.concat(parts)["id"]) == list(range(n_rows))
+
+
+def test_load_shard_config(shard_config_path, tmp_path):
+    """Check that shards are read and that incomplete credentials are rejected"""
+    shards = load_shard_config(shard_config_path)
+
+    assert [s["project"] for s in shards] == ["project-a", "project-b", "project-c"]
+
+    bad_config_path = tmp_path / "bad.toml"
+    bad_config_path.write_text('[[shard]]\nproject = "p"\nservice_account = "sa"\n')
+    with pytest.raises(ValueError):
+        load_shard_config(bad_config_path)
+
+
+def test_shard_inputs_are_copied_verbatim(input_file_path, tmp_path):
+    """Check that shard input files together hold the input rows unchanged"""
+    input_paths = write_shard_inputs(input_file_path, 3, tmp_path / "shard_inputs")
+
+    original = input_file_path.read_text().splitlines()
+    rows = []
+    for input_path in input_paths:
+        lines = input_path.read_text().splitlines()
+        assert lines[0] == original[0]
+        rows.extend(lines[1:])
+
+    assert rows == original[1:]
+
+
+def test_sharded_run_is_merged(input_file_path, shard_config_path, tmp_path):
+    """Check that shards run against their own project and that the results of
+    all shards are merged into one output folder"""
+    output_folder_path = tmp_path / "JOB_20230101-1200"
+    output_folder_path.mkdir()
+
+    shards = load_shard_config(shard_config_path)
+    input_paths = write_shard_inputs(
+        input_file_path, len(shards), output_folder_path / "shard_inputs"
+    )
+    jobs = shard_jobs(shards, input_paths, "JOB", "standard", output_folder_path)
+    runner = FakeShardRunner()
+
+    exit_codes = run_shards(jobs, runner)
+    written = merge_results([j["output_dir"] for j in jobs], output_folder_path)
+
+    assert exit_codes == {1: 0, 2: 0, 3: 0}
+    assert jobs[1]["env"]["HEET_SERVICE_ACCOUNT"] == "heet@project-b.iam.gserviceaccount.com"
+    assert [len(s.operations) for s in runner.services.values()] == [3, 2, 2]
+    assert written == ["output_parameters.csv", "output_parameters.json", "tasks.csv"]
+
+    df_outputs = pd.read_csv(output_folder_path / "output_parameters.csv")
+    assert list(df_outputs["id"]) == list(range(1, 8))
+
+    with (output_folder_path / "output_parameters.json").open() as infile:
+        json_output = json.load(infile)
+    assert list(json_output) == [f"reservoir_{i}" for i in range(1, 8)]
+
+    df_tasks = pd.read_csv(output_folder_path / "tasks.csv")
+    assert list(df_tasks["shard"]) == [1, 1, 1, 2, 2, 3, 3]
+
+
+def test_failed_shard_is_skipped_in_merge(input_file_path, shard_config_path, tmp_path):
+    """Check that the results of the shards that completed are still merged"""
+    output_folder_path = tmp_path / "JOB_20230101-1200"
+    output_folder_path.mkdir()
+
+    shards = load_shard_config(shard_config_path)
+    input_paths = write_shard_inputs(
+        input_file_path, len(shards), output_folder_path / "shard_inputs"
+    )
+    jobs = shard_jobs(shards, input_paths, "JOB", "standard", output_folder_path)
+
+    exit_codes = run_shards(jobs, FakeShardRunner(failing_shards=[2]))
+    merge_results([j["output_dir"] for j in jobs], output_folder_path)
+
+    assert exit_codes == {1: 0, 2: 1, 3: 0}
+    df_outputs = pd.read_csv(output_folder_path / "output_parameters.csv")
+    assert list(df_outputs["id"]) == [1, 2, 3, 6, 7]
+
+
+def test_merged_outputs_are_copied_verbatim(tmp_path):
+    """Check that merged output values are not reformatted (empty values,
+    leading zeros) and that dams are sorted by numeric id"""
+    shard_folders = [tmp_path / "S1", tmp_path / "S2"]
+    for shard_folder, rows in zip(shard_folders, [["10,012,", "2,1.50,NA"], ["9,7,x"]]):
+        shard_folder.mkdir()
+        lines = ["id,code,note"] + rows
+        Path(shard_folder, "output_parameters.csv").write_text("\n".join(lines) + "\n")
+
+    merge_results(shard_folders, tmp_path)
+
+    lines = Path(tmp_path, "output_parameters.csv").read_text().splitlines()
+    assert lines == ["id,code,note", "2,1.50,NA", "9,7,x", "10,012,"]
@@ -131,6 +131,24 @@ def test_snap_pt_to_line_c3():
     assert calc_result == pytest.approx(test_result)
 
 
+def test_snap_pt_to_line_c4():
+    """Test that snap_pt_to_line works for a zero-length segment
+    case 4: A and B are the same point (repeated vertex of a reach)
+    """
+    from heet_snap import snap_pt_to_line
+
+    test_input = {
+        "P": ee.Array([12, 10]),
+        "A": ee.Array([-6, 1]),
+        "B": ee.Array([-6, 1]),
+    }
+
+    test_result = np.array([-6, 1])
+    calc_result = np.array(snap_pt_to_line(**test_input).getInfo())
+
+    assert calc_result == pytest.approx(test_result)
+
+
 def test_snap_intersects_hydroriver():
     """Test snapped dam location intersects a hydroriver"""
     from heet_snap import jensen_snap_hydroriver
@@ -147,3 +165,52 @@ def test_snap_intersects_hydroriver():
     )
 
     assert n_reaches > 0
+
+
+def test_snap_displacement_is_distance_to_hydroriver():
+    """Test snapped dam location is the point of the nearest hydroriver
+    closest to the dam"""
+    from heet_snap import jensen_snap_hydroriver
+
+    dam_pt = ee.Geometry.Point(ee.Number(98.580461), ee.Number(26.051936))
+    damFeat = ee.Feature(dam_pt)
+
+    snappedDamFeat = jensen_snap_hydroriver(damFeat)
+
+    reach_distance = (
+        dta.HYDRORIVERS.filterBounds(dam_pt.buffer(10000))
+        .map(lambda feat: feat.set("dist", feat.distance(dam_pt, 1)))
+        .aggregate_min("dist")
+        .getInfo()
+    )
+    displacement = snappedDamFeat.get("ps_snap_displacement").getInfo()
+
+    logger.info(
+        f"[test_snap_displacement_is_distance_to_hydroriver] Displacement {displacement} "
+        + f"Distance to nearest reach {reach_distance}"
+    )
+
+    assert displacement == pytest.approx(reach_distance, abs=1)
+
+
+def test_batch_snap_flags_dams_without_reach():
+    """Test a dam with no river reach in the search radius is flagged
+    without failing the snapping of the other dams"""
+    from heet_snap import batch_snap_hydroriver
+
+    dams_ftc = ee.FeatureCollection(
+        [
+            ee.Feature(ee.Geometry.Point(98.580461, 26.051936), {"id": 1}),
+            # Middle of the Pacific Ocean
+            ee.Feature(ee.Geometry.Point(-150.0, 0.0), {"id": 2}),
+        ]
+    )
+
+    rows = (
+        batch_snap_hydroriver(dams_ftc)
+        .reduceColumns(ee.Reducer.toList(2), ["id", "snap_failed"])
+        .get("list")
+        .getInfo()
+    )
+
+    assert sorted(rows) == [[1, 0], [2, 1]]
@@ -0,0 +1,98 @@
+import pytest
+
+from fake_ee import FakeOperationsService
+from heet_status import TaskStatusMonitor, TaskStatusSnapshot, description_pattern
+
+
+def test_snapshot_maps_operation_states_to_task_states():
+    """Check that operation states are reported as ee.batch.Task states"""
+    service = FakeOperationsService()
+    tasks = [service.submit(f"XHEET-X006-{i} Catchment vector") for i in range(5)]
+
+    service.set_state(tasks[1].id, "RUNNING")
+    service.set_state(tasks[2].id, "SUCCEEDED")
+    service.set_state(tasks[3].id, "FAILED", "Computation timed out.")
+    service.set_state(tasks[4].id, "CANCELLED")
+
+    snapshot = TaskStatusSnapshot(service.listOperations())
+
+    assert [snapshot.state(t) for t in tasks] == [
+        "READY",
+        "RUNNING",
+        "COMPLETED",
+        "FAILED",
+        "CANCELLED",
+    ]
+    assert snapshot.status(tasks[3])["error_message"] == "Computation timed out."
+    assert snapshot.state(tasks[2].id) == "COMPLETED"
+
+
+def test_snapshot_unknown_and_unsubmitted_tasks():
+    """Check that unlisted tasks are UNKNOWN and unstarted tasks UNSUBMITTED"""
+    service = FakeOperationsService()
+    snapshot = TaskStatusSnapshot(service.listOperations())
+
+    assert snapshot.state("NOTLISTED") == "UNKNOWN"
+    assert snapshot.state(service.new_task({"description": "x"})) == "UNSUBMITTED"
+
+
+def test_snapshot_active_tasks_filtered_by_description():
+    """Check that only unfinished tasks matching the description are active"""
+    service = FakeOperationsService()
+    t1 = service.submit("XHEET-X002-1 Snapped dam locations and upstream basins")
+    t2 = service.submit("XHEET-X002-2 Snapped dam locations and upstream basins")
+    service.submit("Some other user task")
+    service.set_state(t2.id, "SUCCEEDED")
+
+    snapshot = TaskStatusSnapshot(service.listOperations())
+    active = snapshot.active("^XHEET-X\\d\\d\\d-\\d+")
+
+    assert [s["id"] for s in active] == [t1.id]
+
+
+@pytest.mark.parametrize("n_tasks", [10, 10000])
+def test_one_listing_per_poll_cycle(n_tasks):
+    """Check that a poll cycle over n_tasks tasks makes one operations listing
+    and no per-task status calls"""
+    service = FakeOperationsService(page_size=500)
+    tasks = [service.submit(f"XHEET-X006-{i} Catchment vector") for i in range(n_tasks)]
+    monitor = TaskStatusMonitor(service.listOperations)
+
+    n_cycles = 3
+    n_finished = 0
+    for cycle in range(n_cycles):
+        # Progress a slice of tasks between polls
+        for task in tasks[cycle::n_cycles]:
+            service.set_state(task.id, "SUCCEEDED")
+            n_finished = n_finished + 1
+
+        snapshot = monitor.refresh()
+        completed = [t for t in tasks if snapshot.state(t) == "COMPLETED"]
+
+        assert len(completed) == n_finished
+
+    assert service.list_calls == n_cycles
+    assert monitor.refresh_count == n_cycles
+    assert service.status_calls == 0
+    assert service.page_requests == n_cycles * -(-n_tasks // 500)
+    assert len(completed) == n_tasks
+
+
+def test_jobs_only_see_their_own_tasks():
+    """Check that the task namespace of a job does not match the tasks of
+    another job running in the same EE project"""
+    service = FakeOperationsService()
+    t1 = service.submit("XHEET-JOB1-X002-1 Snapped dam locations and upstream basins")
+    t2 = service.submit("XHEET-JOB2-X002-1 Snapped dam locations and upstream basins")
+    t3 = service.submit("XHEET-JOB1-X011-0 Exporting to drive C_1")
+
+    snapshot = TaskStatusSnapshot(service.listOperations())
+
+    assert [s["id"] for s in snapshot.active(description_pattern("XHEET-JOB1-X"))] == [
+        t3.id,
+        t1.id,
+    ]
+    assert [s["id"] for s in snapshot.active(description_pattern("XHEET-JOB2-X"))] == [
+        t2.id
+    ]
+    assert snapshot.active(description_pattern("XHEET-X")) == []
@@ -0,0 +1,83 @@
+import pytest
+import ee
+import os
+
+if 'CI_ROBOT_USER' in os.environ:
+    print("Running service account authentication")
+    gc_service_account = os.environ['GCLOUD_ACCOUNT_EMAIL']
+    credentials = ee.ServiceAccountCredentials(gc_service_account, 'service_account_creds.json')
+    ee.Initialize(credentials)
+
+else:
+    print("Running individual account authentication")
+    ee.Initialize()
+
+
+def test_parts_kept_when_merge_fails(monkeypatch):
+    """Check that the uploaded chunks of the user inputs are not deleted
+    when the server side merge fails"""
+    import heet_task
+    import heet_export
+    import heet_monitor as mtr
+    from fake_ee import FakeOperationsService
+
+    service = FakeOperationsService()
+
+    def upload(inputs_ftc, part=None):
+        task = service.submit("XHEET-X001-" + str(part))
+        service.set_state(task.id, "SUCCEEDED")
+        return task
+
+    def merge(n_parts):
+        task = service.submit("XHEET-X001")
+        service.set_state(task.id, "FAILED", "Table too large")
+        return task
+
+    deleted = []
+    monkeypatch.setattr(heet_export, "upload_user_inputs", upload)
+    monkeypatch.setattr(heet_export, "merge_user_inputs", merge)
+    monkeypatch.setattr(mtr.asset_ops, "delete", lambda names: deleted.extend(names))
+
+    with pytest.raises(RuntimeError, match="FAILED"):
+        heet_task.upload_user_inputs([None, None])
+    assert deleted == []
+
+
+def test_failed_batch_is_exported_dam_by_dam(monkeypatch):
+    """Check that the dams of a batch task that failed for good are exported
+    one task per dam, and that only a dam whose collection cannot be built
+    is failed"""
+    import heet_task
+    import heet_export
+    import heet_monitor as mtr
+    from heet_pipeline import DamPipeline, FAILED
+    from fake_ee import FakeOperationsService
+
+    asset_id = "projects/heet/assets/XHEET/tmp/R_batch_1"
+    batch_task = FakeOperationsService().new_task(
+        {"assetExportOptions": {"earthEngineDestination": {"name": asset_id}}}
+    )
+
+    def dam_ftc(c_dam_id_str):
+        if c_dam_id_str == "2":
+            raise ValueError("Bad reservoir shape")
+        return c_dam_id_str
+
+    exported = []
+    monkeypatch.setattr(
+        heet_export, "export_ftc", lambda ftc, c_dam_id_str, jobtype: exported.append(ftc)
+    )
+    monkeypatch.setattr(mtr, "batch_tasks", {asset_id: ["1", "2", "3"]})
+    monkeypatch.setattr(mtr, "batch_splits", {asset_id: ("reservoir_vector_params", dam_ftc)})
+    monkeypatch.setattr(mtr, "batch_outputs", {"R_": {1: {"id": asset_id, "batch": True}}})
+    monkeypatch.setattr(mtr, "task_attempts", {})
+    monkeypatch.setattr(mtr, "pipeline", DamPipeline(mtr.critical_path))
+    mtr.pipeline.start([1, 2, 3])
+
+    assert heet_task.split_failed_batch("res_vec_params", batch_task, "Internal error")
+
+    assert exported == ["1", "3"]
+    assert mtr.batch_outputs == {"R_": {}}
+    assert mtr.pipeline.failed == [2]
+    # The batch is split once
+    assert heet_export.split_batch(asset_id) == {}
@@ -0,0 +1,176 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+import delineator
+from heet_hybas_index import HybasIndex
+from heet_pipeline import DamPipeline, FAILED
+
+# Level 12 basins of a made up river: 3 drains into 2, 2 into 1
+index = HybasIndex.from_rows(
+    {12: [(1, 0, 111111111111), (2, 1, 111111111113), (3, 2, 111111111115)]}
+)
+
+
+class RecordingPipeline(DamPipeline):
+    """DamPipeline keeping the reason each dam failed"""
+
+    def __init__(self, stages, dam_ids):
+        super().__init__(stages)
+        self.reasons = {}
+        self.start(dam_ids)
+
+    def fail(self, dam_id, reason=""):
+        self.reasons[dam_id] = reason
+        super().fail(dam_id, reason)
+
+
+@pytest.fixture
+def heet_basins(monkeypatch):
+    """heet_basins imported against stubs of the ee package and of the
+    modules building EE data, snaps and exports, so that the bookkeeping of
+    batch_find_upstream_basins runs without EE credentials"""
+    modules = set(sys.modules)
+    package_attrs = dict(vars(delineator))
+
+    monkeypatch.setenv("CI_ROBOT_USER", "1")
+    for name in ["ee", "delineator.heet_data", "delineator.heet_export", "delineator.heet_snap"]:
+        monkeypatch.setitem(sys.modules, name, MagicMock())
+    for name in ["delineator.heet_basins", "delineator.heet_config", "delineator.heet_monitor"]:
+        monkeypatch.delitem(sys.modules, name, raising=False)
+        monkeypatch.delattr(delineator, name.split(".")[1], raising=False)
+
+    from delineator import heet_basins
+
+    monkeypatch.setattr(heet_basins.cfg, "upstreamMethod", 4)
+    monkeypatch.setattr(heet_basins.cfg, "batch_snapping", True)
+    monkeypatch.setattr(heet_basins.cfg, "local_bounding_level", False)
+    monkeypatch.setattr(heet_basins.cfg, "exportRawDamPts", False)
+    monkeypatch.setattr(heet_basins.cfg, "exportSnappedDamPts", True)
+    monkeypatch.setattr(heet_basins.heet_hybas_index, "load_index", lambda path: index)
+    yield heet_basins
+
+    # Modules imported against the stubs are not seen by other tests
+    for name in set(sys.modules) - modules:
+        del sys.modules[name]
+    for name in set(vars(delineator)) - set(package_attrs):
+        delattr(delineator, name)
+
+
+def test_dam_failed_when_subbasin_not_in_index(heet_basins, monkeypatch):
+    """Check that a dam whose snapped sub-basin is missing from the local
+    HydroBASINS index (upstream method 4) is failed rather than left waiting,
+    and that the other dams are still exported"""
+    mtr = heet_basins.mtr
+    monkeypatch.setattr(mtr, "pipeline", RecordingPipeline(mtr.critical_path, [1, 2]))
+    monkeypatch.setattr(
+        heet_basins,
+        "snapped_subbasins",
+        lambda dams_ftc, c_dam_ids: {1: (99, 111111111119), 2: (2, 111111111113)},
+    )
+
+    heet_basins.batch_find_upstream_basins(MagicMock(), [1, 2])
+
+    assert mtr.pipeline.state(1) == FAILED
+    assert "local HydroBASINS index" in mtr.pipeline.reasons[1]
+    assert mtr.pipeline.state(2) != FAILED
+    export_args = heet_basins.heet_export.export_batch_ftc.call_args[0]
+    assert export_args[1] == ["2"]
+
+
+def test_dams_failed_when_index_cannot_be_loaded(heet_basins, monkeypatch):
+    """Check that every dam is failed with the cause when the local index
+    cannot be loaded"""
+    mtr = heet_basins.mtr
+    monkeypatch.setattr(mtr, "pipeline", RecordingPipeline(mtr.critical_path, [1, 2]))
+    monkeypatch.setattr(heet_basins, "snapped_subbasins", lambda dams_ftc, c_dam_ids: {})
+
+    def load_index(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(heet_basins.heet_hybas_index, "load_index", load_index)
+
+    heet_basins.batch_find_upstream_basins(MagicMock(), [1, 2])
+
+    assert mtr.pipeline.failed == [1, 2]
+    assert all("Loading the local HydroBASINS index" in r for r in mtr.pipeline.reasons.values())
+    heet_basins.heet_export.export_batch_ftc.assert_not_called()
+
+
+def test_subbasins_looked_up_per_dam_without_outlets(heet_basins, monkeypatch):
+    """Check that dams are looked up one by one in the local index when the
+    sub-basins of the snapped dams could not be fetched"""
+    mtr = heet_basins.mtr
+    monkeypatch.setattr(mtr, "pipeline", RecordingPipeline(mtr.critical_path, [1]))
+
+    def snapped_subbasins(dams_ftc, c_dam_ids):
+        raise Exception("Computation timed out.")
+
+    monkeypatch.setattr(heet_basins, "snapped_subbasins", snapped_subbasins)
+    # Sub-basin of the dam (see get_subbasin)
+    heet_basins.ee.Number.return_value.getInfo.return_value = 1
+
+    heet_basins.batch_find_upstream_basins(MagicMock(), [1])
+
+    assert mtr.pipeline.failed == []
+    assert [2, 3] in [c[0][0] for c in heet_basins.ee.List.call_args_list if c[0]]
+    heet_basins.heet_export.export_batch_ftc.assert_not_called()
+    assert heet_basins.heet_export.export_ftc.call_args[0][1:] == ("1", "snapped_dam_location")
+
+
+def test_subbasins_fetched_in_chunks(heet_basins, monkeypatch):
+    """Check that sub-basins are fetched a chunk of dams per request and
+    that the dams of a failed request are mapped to None"""
+    monkeypatch.setattr(heet_basins.cfg, "subbasin_lookup_chunk_size", 2)
+    requests = []
+
+    def subbasins_by_dam(chunk):
+        requests.append(chunk)
+        if 3 in chunk:
+            raise Exception("User memory limit exceeded.")
+        # Dam 2 is outside hydrobasins
+        return {dam_id: (dam_id, 111111111111) for dam_id in chunk if dam_id != 2}
+
+    monkeypatch.setattr(heet_basins, "subbasins_by_dam", subbasins_by_dam)
+
+    dam_subbasins = heet_basins.chunked_subbasins(lambda chunk: chunk, [1, 2, 3, 4, 5])
+
+    assert requests == [[1, 2], [3, 4], [5]]
+    assert dam_subbasins == {1: (1, 111111111111), 3: None, 4: None, 5: (5, 111111111111)}
+
+
+def test_dams_of_failed_chunk_handled_one_by_one(heet_basins, monkeypatch):
+    """Check that dams whose sub-basin could not be fetched are snapped and
+    exported on their own while the other dams are batched"""
+    mtr = heet_basins.mtr
+    monkeypatch.setattr(mtr, "pipeline", RecordingPipeline(mtr.critical_path, [1, 2]))
+    monkeypatch.setattr(
+        heet_basins, "snapped_subbasins", lambda dams_ftc, c_dam_ids: {1: None, 2: (2, 111111111113)}
+    )
+    heet_basins.ee.Number.return_value.getInfo.return_value = 1
+
+    heet_basins.batch_find_upstream_basins(MagicMock(), [1, 2])
+
+    assert mtr.pipeline.failed == []
+    assert heet_basins.heet_export.export_ftc.call_args[0][1:] == ("1", "snapped_dam_location")
+    assert heet_basins.heet_export.export_batch_ftc.call_args[0][1] == ["2"]
+
+
+def test_snapped_points_exported_one_by_one_when_batch_export_fails(heet_basins, monkeypatch):
+    """Check that the snapped points are exported dam by dam when the batch
+    export cannot be started, rather than failing every dam"""
+    mtr = heet_basins.mtr
+    monkeypatch.setattr(mtr, "pipeline", RecordingPipeline(mtr.critical_path, [1, 2]))
+    monkeypatch.setattr(
+        heet_basins,
+        "snapped_subbasins",
+        lambda dams_ftc, c_dam_ids: {1: (1, 111111111111), 2: (2, 111111111113)},
+    )
+    heet_basins.heet_export.export_batch_ftc.side_effect = Exception("Request payload too large")
+
+    heet_basins.batch_find_upstream_basins(MagicMock(), [1, 2])
+
+    assert mtr.pipeline.failed == []
+    exported = [c[0][1] for c in heet_basins.heet_export.export_ftc.call_args_list]
+    assert sorted(exported) == ["1", "2"]
@@ -292,6 +292,30 @@ def test_valid_input_false():
     assert calc_result == test_result
 
 
+# ==============================================================================
+# Input Upload
+# ==============================================================================
+
+
+def test_df_to_geojson():
+    """Test that the input table is converted to one GeoJSON point feature
+    per dam, with its properties, and split into upload chunks"""
+    from heet_validate import csv_to_df, prepare_input_table
+    from heet_export import df_to_geojson, df_to_ee_chunks
+
+    df = prepare_input_table(csv_to_df("tests/data/dams_valid.csv"))
+    geojson = df_to_geojson(df)
+
+    assert len(geojson["features"]) == df.shape[0]
+    first = geojson["features"][0]
+    assert first["geometry"]["coordinates"] == [df["x"].iloc[0], df["y"].iloc[0]]
+    assert set(first["properties"]) == set(df.columns) - {"x", "y"}
+    assert first["properties"]["id"] == df["id"].iloc[0]
+
+    n_chunks = len(df_to_ee_chunks(df, chunk_size=2))
+    assert n_chunks == -(-df.shape[0] // 2)
+
+
 # ==============================================================================
 # Utils
 # ==============================================================================
@@ -315,11 +339,11 @@ def test_generate_json_output():
     """Test that json output generate produces valid json (single dam)"""
     from heet_export import generate_json_output
 
-    out_ft = ee.FeatureCollection(
+    properties = ee.FeatureCollection(
         "projects/ee-future-dams/assets/XHEET_TEST_EXAMPLE/output_parameters"
-    ).first()
+    ).first().getInfo()["properties"]
 
-    test_input = {"out_ft": out_ft}
+    test_input = {"properties": properties}
 
     test_result = True
     calc_result = is_valid_json(generate_json_output(**test_input))